@@ -1,5 +1,7 @@
 import chainlit as cl
-from src import ToolManager, Parser, ReactAgent
+from src import ToolManager, ReactAgent, get_service
+from src.config import settings
+from src.tracing import get_tracer
 from datetime import datetime
 import os
 import shutil
@@ -10,6 +12,19 @@ UPLOAD_DIR = os.path.join(os.getcwd(), "workspace")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
+if settings.METRICS_ENDPOINT:
+    from chainlit.server import app as server
+    from fastapi.responses import PlainTextResponse
+
+    @server.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        """Prometheus 文本格式的指标（span 耗时直方图、token 与工具调用计数）"""
+        return get_tracer().metrics.render()
+
+    # chainlit 的前端路由是兜底的 /{full_path:path}，把 /metrics 挪到它前面
+    server.router.routes.insert(0, server.router.routes.pop())
+
+
 async def setup_wizard():
     """Web版配置向导"""
     await cl.Message(content="👋 **欢迎使用 Axiom Agent！**\n\n检测到您是首次运行，我们需要进行一些简单的初始化配置。\n\n请在下方对话框输入API key", author="System").send()
@@ -113,14 +128,20 @@ async def start():
         return
 
     try:
-        tools = ToolManager() 
-        agent = ReactAgent(tools)
+        # 工具注册表、HTTP 连接池与监视器由进程内的服务层共享，每个会话只创建自己的 Context 与日志
+        service = get_service()
+        agent = service.create_session(cl.context.session.id)
         cl.user_session.set("agent", agent)
-        cl.user_session.set("tools", tools)
+        cl.user_session.set("tools", service.tool_manager)
     except Exception as e:
         await cl.Message(content=f"❌ Agent 初始化失败: {str(e)}", author="System").send()
 
 
+@cl.on_chat_end
+async def end():
+    get_service().close_session(cl.context.session.id)
+
+
 @cl.on_message
 async def main(message: cl.Message):
 
@@ -133,6 +154,12 @@ async def main(message: cl.Message):
 
     current_prompt = message.content
 
+    if current_prompt.strip() == "/trace":
+        # 本会话最近若干步的各阶段耗时（进程内环形缓冲，不发给模型）
+        summary = agent.tracer.buffer.format_summary(agent.session_id)
+        await cl.Message(content=summary, author="System").send()
+        return
+
     if message.elements:
         os.makedirs(UPLOAD_DIR, exist_ok=True)
         file_notifications = []
@@ -167,53 +194,51 @@ async def main(message: cl.Message):
         while True:
             step_count += 1
 
+            # 工具文件在上一步被修改过（监视器已防抖）：先增量重载，把新的工具列表告诉模型
+            diff = await agent.apoll_tool_changes()
+            if diff:
+                info_msg = f"Observation: Tools auto-reloaded. {diff.summary()}"
+                async with cl.Step(name="System", type="system") as step:
+                    step.output = info_msg
+                current_prompt = f"{info_msg}\n{current_prompt}"
+
             system_injection = (
                 f"\n[CURRENT STEP: {step_count}]"
                 f"\n[CURRENT TIME: {datetime.now()}]"
-                f"\n[ESTIMATED NUM TOKEN USED: {agent.total_tokens}]"
+                f"\n[ESTIMATED NUM TOKEN USED: {agent.token_usage}]"
             )
 
-            full_response = ""
-            answer_marker = "@@@ Answer"
+            parser = agent.protocol.new_parser()
             has_sent_answer_msg = False
-            previous_answer_len = 0
+            answer_started = False
 
             msg = cl.Message(content="", author="Axiom")
 
             async with cl.Step(name=f"Step {step_count}: Reasoning", type="process") as step:
-                async for chunk in agent.step_stream(current_prompt + system_injection):
-                    full_response += chunk
-
-                    marker_index = full_response.find(answer_marker)
-
-                    if marker_index != -1:
-                        cleaning_reasoning = full_response[:marker_index].strip()
-                        step.output = cleaning_reasoning
-                        await step.update()
-
-                        # 提取答案内容并发送给主聊天框
-                        content_start_index = marker_index + len(answer_marker)
-                        full_answer_text = full_response[content_start_index:].lstrip()
-                        new_content = full_answer_text[previous_answer_len:]
+                async for _ in agent.step_stream(current_prompt + system_injection, parser):
+                    for event in parser.drain():
+                        if event.kind not in ('start', 'delta'):
+                            continue
+                        if event.header != 'answer':
+                            await step.stream_token(event.text)  # 还在思考阶段，输出到step
+                            continue
+                        if event.kind == 'start':
+                            await step.update()
+                            continue
+
+                        # 答案内容流式发送到主聊天框
+                        new_content = event.text if answer_started else event.text.lstrip()
                         if new_content:
                             if not has_sent_answer_msg:
                                 await msg.send()    # 第一次有答案时才发送消息框
                                 has_sent_answer_msg = True
                             await msg.stream_token(new_content)  # 流式传输
-                            previous_answer_len += len(new_content)
-                    elif "@@@ Action" in full_response and "@@@ Args" in full_response:
-                        args_index = full_response.find("@@@ Args")
-                        next_marker_index = full_response.find("@@@", args_index + len("@@@ Args"))
-                        if next_marker_index != -1:
-                            full_response = full_response[:next_marker_index].strip()
-                            break
-                    else:
-                        await step.stream_token(chunk)  # 还在思考阶段，输出到step
+                            answer_started = True
 
             if has_sent_answer_msg:
                 await msg.update()
 
-            state = Parser.parse_response(full_response)
+            state = agent.parse_state(parser)
 
             if state.plan:
                 agent.update_plan(state.plan)
@@ -230,8 +255,8 @@ async def main(message: cl.Message):
                 break
 
             if state.is_refresh:
-                agent.reload_toolset()
-                info_msg = "Observation: Tools reloaded successfully."
+                diff = agent.reload_toolset()
+                info_msg = f"Observation: Tools reloaded successfully. {diff.summary()}"
                 async with cl.Step(name="System", type="system") as step:
                     step.output = info_msg
                 current_prompt = info_msg
@@ -246,19 +271,29 @@ async def main(message: cl.Message):
 
             if state.has_action:
                 action_result = ""
-                async with cl.Step(name=state.action_name, type="tool") as step:
-                    step.input = state.action_args or {}
-
-                    action_result = await cl.make_async(tools.execute)(
-                        state.action_name,
-                        state.action_args or {}
-                    )
-                    step.output = action_result
+                if len(state.actions) > 1:
+                    # 并行模式：多个互不依赖的工具并发执行，结果按顺序合并
+                    async with cl.Step(name=f"Parallel ({len(state.actions)})", type="tool") as step:
+                        step.input = [{"name": call.name, "args": call.args} for call in state.actions]
+                        runs = await agent.run_actions(state)
+                        results = [run.output for run in runs]
+                        action_result = tools.format_results(state.actions, results)
+                        step.output = action_result
+                else:
+                    async with cl.Step(name=state.action_name, type="tool") as step:
+                        step.input = state.action_args or {}
+
+                        run, = await agent.run_actions(state)
+                        action_result = run.output
+                        results = [action_result]
+                        cpu = f", cpu {run.cpu_time:.2f}s" if run.cpu_time is not None else ""
+                        step.name = f"{state.action_name} ({run.status}, {run.wall_time:.2f}s{cpu})"
+                        step.output = action_result
 
                 async with cl.Step(name="Observation", type="tool") as step:
                     step.output = action_result
 
-                agent.add_observation(action_result)
+                agent.add_observation(action_result, state.actions, results)
 
                 current_prompt = "Observation: (see history for result)"
 
@@ -0,0 +1,125 @@
+"""
+多会话负载测试：在一个进程中创建 N 个会话，对本地桩模型服务（src/stub_llm.py，运行在子进程中）并发跑若干轮对话，
+统计每个会话的内存占用与整体吞吐。--mode isolated 模拟旧版 app.py（每个会话各自构造 ToolManager 与客户端连接池）。
+
+桩模型不访问外网：第一步返回一次 calculator 调用，第二步返回 Answer，按 --token-rate 逐 token 输出，
+因此测到的是 Agent 循环、解析、工具调度与 HTTP 连接池本身的开销。
+
+用法（在项目根目录）:
+    python benchmarks/load_sessions.py [--sessions 50] [--turns 3] [--mode shared|isolated]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import tracemalloc
+from openai import AsyncOpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DASHSCOPE_API_KEY", "stub")
+
+from src import ToolManager, ReactAgent, AgentService   # noqa: E402
+from src.stub_llm import StubLLMServer                  # noqa: E402
+
+ACTION = "@@@ Thought\n计算一下。\n\n@@@ Action\ncalculator\n\n@@@ Args\n{\"expression\": \"6*7\"}\n"
+ANSWER = "@@@ Thought\n已经得到结果。\n\n@@@ Answer\n结果是 42。\n"
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def create_sessions(mode, n, base_url):
+    client = AsyncOpenAI(api_key="stub", base_url=base_url)
+    if mode == "shared":
+        service = AgentService(client=client)
+        return service, [service.create_session() for _ in range(n)]
+    service = AgentService(tool_manager=ToolManager(), client=client)
+    agents = []
+    for _ in range(n):
+        # 旧版行为：每个会话一个注册表与一个客户端（连接池）
+        agents.append(ReactAgent(ToolManager(), client=AsyncOpenAI(api_key="stub", base_url=base_url)))
+    return service, agents
+
+
+def seed_memory():
+    """没有记忆索引时写入一个空索引（与 save_memory 写出的结构一致），dashboard 每次请求都会查询它；返回是否新建"""
+    path = os.path.join("memory", "index.json")
+    if os.path.exists(path):
+        return False
+    os.makedirs("memory", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"memories": {}, "categories": {}, "keyword_index": {}, "total_memories": 0}, f)
+    return True
+
+
+async def run(args):
+    seeded = seed_memory()
+    server = StubLLMServer([ACTION, ANSWER], args.token_rate, args.latency)
+    base_url = server.serve_in_process()
+    AsyncOpenAI(api_key="stub", base_url=base_url)     # 预热 openai / httpx 的首次构造开销，不计入会话创建
+    tracemalloc.start()
+    base_traced, base_rss = tracemalloc.get_traced_memory()[0], rss_mb()
+    t0 = time.perf_counter()
+    service, agents = create_sessions(args.mode, args.sessions, base_url)
+    create_s = time.perf_counter() - t0
+    traced, rss = tracemalloc.get_traced_memory()[0], rss_mb()
+    tracemalloc.stop()
+
+    latencies = []
+
+    async def session_loop(agent):
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            answer = await service.run_turn(agent, f"第 {turn} 个问题：6 乘以 7 等于多少？")
+            assert answer, "stub session did not finish"
+            latencies.append(time.perf_counter() - start)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(session_loop(agent) for agent in agents))
+    elapsed = time.perf_counter() - t0
+    turns = args.sessions * args.turns
+    latencies.sort()
+
+    print(f"mode={args.mode} sessions={args.sessions} turns/session={args.turns}")
+    print(f"create: {create_s * 1000:.1f} ms total, {create_s * 1000 / args.sessions:.2f} ms/session")
+    print(f"memory: {(traced - base_traced) / args.sessions / 1024:.1f} KiB/session (tracemalloc), "
+          f"RSS +{rss - base_rss:.1f} MiB")
+    print(f"stub server: {server.remote_stats()}")
+    print(f"throughput: {turns / elapsed:.1f} turns/s, {turns * 2 / elapsed:.1f} steps/s "
+          f"(turn p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f} ms)")
+    await service.aclose()
+    server.shutdown()
+    # 清理本次测试产生的会话日志
+    for agent in agents:
+        agent.logger.close()
+        for path in (agent.logger.log_file, agent.logger.event_file):
+            if path and os.path.exists(path):
+                os.remove(path)
+    if seeded:
+        os.remove(os.path.join("memory", "index.json"))
+        if not os.listdir("memory"):
+            os.rmdir("memory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--mode", choices=("shared", "isolated"), default="shared")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="桩模型每秒输出的 token 数，0 表示不限速")
+    parser.add_argument("--latency", type=float, default=0.0, help="桩模型首 token 前的延迟（秒）")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+ReAct 循环端到端基准：按脚本驱动 ReactAgent / Parser / ToolManager / Context，对本地桩模型（src/stub_llm.py，
+运行在子进程中）跑多步场景，统计各阶段耗时（p50 / p99）、内存分配与峰值 RSS，结果写成 JSON，可与基线比较。
+
+场景：
+    file_search     list_files -> search_files_by_content -> read_file
+    memory_lookup   search_memory -> get_all_memories（先写入若干条记忆）
+    python_repl     连续多次 python_repl，变量在调用之间保留
+    long_context    多轮读取大文件，TOKEN_LIMIT 调小以触发分层压缩
+
+每个场景在独立的子进程、临时工作目录中运行（记忆、日志、workspace 都不会写进项目目录），峰值 RSS 互不影响。
+
+用法（在项目根目录）:
+    python benchmarks/react_loop.py [--scenario file_search ...] [--repeat 5] [--output benchmarks/results/latest.json]
+    python benchmarks/react_loop.py --baseline benchmarks/results/baseline.json [--threshold 0.15]
+    python benchmarks/react_loop.py --save-baseline benchmarks/results/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import argparse
+import platform
+import resource
+import tempfile
+import functools
+import subprocess
+import tracemalloc
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ("prompt_build", "compression", "first_token", "stream", "stream_parse", "parse_state",
+          "tool_exec", "log_write")
+
+
+def action(tool, args, thought="执行下一步。"):
+    return f"@@@ Thought\n{thought}\n\n@@@ Action\n{tool}\n\n@@@ Args\n{json.dumps(args, ensure_ascii=False)}\n"
+
+
+def repl(code, thought="用 Python 计算。"):
+    return f"@@@ Thought\n{thought}\n\n@@@ Action\npython_repl\n\n@@@ Args\n~~~ python\n{code}\n~~~\n"
+
+
+def answer(text):
+    return f"@@@ Thought\n已经完成。\n\n@@@ Answer\n{text}\n"
+
+
+def scenarios():
+    """场景：用户问题列表 + 桩模型按顺序回放的回复（每轮以 Answer 结束）+ 配置覆盖"""
+    src = os.path.join(ROOT, "src")
+    utils = os.path.join(src, "utils.py")
+    return {
+        "file_search": {
+            "questions": ["找一下项目里哪些文件用到了 ToolExecutor，并看看它的定义。"],
+            "replies": [
+                action("list_files", {"path": src}),
+                action("search_files_by_content", {"directory": src, "search_text": "ToolExecutor"}),
+                action("read_file", {"file_name": os.path.join(src, "executor.py")}),
+                answer("ToolExecutor 定义在 src/executor.py，由 ToolManager 使用。"),
+            ],
+        },
+        "memory_lookup": {
+            "setup": [("save_memory", {"key": f"偏好{i}", "value": f"用户喜欢第 {i} 种代码风格",
+                                       "keywords": ["偏好", "代码风格", f"k{i}"]}) for i in range(20)],
+            "questions": ["我之前说过喜欢什么代码风格？"],
+            "replies": [
+                action("search_memory", {"keyword": "代码风格"}),
+                action("get_all_memories", {}),
+                answer("你偏好的代码风格已记录在记忆中。"),
+            ],
+        },
+        "python_repl": {
+            "questions": ["帮我算一下 1 到 10000 的平方和，再求它的各位数字之和。"],
+            "replies": [
+                repl("nums = list(range(1, 10001))\nprint(len(nums))"),
+                repl("total = sum(n * n for n in nums)\nprint(total)"),
+                repl("digits = sum(int(d) for d in str(total))\nprint(digits)"),
+                repl("import statistics\nprint(statistics.mean(nums), statistics.pstdev(nums))"),
+                answer("平方和与各位数字之和已经算出。"),
+            ],
+        },
+        "long_context": {
+            "overrides": {"TOKEN_LIMIT": 40000, "RETAIN_RECENT": 8},
+            "questions": [f"第 {i} 次：读一下 src/utils.py，告诉我 ToolManager 有哪些方法。" for i in range(12)],
+            "replies": [action("read_file", {"file_name": utils}), answer("ToolManager 的方法已列出。")],
+        },
+    }
+
+
+class PhaseTimer:
+    """给被测对象的方法套上计时包装，按阶段收集每次调用的耗时（秒）"""
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, phase, func):
+        if inspect.iscoroutinefunction(func):
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.samples[phase].append(time.perf_counter() - start)
+        else:
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.samples[phase].append(time.perf_counter() - start)
+        return functools.wraps(func)(wrapper)
+
+    def instrument_client(self, client):
+        create = client.chat.completions.create
+        timer = self
+
+        class TimedStream:
+            """记录首个 chunk 与整条流的耗时；支持 agent 使用的 async for 与 close()"""
+            def __init__(self, stream, start):
+                self.stream, self.start = stream, start
+
+            def __aiter__(self):
+                return self._iterate()
+
+            async def _iterate(self):
+                first = True
+                try:
+                    async for chunk in self.stream:
+                        if first:
+                            timer.samples["first_token"].append(time.perf_counter() - self.start)
+                            first = False
+                        yield chunk
+                finally:
+                    timer.samples["stream"].append(time.perf_counter() - self.start)
+
+            async def close(self):
+                await self.stream.close()
+
+        async def timed_create(*args, **kwargs):
+            start = time.perf_counter()
+            return TimedStream(await create(*args, **kwargs), start)
+
+        client.chat.completions.create = timed_create
+
+    def instrument_agent(self, agent):
+        agent._with_dashboard = self.wrap("prompt_build", agent._with_dashboard)
+        agent._build_system_prompt = self.wrap("prompt_build", agent._build_system_prompt)
+        agent.context.compress = self.wrap("compression", agent.context.compress)
+        agent.logger.log = self.wrap("log_write", agent.logger.log)
+        agent.parse_state = self.wrap("parse_state", agent.parse_state)
+        new_parser = agent.protocol.new_parser
+
+        def timed_parser():
+            parser = new_parser()
+            parser.feed = self.wrap("stream_parse", parser.feed)
+            return parser
+        agent.protocol.new_parser = timed_parser
+
+    def instrument_tools(self, tool_manager):
+        tool_manager.arun = self.wrap("tool_exec", tool_manager.arun)
+        tool_manager.arun_many = self.wrap("tool_exec", tool_manager.arun_many)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(samples):
+    return {"count": len(samples), "total_ms": sum(samples) * 1000,
+            "p50_ms": percentile(samples, 0.5) * 1000, "p99_ms": percentile(samples, 0.99) * 1000}
+
+
+async def run_scenario(name, spec, repeat, token_rate):
+    """子进程中执行：返回一个场景的结果字典"""
+    from openai import AsyncOpenAI
+    from src import AgentService
+    from src.config import settings
+    from src.stub_llm import StubLLMServer
+
+    for key, value in spec.get("overrides", {}).items():
+        setattr(settings, key, value)
+    server = StubLLMServer(spec["replies"], token_rate=token_rate)
+    base_url = server.serve_in_process()
+    service = AgentService(client=AsyncOpenAI(api_key="stub", base_url=base_url))
+    for tool, args in spec.get("setup", []):
+        service.tool_manager.execute(tool, args)
+
+    timer = PhaseTimer()
+    timer.instrument_client(service.client)
+    timer.instrument_tools(service.tool_manager)
+
+    async def one_session(turn_samples):
+        agent = service.create_session()
+        timer.instrument_agent(agent)
+        steps_before = service.stats["steps"]
+        for question in spec["questions"]:
+            start = time.perf_counter()
+            if await service.run_turn(agent, question) is None:
+                raise RuntimeError(f"{name}: turn did not reach an Answer")
+            turn_samples.append(time.perf_counter() - start)
+        service.close_session(agent.session_id)
+        return service.stats["steps"] - steps_before
+
+    await one_session([])           # 预热：导入工具模块、启动 python_repl 子进程、建立连接
+    timer.samples.clear()
+    turns, steps, start = [], 0, time.perf_counter()
+    for _ in range(repeat):
+        steps += await one_session(turns)
+    wall = time.perf_counter() - start
+    phases = {phase: summarize(timer.samples.get(phase, [])) for phase in PHASES}
+
+    # 分配统计单独跑一遍：tracemalloc 会显著拖慢上面的计时
+    tracemalloc.start()
+    await one_session([])
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+
+    server.shutdown()
+    await service.aclose()
+    return {
+        "scenario": name,
+        "repeat": repeat,
+        "turns": len(turns),
+        "steps": steps,
+        "wall_s": wall,
+        "turn": summarize(turns),
+        "phases": phases,
+        "alloc": {"peak_kib": peak / 1024, "retained_kib": current / 1024, "retained_blocks": blocks},
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_child(name, repeat, token_rate):
+    """在临时工作目录的子进程中运行一个场景"""
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir:
+        # 空的记忆索引（与 save_memory 写出的结构一致），dashboard 每次请求都会查询它
+        os.makedirs(os.path.join(workdir, "memory"), exist_ok=True)
+        with open(os.path.join(workdir, "memory", "index.json"), 'w', encoding='utf-8') as f:
+            json.dump({"memories": {}, "categories": {}, "keyword_index": {}, "total_memories": 0}, f)
+        env = dict(os.environ, PYTHONPATH=ROOT, DASHSCOPE_API_KEY="stub")
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name,
+                               "--repeat", str(repeat), "--token-rate", str(token_rate)],
+                              cwd=workdir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"scenario {name} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_result(result):
+    turn = result["turn"]
+    print(f"\n== {result['scenario']}: {result['turns']} turns / {result['steps']} steps in {result['wall_s']:.2f}s | "
+          f"turn p50 {turn['p50_ms']:.1f} ms, p99 {turn['p99_ms']:.1f} ms | "
+          f"alloc peak {result['alloc']['peak_kib']:.0f} KiB | peak RSS {result['peak_rss_mib']:.1f} MiB")
+    print(f"   {'phase':<14}{'count':>7}{'total ms':>11}{'p50 ms':>10}{'p99 ms':>10}")
+    for phase, stats in result["phases"].items():
+        print(f"   {phase:<14}{stats['count']:>7}{stats['total_ms']:>11.1f}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+
+def compare(results, baseline, threshold, floor_ms=0.05):
+    """与基线比较 p50 / p99 与内存，返回回归项列表"""
+    regressions = []
+    base = {r["scenario"]: r for r in baseline["results"]}
+    print(f"\n== compare with baseline ({baseline.get('created', '?')}), threshold +{threshold:.0%}")
+    for result in results:
+        old = base.get(result["scenario"])
+        if old is None:
+            print(f"   {result['scenario']}: not in baseline")
+            continue
+        metrics = [("turn.p50_ms", result["turn"]["p50_ms"], old["turn"]["p50_ms"]),
+                   ("turn.p99_ms", result["turn"]["p99_ms"], old["turn"]["p99_ms"]),
+                   ("alloc.peak_kib", result["alloc"]["peak_kib"], old["alloc"]["peak_kib"]),
+                   ("peak_rss_mib", result["peak_rss_mib"], old["peak_rss_mib"])]
+        metrics += [(f"{phase}.p50_ms", stats["p50_ms"], old["phases"].get(phase, {}).get("p50_ms", 0.0))
+                    for phase, stats in result["phases"].items()]
+        for metric, new_value, old_value in metrics:
+            delta = new_value - old_value
+            ratio = delta / old_value if old_value else 0.0
+            worse = ratio > threshold and (not metric.endswith("_ms") or delta > floor_ms)
+            if worse:
+                regressions.append((result["scenario"], metric, old_value, new_value))
+            if worse or abs(ratio) > threshold:
+                mark = "REGRESSION" if worse else "improved" if ratio < 0 else "slower (below noise floor)"
+                print(f"   {result['scenario']:<14}{metric:<22}{old_value:>11.3f} -> {new_value:>11.3f} "
+                      f"({ratio:+.1%}) {mark}")
+    if not regressions:
+        print("   no regressions")
+    return regressions
+
+
+def write_json(path, payload):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"\nresults written to {path}")
+
+
+def main():
+    specs = scenarios()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", nargs="*", choices=sorted(specs), help="默认运行全部场景")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景重复的会话数")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="桩模型每秒 token 数，0 表示不限速")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "latest.json"))
+    parser.add_argument("--baseline", help="与该基线 JSON 比较，有回归时以状态码 1 退出")
+    parser.add_argument("--threshold", type=float, default=0.15, help="判定回归的相对变慢比例")
+    parser.add_argument("--save-baseline", help="把本次结果另存为基线")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = asyncio.run(run_scenario(args.child, specs[args.child], args.repeat, args.token_rate))
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    results = []
+    for name in args.scenario or list(specs):
+        results.append(run_child(name, args.repeat, args.token_rate))
+        print_result(results[-1])
+
+    payload = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+               "platform": platform.platform(), "repeat": args.repeat, "token_rate": args.token_rate,
+               "results": results}
+    write_json(args.output, payload)
+    if args.save_baseline:
+        write_json(args.save_baseline, payload)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+控制台流式渲染基准：按固定 token 速率把一段合成的长回复（Plan / Thought / Answer，含列表、表格与代码块）
+喂给 ConsoleUI.render_stream_loop，统计每 10k 个 token 消耗的 CPU 时间（含 Live 刷新线程）、相对输出速度的滞后与写到终端的字节数。
+画面写入内存中的虚拟终端，不占用真实终端。
+
+--mode rebuild_all 模拟旧版渲染循环：每个块都用正则重新扫描全文、重建全部 Markdown / Panel 并调用 live.update，
+代价随回复长度平方增长，可用 --tokens 调小后与 incremental 比较；--mode none 只消费流并解析、不渲染，
+是前两者共同的底数。
+
+用法（在项目根目录）:
+    python benchmarks/render_stream.py [--tokens 10000] [--token-rate 500] [--mode incremental rebuild_all none]
+"""
+import io
+import os
+import re
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DASHSCOPE_API_KEY", "stub")
+
+from rich.console import Console, Group         # noqa: E402
+from rich.live import Live                      # noqa: E402
+from rich.panel import Panel                    # noqa: E402
+from rich.markdown import Markdown              # noqa: E402
+from src import ConsoleUI                       # noqa: E402
+from src.config import settings                 # noqa: E402
+from src.interface import format_args           # noqa: E402
+from src.utils import StreamParser              # noqa: E402
+
+PARAGRAPH = """
+### 第 {i} 部分
+
+这一部分说明 **步骤 {i}** 的细节：先读取配置，再根据 `context` 的大小决定是否压缩，最后把结果写回日志。
+需要注意的是，重复调用同一个工具时应当优先命中缓存，而不是重新执行。
+
+- 要点一：输入参数需要校验，错误信息要能指导模型修正；
+- 要点二：超时预算按工具单独设置，默认 120 秒；
+- 要点三：结果超过 500 字时只显示开头。
+
+| 指标 | 数值 |
+| --- | --- |
+| 步骤 | {i} |
+| 耗时 | {ms} ms |
+
+```python
+def step_{i}(state):
+    return {{"step": {i}, "ok": True}}
+```
+"""
+
+
+def build_response(tokens):
+    """合成一段约 tokens 个 token 的回复（按约 4 个字符一个 token 切块）"""
+    plan = "@@@ Plan\n1. 读取资料\n2. 整理要点\n3. 写出报告\n\n"
+    thought = "@@@ Thought\n" + "先回顾已经得到的信息，再决定报告的结构。" * 20 + "\n\n"
+    body, i = [], 0
+    while len(plan) + len(thought) + sum(map(len, body)) < tokens * 4:
+        i += 1
+        body.append(PARAGRAPH.format(i=i, ms=i * 37 % 1000))
+    text = plan + thought + "@@@ Answer\n" + ''.join(body)
+    return [text[j:j + 4] for j in range(0, tokens * 4, 4)]
+
+
+async def stream(chunks, rate):
+    start = time.monotonic()
+    for i, chunk in enumerate(chunks):
+        delay = start + i / rate - time.monotonic()
+        await asyncio.sleep(delay if delay > 0 else 0)
+        yield chunk
+
+
+async def rebuild_all(console, generator):
+    """旧版的渲染方式：每个块都重新扫描全文并重建全部面板"""
+    full_text = ""
+    with Live(Panel("..."), console=console, refresh_per_second=5, vertical_overflow='auto') as live:
+        async for chunk in generator:
+            full_text += chunk
+
+            def get_section(name):
+                matches = list(re.finditer(f"(?i)@@@\\s*{name}\\s*(.*?)(?=\\n@@@\\s|$)", full_text, re.DOTALL))
+                return matches[-1].group(1).strip() if matches else None
+
+            plan, thought, action, args, answer = (get_section(name) for name in
+                                                   ("Plan", "Thought", "Action", "Args", "Answer"))
+            panels = []
+            if plan:
+                panels.append(Panel(Markdown(plan), title="📅 Plan"))
+            if thought:
+                panels.append(Panel(Markdown(thought), title="🤖 Thought"))
+            if action:
+                panels.append(Panel(Markdown(format_args(action, args or "")), title=action))
+            if answer:
+                panels.append(Panel(Markdown(answer), title="✅ Final Result"))
+            live.update(Group(*panels or [Panel(full_text)]))
+    return full_text
+
+
+async def run(mode, chunks, rate, width):
+    console = Console(file=io.StringIO(), force_terminal=True, width=width, height=50)
+    generator = stream(chunks, rate)
+    cpu, wall = time.process_time(), time.perf_counter()
+    if mode == "incremental":
+        ui = ConsoleUI()
+        ui.console = console
+        await ui.render_stream_loop(generator)
+    elif mode == "none":
+        parser = StreamParser()
+        async for chunk in generator:
+            parser.feed(chunk)
+    else:
+        await rebuild_all(console, generator)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {"cpu": cpu, "wall": wall, "lag": wall - len(chunks) / rate, "output_kb": console.file.tell() / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=10000)
+    parser.add_argument("--token-rate", type=float, default=500, help="每秒输出的 token 数")
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--mode", nargs="+", default=["incremental"], choices=("incremental", "rebuild_all", "none"))
+    args = parser.parse_args()
+
+    chunks = build_response(args.tokens)
+    print(f"{args.tokens} tokens ({sum(map(len, chunks))} chars) at {args.token_rate:.0f} tokens/s, "
+          f"{settings.UI_REFRESH_PER_SECOND} fps")
+    for mode in args.mode:
+        result = asyncio.run(run(mode, chunks, args.token_rate, args.width))
+        per_10k = result["cpu"] * 10000 / args.tokens
+        print(f"{mode:<12} cpu {result['cpu']:7.2f}s ({per_10k:.2f}s / 10k tokens)  wall {result['wall']:6.2f}s  "
+              f"lag {result['lag']:6.2f}s  terminal output {result['output_kb']:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
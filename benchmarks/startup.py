@@ -0,0 +1,76 @@
+"""
+启动耗时基准：在全新的子进程中分别以懒加载 / 立即加载两种模式构造 ToolManager，
+统计导入 src 包（即 main.py / app.py 的冷启动）与首次执行一个工具的耗时，以及已加载的重量级依赖。
+
+用法（在项目根目录）:
+    python benchmarks/startup.py [--runs 5]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("sympy", "reportlab", "bs4", "html2text", "mcp", "requests")
+
+PROBE = f"""
+import sys, time, json
+t0 = time.perf_counter()
+from src import ToolManager
+t1 = time.perf_counter()
+tools = ToolManager()
+t2 = time.perf_counter()
+tools.execute("calculator", {{"expression": "1+1"}})
+t3 = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "registry_ms": (t2 - t1) * 1000,
+    "first_exec_ms": (t3 - t2) * 1000,
+    "tools": len(tools.tools),
+    "modules": len(sys.modules),
+    "heavy": [m for m in {HEAVY!r} if m in sys.modules],
+}}))
+"""
+
+
+def probe(lazy, clear_manifest=False):
+    if clear_manifest:
+        try:
+            os.remove(os.path.join(ROOT, 'src', 'tools', '__pycache__', 'tool_manifest.json'))
+        except OSError:
+            pass
+    env = dict(os.environ, LAZY_TOOLS='1' if lazy else '0', PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarize(name, samples):
+    median = {k: statistics.median(s[k] for s in samples) for k in ("import_ms", "registry_ms", "first_exec_ms")}
+    last = samples[-1]
+    print(f"{name:<22} import {median['import_ms']:8.1f} ms | registry {median['registry_ms']:6.1f} ms | "
+          f"first exec {median['first_exec_ms']:6.1f} ms | modules {last['modules']:5d} | "
+          f"tools {last['tools']} | heavy: {', '.join(last['heavy']) or '-'}")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    probe(lazy=False)   # 预热字节码缓存，避免第一次运行的编译开销干扰比较
+    eager = summarize("eager", [probe(lazy=False) for _ in range(args.runs)])
+    cold = summarize("lazy (manifest cold)", [probe(lazy=True, clear_manifest=True) for _ in range(args.runs)])
+    warm = summarize("lazy (manifest warm)", [probe(lazy=True) for _ in range(args.runs)])
+
+    base = eager["import_ms"] + eager["registry_ms"]
+    for name, result in (("manifest cold", cold), ("manifest warm", warm)):
+        total = result["import_ms"] + result["registry_ms"]
+        print(f"startup speedup ({name}): {base / total:.2f}x ({base:.0f} ms -> {total:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,11 @@ import asyncio
 
 async def main():
     from pathlib import Path
-    from src import ToolManager, Parser, ReactAgent, ConsoleUI
+    from src import ToolManager, ReactAgent, ConsoleUI
+    from src.logstore import resolve_log
     from openai import APIConnectionError, AuthenticationError
     from datetime import datetime
+    from rich.markdown import Markdown
 
     # 依赖注入
     tools = ToolManager()
@@ -31,10 +33,33 @@ async def main():
                 agent.reset()
                 ui.console.print("[yellow]Memory Cleared[/yellow]")
                 continue
+            elif user_input.lower() == 'trace':
+                # 最近若干步的各阶段耗时（进程内环形缓冲）
+                ui.console.print(Markdown(agent.tracer.buffer.format_summary()))
+                continue
+            elif user_input.lower().startswith('search '):
+                # 全文搜索历史会话（logs/history.db），不经过模型
+                import sqlite3
+                from src.history import get_history_index, format_hits
+                try:
+                    ui.console.print(format_hits(get_history_index().search(user_input[7:].strip())), markup=False)
+                except sqlite3.Error as e:
+                    ui.print_error(f"搜索历史记录出错: {e}")
+                continue
             elif user_input.lower() == 'reload':
                 ui.console.print("[yellow]Reloading History[/yellow]")
-                fname = input("请输入历史记录文件名 chat_**.md: ").strip()
-                path = Path(f'./logs/{fname}')
+                # 最近的会话来自 logs/index.json，不列目录
+                recent = agent.logger.store.recent(10)
+                for i, (name, entry) in enumerate(recent, 1):
+                    flag = f" [{entry['compressed']}]" if entry['compressed'] else ""
+                    ui.console.print(f"[dim]{i:>2}. {name}.md  {entry['entries']} entries, "
+                                     f"{entry['bytes'] / 1024:.1f} KiB{flag}[/dim]")
+                fname = input("请输入序号或历史记录文件名 chat_**.md: ").strip()
+                if fname.isdigit() and 1 <= int(fname) <= len(recent):
+                    path = Path(agent.logger.store.path_of(recent[int(fname) - 1][0]))
+                else:
+                    # 手动输入的 chat_*.md 可能已被后台压缩
+                    path = Path(resolve_log(Path(agent.logger.store.root) / fname))
                 if path.exists():
                     agent.load_history(path)
                     ui.console.print("[yellow]History Reloaded[/yellow]")
@@ -52,12 +77,20 @@ async def main():
                 step += 1
                 ui.console.print(f"[dim]Step {step}[/dim]")
 
+                # 工具文件在上一步被修改过（监视器已防抖）：先增量重载，把新的工具列表告诉模型
+                diff = await agent.apoll_tool_changes()
+                if diff:
+                    reload_note = f"Observation: Tools auto-reloaded. {diff.summary()}"
+                    ui.print_observation(reload_note)
+                    current_prompt = f"{reload_note}\n{current_prompt}"
+
                 # 构造 Prompt，直接读取 agent.usage (如果是第一轮则为 None)
-                prompt_content = current_prompt + f"[CURRENT STEP: {step}]\n[CURRENT TIME: {datetime.now()}]\n[TOTAL TOKEN USAGE: {agent.total_tokens}]"
+                prompt_content = current_prompt + f"[CURRENT STEP: {step}]\n[CURRENT TIME: {datetime.now()}]\n[TOTAL TOKEN USAGE: {agent.token_usage}]"
 
                 # 1. 创建生成任务 (允许打断)
-                # agent.step_stream 现在直接 yield 字符串
-                gen_coro = ui.render_stream_loop(agent.step_stream(prompt_content))
+                # agent.step_stream 直接 yield 字符串，并在生成过程中增量解析到 parser
+                parser = agent.protocol.new_parser()
+                gen_coro = ui.render_stream_loop(agent.step_stream(prompt_content, parser), parser)
                 task = asyncio.create_task(gen_coro)
 
                 full_response = ""
@@ -81,8 +114,8 @@ async def main():
                     ui.print_error(f"Runtime Error: {e}")
                     break
 
-                # 2. 解析响应
-                state = Parser.parse_response(full_response)
+                # 2. 解析响应 (流式过程中已完成解析)
+                state = agent.parse_state(parser)
 
                 if state.plan:
                     agent.update_plan(state.plan)
@@ -90,7 +123,8 @@ async def main():
                 # 3. 分支处理
                 if state.final_answer:
                     # 打印最终 Token 使用量
-                    ui.console.print(f"[dim green]Total Tokens: {agent.total_tokens}[/dim green]")
+                    ui.console.print(f"[dim green]Total Tokens: {agent.token_usage} "
+                                     f"(Saved ≈ {agent.stream_stats['tokens_saved']})[/dim green]")
                     break
 
                 if state.is_quit:
@@ -102,8 +136,8 @@ async def main():
                     break
 
                 if state.is_refresh:
-                    agent.reload_toolset()
-                    current_prompt = "Observation: Tools reloaded successfully."
+                    diff = agent.reload_toolset()
+                    current_prompt = f"Observation: Tools reloaded successfully. {diff.summary()}"
                     ui.print_observation(current_prompt)
                     continue
 
@@ -114,9 +148,15 @@ async def main():
                     continue
 
                 if state.has_action:
-                    result = tools.execute(state.action_name, state.action_args or {})
+                    # async 工具直接在事件循环上执行，同步工具交给执行器（每个工具都有超时预算）；并行模式下并发执行
+                    runs = await agent.run_actions(state)
+                    results = [run.output for run in runs]
+                    result = tools.format_results(state.actions, results) if len(runs) > 1 else results[0]
+                    for run in runs:
+                        cpu = f", cpu {run.cpu_time:.2f}s" if run.cpu_time is not None else ""
+                        ui.console.print(f"[dim]⏱ {run.name} [{run.status}] wall {run.wall_time:.2f}s{cpu} ({run.isolation})[/dim]")
                     ui.print_observation(result)
-                    agent.add_observation(result)
+                    agent.add_observation(result, state.actions, results)
                     current_prompt = "Observation: (See history for result)"
                     ui.print_observation(current_prompt)
 
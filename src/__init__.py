@@ -2,4 +2,5 @@ from .agent import ReactAgent
 from .config import settings
 from .interface import ConsoleUI
 from .system_instructions import sys_prompt
-from .utils import ToolManager, Parser
\ No newline at end of file
+from .utils import ToolManager, Parser, StreamParser
+from .service import AgentService, get_service
\ No newline at end of file
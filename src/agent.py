@@ -1,94 +1,422 @@
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, OpenAI
 from src.config import settings
 from src.utils import LogManager, Context
+from src.compaction import LLMSummarizer
+from src.protocols import get_protocol
+from src.watcher import ToolWatcher
+from src.tracing import get_tracer
+from src.logstore import open_log, SUFFIXES
+from src.checkpoint import Checkpoint
+from src import tools
 from copy import deepcopy
 import importlib
+import asyncio
+import hashlib
+import time
+import re
 import os
 
 
 class ReactAgent:
-    def __init__(self, tool_manager):
-        self.client = AsyncOpenAI(api_key=os.environ["DASHSCOPE_API_KEY"],
-                                  base_url=r"https://dashscope.aliyuncs.com/compatible-mode/v1")
+    def __init__(self, tool_manager, client=None, watcher=None, session_id=None):
+        """client / watcher 为空时自行创建；多会话服务（见 src/service.py）传入进程内共享的实例"""
+        self.client = client or self.build_client()
         self.tool_manager = tool_manager
-        self.context = Context(settings)
-        self.logger = LogManager('logs')
+        self.protocol = get_protocol(settings.PROTOCOL)
+        self.context = Context(settings, self._build_summarizer())
+        self.session_id = session_id
+        self.logger = LogManager('logs', session_id)
         self.current_plan = "暂无计划 (No Plan Yet)"
         self.total_tokens = 0
+        # early_stops: 提前关闭流的次数；tokens_saved: 据抽样平均尾长估算的节省量
+        # estimated_tokens: total_tokens 中按本地计数器估算的部分（提前关闭的流拿不到服务端的 usage）
+        self.stream_stats = {"early_stops": 0, "tokens_saved": 0, "tail_samples": 0, "avg_tail_tokens": 0.0,
+                             "estimated_tokens": 0}
+        self._ready_count = 0
+        # 系统提示前缀的稳定性统计：prefix_changes 为前缀变化次数，stable_calls 为前缀可复用的请求数
+        self.prompt_stats = {"calls": 0, "stable_calls": 0, "prefix_changes": 0,
+                             "cached_tokens": 0, "prefix_hash": None}
+        # 每种动作协议的步数、重试（解析失败 / 未给出动作或回答）次数，以及本地修复 Args 省去的重试次数
+        self.protocol_stats = {}
+        self._system_prompt = None
+        self._tools_version = None      # 系统提示对应的工具注册表版本
+        self.watcher = watcher if watcher is not None else self.build_watcher()
+        # 追踪：每步一个 step span，模型调用 / 解析 / 工具 / 日志写入等 span 挂在它下面（见 src/tracing.py）
+        self.tracer = get_tracer()
+        self._step_span = None
+        self._call_span = None
+        self._step_count = 0
+        self._last_usage = None
+        self._stopped_early = False
+        self._checkpoint = None
         self.reset(False)
 
+    @classmethod
+    def build_client(cls):
+        return AsyncOpenAI(api_key=os.environ["DASHSCOPE_API_KEY"], base_url=settings.BASE_URL)
+
     def reset(self, reload_tools=True):
-        self.context.reset(self._build_system_prompt())
+        self.context.reset(self._build_system_prompt(reload=True))
         self.current_plan = "暂无计划 (No Plan Yet)"
         self.logger.init_log()
+        self._checkpoint = Checkpoint(Checkpoint.path_for(self.logger.log_file)) if settings.CHECKPOINT else None
         if reload_tools:
             self.reload_toolset()
 
     def reload_toolset(self):
-        self.tool_manager.reload()
-        if self.context():
-            self.context.append("system", self._build_system_prompt())
-        else:
-            self.context.append("system", self._build_system_prompt())
+        """增量重载工具并按需替换系统提示，返回本会话上次构建系统提示以来的 ReloadDiff"""
+        errors = self.tool_manager.reload().errors
+        return self._sync_tools(errors)
+
+    def _sync_tools(self, errors=None):
+        diff = self.tool_manager.changes_since(self._tools_version)
+        diff.errors.update(errors or {})
+        prompt = self._build_system_prompt(reload=True)
+        if not self.context():
+            self.context.append("system", prompt)
+        elif self.context()[0]['content'] != prompt:
+            # 工具目录变化时原地替换系统提示，而不是再追加一份完整的系统提示
+            self.context.replace_content(0, prompt)
+        return diff
+
+    @staticmethod
+    def build_watcher():
+        if not settings.WATCH_TOOLS:
+            return None
+        return ToolWatcher(tools.package_path, settings.WATCH_DEBOUNCE, settings.WATCH_BACKEND,
+                           settings.WATCH_POLL_INTERVAL).start()
+
+    def poll_tool_changes(self):
+        """
+        两步之间调用：监视器发现工具文件变化时增量重载；注册表被（其它会话）更新过时同步系统提示。
+        返回错过的变化 ReloadDiff；没有变化返回 None
+        """
+        errors = {}
+        if self.watcher is not None and self.watcher.consume():
+            errors = self.tool_manager.reload().errors
+        if self.tool_manager.version == self._tools_version and not errors:
+            return None
+        diff = self._sync_tools(errors)
+        return diff if diff else None
+
+    async def apoll_tool_changes(self):
+        """异步版 poll_tool_changes：先等防抖中的变化稳定（上一步刚写入的工具在这一步就能用上）"""
+        if self.watcher is not None:
+            await self.watcher.settle()
+        return self.poll_tool_changes()
+
+    def _build_summarizer(self):
+        """SUMMARIZER="llm" 时用模型生成压缩摘要，否则使用默认的抽取式摘要"""
+        if settings.SUMMARIZER == "llm":
+            return LLMSummarizer(OpenAI(api_key=os.environ["DASHSCOPE_API_KEY"], base_url=settings.BASE_URL),
+                                 settings.MODEL)
+        return None
+
+    def checkpoint(self):
+        """把本步对 Context 的修改追加到检查点（由后台线程写入）"""
+        if self._checkpoint is None or len(self.context) <= 1:
+            return
+        state = {"session": self.session_id, "plan": self.current_plan, "total_tokens": self.total_tokens,
+                 "steps": self._step_count, "protocol": self.protocol.name, "log_file": str(self.logger.log_file),
+                 "cache_keys": self.tool_manager.cache.recent_keys(), "time": time.time()}
+        self._checkpoint.save(self.context, state)
+
+    def resume(self, path, last_turns=None):
+        """
+        从检查点恢复会话：原样恢复消息结构与每条消息的 token 数、计划和 token 用量，并预热工具结果缓存；
+        系统提示按当前工具目录重建。last_turns 不为空时只载入最近 N 轮。
+        恢复后的会话写入新的日志与检查点。path 可以是 .ckpt，也可以是对应的 chat_*.md（含压缩后的后缀）。
+        """
+        path = Checkpoint.path_for(re.sub(r'\.(gz|zst)$', '', str(path)))
+        self.logger.flush()     # 检查点的最后几批可能还在本进程的写入队列里
+        entries, state, skipped = Checkpoint.load(path, last_turns)
+        self.reset()
+        system = (self.context()[0], self.context.token_counts[0])
+        if skipped:
+            note = {"role": "user", "content": f"[SYSTEM]: 会话从检查点恢复，较早的 {skipped} 条消息未载入。"}
+            entries.insert(0, (note, self.context.counter.count_message(note)))
+        self.context.set_entries([system] + entries)
+        self.current_plan = state.get("plan", self.current_plan)
+        self.total_tokens = state.get("total_tokens", 0)
+        warmed = self.tool_manager.cache.warm(state.get("cache_keys", ()))
+        self._log("System", f"Resumed from {path}: {len(entries)} messages "
+                            f"({skipped} skipped), {self.context.total_tokens} tokens, {warmed} cached results.")
+        self.checkpoint()
+        return state
 
     def load_history(self, history_path):
+        """
+        有检查点时按检查点恢复（见 resume）；没有检查点的旧日志退回到把整份记录作为一条消息读入。
+        检查点不可用（首次写入时崩溃、没有完整的 S 记录，或是空文件）时同样退回到读取日志
+        """
+        checkpoint = Checkpoint.path_for(re.sub(r'\.(gz|zst)$', '', str(history_path)))
+        if os.path.exists(checkpoint):
+            try:
+                return self.resume(checkpoint, settings.RESUME_TURNS)
+            except (ValueError, OSError):
+                # 删掉残缺的检查点，否则之后的追加会接在它没写完的最后一行后面
+                os.remove(checkpoint)
+        self.logger.flush()     # 读取的可能正是本进程还在排队写入的日志
         self.reset()
-        with open(history_path, 'r', encoding='utf-8') as file:
+        with open_log(history_path) as file:
             lines = file.readlines()
         lines = ''.join(lines)
         self.context.append(role='user', content=f'以下是对话记录：\n{str(lines)}')
-        self.logger.init_log(history_path)
+        if os.path.exists(history_path) and not str(history_path).endswith(tuple(SUFFIXES.values())):
+            # 继续写入原日志；已压缩的日志则保留 reset 新建的日志文件
+            self.logger.init_log(history_path)
+            if self._checkpoint is not None:
+                self._checkpoint = Checkpoint(Checkpoint.path_for(history_path))
 
     def update_plan(self, new_plan: str):
         self.current_plan = new_plan
         # 注意：current_plan不再出现在system prompt中，所以不需要更新system prompt
         # 保留这个方法是为了兼容性，其他代码可能调用它来更新current_plan属性
 
-    def _build_system_prompt(self):
+    def _build_system_prompt(self, reload=False):
+        """
+        构造字节级稳定的系统提示（工具目录 + 规则），只在 reset / 重载工具时重建，
+        以便上游的前缀缓存 (prompt caching) 命中。时间、记忆等易变信息见 _with_dashboard。
+        结果按 (注册表版本, 协议, system_instructions.py 的 mtime) 缓存在 ToolManager 中，共享注册表的会话复用同一份。
+        """
+        if self._system_prompt is not None and not reload:
+            return self._system_prompt
+        from src import system_instructions
+
+        def build():
+            importlib.reload(system_instructions)
+            if self.protocol.name == "function":
+                # 工具说明已经以 JSON Schema 形式随 tools 发送，不再重复写入系统提示
+                descriptions = "(工具说明见 function calling 的 tools 定义)"
+            else:
+                descriptions = self.tool_manager.get_descriptions()
+            structure = self.tool_manager.get_tools_structure()
+            return deepcopy(system_instructions.sys_prompt).replace('{tool_descriptions}', descriptions)\
+                .replace('{tool_structure}', structure)
+
+        source_mtime = os.stat(system_instructions.__file__).st_mtime_ns
+        self._system_prompt = self.tool_manager.memoize(('system_prompt', self.protocol.name, source_mtime), build)
+        self._tools_version = self.tool_manager.version
+        return self._system_prompt
+
+    def _with_dashboard(self, messages):
+        """把易变的仪表盘附在本次请求的最后一条用户消息之后（不写入历史，保持历史前缀稳定）"""
         from src import system_instructions
-        importlib.reload(system_instructions)
-        REACT_SYSTEM_PROMPT = system_instructions.sys_prompt
-        descriptions = self.tool_manager.get_descriptions()
-        structure = self.tool_manager.get_tools_structure()
-        return deepcopy(REACT_SYSTEM_PROMPT).replace('{tool_descriptions}', descriptions)\
-            .replace('{tool_structure}', structure)
-
-    async def model(self, user_input, name='qwen-plus', stream=True):
-        if len(self.context) % 50 == 0:
-            self.context.refresh(self._build_system_prompt())
+        last = messages[-1]
+        return messages[:-1] + [dict(role=last['role'], content=f"{last['content']}\n{system_instructions.dashboard()}")]
+
+    def _track_prefix(self, compressed):
+        stats = self.prompt_stats
+        prefix_hash = hashlib.sha1(self.context()[0]['content'].encode('utf-8')).hexdigest()[:12]
+        stats["calls"] += 1
+        if prefix_hash != stats["prefix_hash"]:
+            if stats["prefix_hash"] is not None:
+                stats["prefix_changes"] += 1
+            stats["prefix_hash"] = prefix_hash
+        elif not compressed:
+            stats["stable_calls"] += 1
+
+    def _log(self, role, content):
+        with self.tracer.span("log_write", parent=self._step_span, role=role, bytes=len(content.encode('utf-8'))):
+            self.logger.log(role, content)
+
+    def _begin_step(self):
+        if self._step_span is not None:
+            # 上一步有动作但没有写回结果（如执行工具时出错），在这里补上结束
+            self._end_step()
+        self._step_count += 1
+        self._step_span = self.tracer.start_span("step", parent=None, session=self.session_id,
+                                                 step=self._step_count, protocol=self.protocol.name)
+        return self._step_span
+
+    def _end_step(self, **attributes):
+        if self._step_span is not None:
+            self.tracer.end_span(self._step_span, **attributes)
+            self._step_span = None
+        self.checkpoint()
+
+    async def model(self, user_input, name=None, stream=True):
+        """发起一次模型调用；本次调用的 model_call span 保存在 self._call_span，由 step_stream 结束"""
         self.context.append(role="user", content=user_input)
-        self.logger.log("User", user_input)
-        if self.context.compress():
-            self.logger.log("System", "History compressed.")
-        return await self.client.chat.completions.create(
-            model=name,
-            messages=self.context(),
-            stream=stream,
-            stream_options={"include_usage": True},
-            temperature=0.5
-        )
-
-    async def step_stream(self, user_input):
+        self._log("User", user_input)
+        step = self._step_span
+        with self.tracer.span("compression", parent=step, messages=len(self.context)) as span:
+            compressed = False
+            if self.context.total_tokens >= settings.TOKEN_LIMIT:
+                # 摘要器可能同步调用模型（SUMMARIZER="llm"），放到线程里执行，不阻塞其它会话
+                compressed = await asyncio.to_thread(self.context.compress)
+            span.set(compressed=bool(compressed))
+        if compressed:
+            report = ", ".join(self.context.compactor.last_report)
+            span.set(report=report)
+            self._log("System", f"History compressed. ({report})")
+        self._track_prefix(compressed)
+        with self.tracer.span("prompt_build", parent=step):
+            messages = self._with_dashboard(self.context())
+            kwargs = self.protocol.request_kwargs(self.tool_manager)
+        model = name or settings.MODEL
+        self._call_span = self.tracer.start_span("model_call", parent=step, session=self.session_id, model=model,
+                                                 messages=len(messages))
+        try:
+            return await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=stream,
+                stream_options={"include_usage": True},
+                temperature=0.5,
+                **kwargs
+            )
+        except BaseException as e:
+            self._call_span.status = "error"
+            self.tracer.end_span(self._call_span, error=f"{type(e).__name__}: {e}"[:200])
+            self._end_step()
+            raise
+
+    async def step_stream(self, user_input, parser=None):
+        """
+        流式生成一步，逐块 yield 文本。
+        传入的 StreamParser 会被同步喂入；`@@@ Args` 语法完整后立即关闭上游流，以便立刻执行工具，
+        也不再为模型编造的后续内容付费。
+        """
+        if parser is None:
+            parser = self.protocol.new_parser()
+        self._begin_step()
         response_stream = await self.model(user_input)
-        full_content = ""
+        span, first_token, chunks = self._call_span, None, 0
+        try:
+            async for text in self._consume(response_stream, parser):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    span.set(ttft_ms=(first_token - span.perf_start) * 1000)
+                chunks += 1
+                if text is not True:
+                    yield text
+        except BaseException as e:
+            # 包括被打断（GeneratorExit / CancelledError）
+            span.status = "error"
+            self.tracer.end_span(span, error=f"{type(e).__name__}: {e}"[:200], chunks=chunks)
+            self._end_step(interrupted=True)
+            raise
+        # 提前关闭的流拿不到 usage，此时以收到的块数近似输出 token 数
+        usage = self._last_usage
+        completion = usage.completion_tokens if usage is not None else chunks
+        generation = time.perf_counter() - first_token if first_token is not None else 0.0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        self.tracer.end_span(span, prompt_tokens=getattr(usage, 'prompt_tokens', None),
+                             completion_tokens=completion, cached_tokens=getattr(details, 'cached_tokens', None) or 0,
+                             tokens_per_s=completion / generation if generation > 0 else 0.0,
+                             chunks=chunks, early_stop=self._stopped_early, usage_reported=usage is not None)
 
+        tail = ''.join(e.text for e in parser.close() if e.kind in ('start', 'delta'))
+        if tail:
+            yield tail
+
+        message = self.protocol.assistant_message(parser)
+        self.context.append(**message)
+        log_content = message['content']
+        for call in message.get('tool_calls', []):
+            log_content += f"\n[tool_call] {call['function']['name']} {call['function']['arguments']}"
+        self._log("Agent", log_content)
+
+    async def _consume(self, response_stream, parser):
+        """读取上游流并喂给 parser：yield 可显示的文本；只有解析器吞掉的内容时 yield True（用于首 token 计时）"""
+        self._last_usage, self._stopped_early = None, False
         async for chunk in response_stream:
             text = ""
             if chunk.choices and chunk.choices[0].delta.content:
                 text = chunk.choices[0].delta.content
+            if chunk.choices and getattr(chunk.choices[0].delta, 'tool_calls', None):
+                self.protocol.feed_tool_calls(parser, chunk.choices[0].delta.tool_calls)
+                if not text:
+                    yield True
 
-            if text:
-                full_content += text
-                yield text
+            if text and parser.action_ready:
+                # 抽样读完模式：Args 之后的内容只计数，不再输出
+                parser.feed(text)
+                yield True
+            elif text:
+                accepted = ''.join(e.text for e in parser.feed(text) if e.kind in ('start', 'delta'))
+                yield accepted or True
+                if parser.action_ready and self._should_stop_early():
+                    await response_stream.close()
+                    self.stream_stats["early_stops"] += 1
+                    self.stream_stats["tokens_saved"] += round(self.stream_stats["avg_tail_tokens"])
+                    self._stopped_early = True
+                    # 关闭后收不到 include_usage 的最后一块：用上下文 + 本步输出的本地计数估算本轮用量
+                    estimate = self.context.total_tokens + self.context.counter.count(parser.text)
+                    self.total_tokens += estimate
+                    self.stream_stats["estimated_tokens"] += estimate
+                    break
 
             if hasattr(chunk, 'usage') and chunk.usage is not None:
+                self._last_usage = chunk.usage
                 self.total_tokens += chunk.usage.total_tokens
+                details = getattr(chunk.usage, 'prompt_tokens_details', None)
+                self.prompt_stats["cached_tokens"] += getattr(details, 'cached_tokens', None) or 0
+                if parser.action_ready:
+                    self._record_tail(parser, chunk.usage.completion_tokens)
+
+    def parse_state(self, parser):
+        """按当前协议从一步的输出中得到 AgentState，并统计该协议的重试与本地修复次数；没有动作时本步的 step span 到此结束"""
+        with self.tracer.span("parse", parent=self._step_span, chars=len(parser.text)) as span:
+            state = self.protocol.parse_state(parser, self.tool_manager)
+            span.set(actions=len(state.actions), repaired=state.repaired, error=state.error)
+        stats = self.protocol_stats.setdefault(self.protocol.name, {"steps": 0, "retries": 0, "repaired": 0})
+        stats["steps"] += 1
+        stats["repaired"] += state.repaired
+        if state.error or not (state.has_action or state.final_answer):
+            stats["retries"] += 1
+        if state.error:
+            for message in self.protocol.error_messages(parser, state.error):
+                self.context.append(**message)
+        if not state.has_action:
+            self._end_step(answered=bool(state.final_answer), error=state.error)
+        return state
+
+    async def run_actions(self, state):
+        """
+        执行本步解析出的动作（单个或 @@@ Parallel 下的多个），返回 ToolResult 列表。
+        async 工具直接在事件循环上执行，同步工具交给执行器（每个工具都有超时预算）
+        """
+        with self.tracer.span("tools", parent=self._step_span, count=len(state.actions)):
+            if len(state.actions) > 1:
+                # 并行模式：多个互不依赖的工具并发执行，结果按顺序合并
+                runs = await self.tool_manager.arun_many(state.actions)
+            else:
+                runs = [await self.tool_manager.arun(state.action_name, state.action_args or {})]
+        return runs
+
+    @property
+    def token_usage(self):
+        """累计 token 用量的显示文本；含估算部分时标出"""
+        estimated = self.stream_stats["estimated_tokens"]
+        if not estimated:
+            return str(self.total_tokens)
+        return f"≈{self.total_tokens} (estimated {estimated})"
+
+    def _should_stop_early(self):
+        """Args 完整后是否立即关闭上游流；按间隔抽样读完一次以校准节省量"""
+        if not settings.EARLY_STOP:
+            return False
+        self._ready_count += 1
+        interval = settings.EARLY_STOP_SAMPLE_INTERVAL
+        if interval and (self._ready_count == 1 or self._ready_count % interval == 0):
+            return False
+        return True
 
-        self.context.append(role="assistant", content=full_content)
-        self.logger.log("Agent", full_content)
-        # return full_content
+    def _record_tail(self, parser, completion_tokens):
+        """按字符比例估算 Args 之后被丢弃内容的 token 数，更新滑动平均"""
+        total_chars = len(parser.text) + parser.overflow_chars
+        if not total_chars or not completion_tokens:
+            return
+        tail = completion_tokens * parser.overflow_chars / total_chars
+        stats = self.stream_stats
+        stats["tail_samples"] += 1
+        stats["avg_tail_tokens"] += (tail - stats["avg_tail_tokens"]) / stats["tail_samples"]
 
-    def add_observation(self, content):
-        msg = f'[Observation]: {content}'
-        self.context.append(role="user", content=msg)
-        self.logger.log("System", msg)
+    def add_observation(self, content, calls=None, results=None):
+        """写入工具结果；原生 function calling 下每个调用对应一条 tool 消息。有动作的一步到此结束"""
+        for message in self.protocol.observation_messages(content, calls, results):
+            self.context.append(**message)
+        self._log("System", f'[Observation]: {content}')
+        self._end_step()
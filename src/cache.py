@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# 看起来像报错的结果不缓存（很多工具把异常写进返回字符串，而不是抛出）
+ERROR_PATTERN = re.compile(r'error|错误|出错|失败|timeout', re.I)
+
+
+class ResultCache:
+    """
+    工具结果缓存。工具通过 @tool_meta 声明缓存策略：
+        cache="pure"                 相同参数永远得到相同结果（sympy_tool、calculator）
+        cache="ttl", ttl=秒           结果在一段时间内有效（网页、天气）
+        files=("file_name", ...)     这些参数是文件路径，键中加入文件的 mtime 与大小，文件变化即失效
+    未声明的工具一律视为有副作用，永不缓存。
+    内存层是按字节数限制的 LRU；disk_dir 不为空时另有磁盘层，跨会话复用。
+    """
+    POLICIES = ("pure", "ttl")
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()       # key -> (结果, 过期时间或 None, 字节数)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def size(self):
+        return self._bytes
+
+    def key(self, name, func, args, meta):
+        """规范化参数并计算缓存键；工具不可缓存时返回 None"""
+        meta = meta or {}
+        if meta.get('cache') not in self.POLICIES:
+            return None
+        try:
+            payload = json.dumps(args, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return None
+        # 工具源码变化后旧结果作废
+        parts = [name, payload, self._fingerprint(getattr(func, '__code__', None) and func.__code__.co_filename)]
+        for arg in meta.get('files', ()):
+            if isinstance(args.get(arg), str):
+                parts.append(self._fingerprint(args[arg]))
+        return hashlib.sha256("\x00".join(parts).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _fingerprint(path):
+        if not path:
+            return "-"
+        try:
+            st = os.stat(path)
+            return f"{os.path.abspath(path)}:{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            return f"{os.path.abspath(path)}:missing"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires, _ = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                self._remove(key)
+
+        value, expires = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._insert(key, value, expires)
+            return value
+
+    def put(self, key, value, meta):
+        if ERROR_PATTERN.search(value[:80]):
+            return False
+        ttl = (meta or {}).get('ttl') if (meta or {}).get('cache') == "ttl" else None
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            if not self._insert(key, value, expires):
+                return False
+            self.stats["stores"] += 1
+        self._disk_put(key, value, expires)
+        return True
+
+    def recent_keys(self, limit=256):
+        """内存层中最近使用的键（会话检查点记录它们，恢复时用 warm 预热）"""
+        with self._lock:
+            keys = list(self._entries)
+        return keys[-limit:]
+
+    def warm(self, keys):
+        """把磁盘层中仍然有效的键载入内存层（不计入命中统计），返回载入的个数"""
+        loaded, now = 0, time.time()
+        for key in keys:
+            with self._lock:
+                if key in self._entries:
+                    continue
+            value, expires = self._disk_get(key, now)
+            if value is not None:
+                with self._lock:
+                    loaded += self._insert(key, value, expires)
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _insert(self, key, value, expires):
+        size = len(value.encode('utf-8', errors='ignore'))
+        if size > self.max_bytes:
+            return False
+        self._remove(key)
+        self._entries[key] = (value, expires, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+        return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None, None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        if record["expires"] is not None and record["expires"] <= now:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+            return None, None
+        return record["value"], record["expires"]
+
+    def _disk_put(self, key, value, expires):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({"expires": expires, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[Cache] Could not write {path}: {e}")
@@ -0,0 +1,130 @@
+import os
+import json
+import mmap
+from src.logwriter import get_log_writer
+
+# 这些开头的 user 消息是 ReAct 循环自己注入的（工具结果、提示），不是新一轮对话的开始
+CONTINUATION_PREFIXES = ("[Observation]", "Observation:", "System Hint", "\n[SYSTEM]")
+
+
+def is_turn_start(role, content):
+    return role == "user" and not str(content or "").startswith(CONTINUATION_PREFIXES)
+
+
+class Checkpoint:
+    """
+    Context 的增量检查点（logs/{日志名}.ckpt），每步结束时追加写入，只写上次以来新增 / 变化的消息。
+    文件按行记录，写入交给后台的 LogWriter：
+        M\\t{下标}\\t{token 数}\\t{轮次起点 0|1}\\t{消息 JSON}   在下标处写入消息（截断其后的内容）
+        T\\t{长度}                                         把消息列表截断到该长度（压缩改写了历史）
+        S\\t{状态 JSON}                                     一个完整的检查点到此为止（计划、token 用量、缓存键等）
+    系统提示不写入——恢复时按当前工具目录重新构建。消息下标从 1 开始，与 Context 一致。
+    恢复时 mmap 整个文件顺序扫描一遍，只解析行首的下标与 token 数，最后只对需要的消息做 JSON 解码，
+    token 数直接复用，无需重新分词。崩溃留下的、最后一个 S 之后的残缺记录会被忽略。
+    改写历史导致文件超过存活内容的两倍时，整体重写为一份快照。
+    """
+    def __init__(self, path, writer=None):
+        self.path = path
+        self.writer = writer or get_log_writer()
+        self._synced = []           # 已写入的消息指纹（与 Context 下标 1.. 对应）
+        self._line_bytes = []       # 已写入的每条消息行的字节数
+        self._file_bytes = os.path.getsize(path) if os.path.exists(path) else 0
+
+    @staticmethod
+    def path_for(log_file):
+        return os.path.splitext(str(log_file))[0] + ".ckpt"
+
+    @staticmethod
+    def _fingerprint(message):
+        # str 的哈希值缓存在对象上，未变化的消息不会重新计算
+        return message.get("role"), hash(message.get("content")), len(message)
+
+    @staticmethod
+    def _line(index, tokens, message):
+        turn = int(is_turn_start(message.get("role"), message.get("content")))
+        return f"M\t{index}\t{tokens}\t{turn}\t{json.dumps(message, ensure_ascii=False)}\n"
+
+    def save(self, context, state):
+        """追加本步的变化；state 为可 JSON 序列化的 dict"""
+        messages, counts = context()[1:], context.token_counts[1:]
+        fingerprints = [self._fingerprint(m) for m in messages]
+        keep = 0
+        for old, new in zip(self._synced, fingerprints):
+            if old != new:
+                break
+            keep += 1
+        lines, rewritten = [], keep < len(self._synced)
+        if rewritten:
+            lines.append(f"T\t{keep + 1}\n")
+            del self._line_bytes[keep:]
+        for i in range(keep, len(messages)):
+            line = self._line(i + 1, counts[i], messages[i])
+            lines.append(line)
+            self._line_bytes.append(len(line.encode('utf-8')))
+        lines.append(f"S\t{json.dumps(state, ensure_ascii=False)}\n")
+        data = ''.join(lines)
+        self._synced = fingerprints
+        self._file_bytes += len(data.encode('utf-8'))
+        if rewritten and self._file_bytes > 2 * sum(self._line_bytes) + 1024 * 1024:
+            self.rewrite(context, state)
+        else:
+            self.writer.write(self.path, data)
+
+    def rewrite(self, context, state):
+        """把当前 Context 整体写成一份新快照（原子替换）"""
+        messages, counts = context()[1:], context.token_counts[1:]
+        lines = [self._line(i + 1, counts[i], m) for i, m in enumerate(messages)]
+        lines.append(f"S\t{json.dumps(state, ensure_ascii=False)}\n")
+        data = ''.join(lines)
+        self.writer.release(self.path)      # 等排队的追加写完，再替换文件
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+        self._synced = [self._fingerprint(m) for m in messages]
+        self._line_bytes = [len(line.encode('utf-8')) for line in lines[:-1]]
+        self._file_bytes = len(data.encode('utf-8'))
+
+    @staticmethod
+    def load(path, last_turns=None):
+        """
+        读取最后一个完整的检查点，返回 (entries, state, skipped)：
+        entries 为 [(message, token 数)]（不含系统提示）；last_turns 不为空时只解码最近 last_turns 轮，
+        skipped 为因此省略的消息数。
+        """
+        spans, committed, length, state_span = [], None, 0, None
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos, size = 0, len(mm)
+            while pos < size:
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    break
+                kind = mm[pos:pos + 1]
+                if kind == b"S":
+                    committed, length, state_span = None, len(spans), (pos + 2, end)
+                else:
+                    if kind == b"M":
+                        t1 = mm.find(b"\t", pos + 2)
+                        t2 = mm.find(b"\t", t1 + 1)
+                        t3 = mm.find(b"\t", t2 + 1)
+                        keep = int(mm[pos + 2:t1]) - 1
+                    else:
+                        keep = int(mm[pos + 2:end]) - 1
+                    if committed is None and keep < len(spans):
+                        # 改写已提交的历史之前留一份，以防这一批没有写完整（没有后续的 S）
+                        committed = list(spans)
+                    del spans[keep:]
+                    if kind == b"M":
+                        spans.append((t3 + 1, end, int(mm[t1 + 1:t2]), mm[t2 + 1:t3] == b"1"))
+                pos = end + 1
+            if state_span is None:
+                raise ValueError(f"No complete checkpoint in {path}")
+            spans = (committed if committed is not None else spans)[:length]
+            start = 0
+            if last_turns:
+                starts = [i for i, span in enumerate(spans) if span[3]]
+                if len(starts) > last_turns:
+                    start = starts[-last_turns]
+            entries = [(json.loads(mm[s:e]), tokens) for s, e, tokens, _ in spans[start:]]
+            state = json.loads(mm[state_span[0]:state_span[1]])
+        return entries, state, start
@@ -0,0 +1,208 @@
+import re
+import hashlib
+
+
+SUMMARY_PREFIX = "[Summary of earlier conversation]"
+OMISSION_HINT = '[System Note: Middle conversation history compressed/omitted to save memory]'
+
+
+class ExtractiveSummarizer:
+    """
+    不调用模型的摘要器：保留每条消息的关键信息（调用了什么工具、参数、结果首行、回答开头）。
+    任何实现了 __call__(messages) -> str 的对象都可以作为摘要器传给 Compactor。
+    """
+    def __init__(self, max_line: int = 200):
+        self.max_line = max_line
+
+    def _clip(self, text):
+        text = " ".join(text.split())
+        return text if len(text) <= self.max_line else text[:self.max_line] + "…"
+
+    def __call__(self, messages):
+        lines = []
+        for m in messages:
+            content = m.get('content') or ""
+            if m.get('tool_calls'):
+                for call in m['tool_calls']:
+                    function = call['function']
+                    lines.append(f"- Agent called {function['name']} {self._clip(function['arguments'])}")
+            elif m['role'] == 'tool':
+                lines.append(f"- Observation: {self._clip(content)}")
+            elif m['role'] == 'assistant':
+                action = re.search(r'(?m)^@@@\s*Action\s*$\s*(.+)', content)
+                args = re.search(r'(?m)^@@@\s*Args\s*$([\s\S]*?)(?=^@@@\s|\Z)', content)
+                answer = re.search(r'(?m)^@@@\s*Answer\s*$([\s\S]*?)(?=^@@@\s|\Z)', content)
+                if action:
+                    call = action.group(1).strip()
+                    if args and args.group(1).strip():
+                        call += f" {self._clip(args.group(1))}"
+                    lines.append(f"- Agent called {call}")
+                elif answer:
+                    lines.append(f"- Agent answered: {self._clip(answer.group(1))}")
+                else:
+                    lines.append(f"- Agent: {self._clip(content)}")
+            elif content.startswith('[Observation]'):
+                lines.append(f"- Observation: {self._clip(content[len('[Observation]:'):])}")
+            elif content.startswith(SUMMARY_PREFIX):
+                lines.append(content[len(SUMMARY_PREFIX):].strip())
+            else:
+                lines.append(f"- {m['role'].capitalize()}: {self._clip(content)}")
+        return "\n".join(lines)
+
+
+class LLMSummarizer:
+    """
+    用同步 OpenAI 兼容客户端生成摘要；只在压缩时调用，且结果按片段哈希缓存。
+    调用会阻塞，ReactAgent.model 在工作线程中执行压缩，不占用事件循环。
+    """
+    PROMPT = ("你是对话压缩器。请把下面的智能体对话片段压缩成要点列表，"
+              "必须保留：用户需求、已调用的工具及参数、得到的关键事实/数值/文件路径、未完成的事项。"
+              "不要编造内容，不要寒暄。")
+
+    def __init__(self, client, model: str = 'qwen-plus', max_tokens: int = 800):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.fallback = ExtractiveSummarizer()
+
+    def __call__(self, messages):
+        transcript = "\n\n".join(f"[{m['role']}]\n{m['content']}" for m in messages)
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "system", "content": self.PROMPT},
+                          {"role": "user", "content": transcript}],
+                max_tokens=self.max_tokens,
+                temperature=0.2
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"[Compaction] LLM summarizer failed ({e}), using extractive summary.")
+            return self.fallback(messages)
+
+
+class Compactor:
+    """
+    分层压缩 Context，依次尝试，直到总 token 数降到 TOKEN_LIMIT * COMPACT_TARGET 以下：
+      1. 截断较早的超长 Observation（原地修改）
+      2. 折叠较早 assistant 消息中已结束的 Plan / Thought
+      3. 用摘要器把较早的消息片段替换为滚动摘要（按片段哈希缓存，不会重复计算）
+      4. 仍然超限时，退回到丢弃中间历史
+    系统提示、第一轮对话和最近 RETAIN_RECENT 轮永远不动。
+    """
+    def __init__(self, config, summarizer=None):
+        self.config = config
+        self.summarizer = summarizer or ExtractiveSummarizer()
+        self.summary_cache = {}
+        self.last_report = []
+
+    def _target(self):
+        return int(self.config.TOKEN_LIMIT * self.config.COMPACT_TARGET)
+
+    def _middle(self, ctx):
+        """可压缩区间 [start, end)：跳过系统提示和第一轮，保留最近的消息"""
+        start = 3 if len(ctx) >= 3 else 1
+        end = max(start, len(ctx) - self.config.RETAIN_RECENT * 2)
+        return start, end
+
+    def compact(self, ctx):
+        self.last_report = []
+        for tier in (self._truncate_observations, self._collapse_reasoning, self._summarize_spans):
+            if ctx.total_tokens <= self._target():
+                break
+            saved = tier(ctx)
+            if saved:
+                self.last_report.append(f"{tier.__name__.strip('_')}: -{saved}")
+        if ctx.total_tokens >= self.config.TOKEN_LIMIT:
+            saved = self._drop_middle(ctx)
+            self.last_report.append(f"drop_middle: -{saved}")
+        return bool(self.last_report)
+
+    def _truncate_observations(self, ctx):
+        limit = self.config.OBSERVATION_KEEP_TOKENS
+        messages = ctx()
+        start, end = self._middle(ctx)
+        before = ctx.total_tokens
+        for i in range(start, end):
+            content = messages[i]['content'] or ""
+            is_observation = messages[i]['role'] == 'tool' or content.startswith('[Observation]')
+            if not is_observation or ctx.token_counts[i] <= limit:
+                continue
+            # 按 token 比例估算保留的字符数
+            keep = max(1, len(content) * limit // ctx.token_counts[i])
+            ctx.replace_content(i, content[:keep] + f"\n...(observation truncated, {len(content) - keep} chars omitted)")
+            if ctx.total_tokens <= self._target():
+                break
+        return before - ctx.total_tokens
+
+    def _collapse_reasoning(self, ctx):
+        messages = ctx()
+        start, end = self._middle(ctx)
+        before = ctx.total_tokens
+        pattern = re.compile(r'^@@@\s*(?P<header>Plan|Thought)\s*$(?P<content>[\s\S]*?)(?=^@@@\s|\Z)', re.M | re.I)
+        # 最新的 Plan 仍然有效，只折叠被后续 Plan 取代的旧 Plan
+        last_plan = max((i for i, m in enumerate(messages)
+                         if m['role'] == 'assistant' and re.search(r'^@@@\s*Plan\s*$', m['content'], re.M | re.I)),
+                        default=-1)
+
+        def collapse(match, index):
+            header, body = match.group('header'), match.group('content').strip()
+            if (header.lower() == 'plan' and index == last_plan) or body.endswith('(collapsed)'):
+                return match.group(0)
+            first = body.split('\n', 1)[0][:80]
+            return f"@@@ {header}\n{first} …(collapsed)\n\n"
+
+        for i in range(start, end):
+            if messages[i]['role'] != 'assistant':
+                continue
+            content = messages[i]['content'] or ""
+            collapsed = pattern.sub(lambda m: collapse(m, i), content)
+            if collapsed != content:
+                ctx.replace_content(i, collapsed)
+            if ctx.total_tokens <= self._target():
+                break
+        return before - ctx.total_tokens
+
+    def _summarize_spans(self, ctx):
+        before = ctx.total_tokens
+        span = self.config.SUMMARY_SPAN
+        while ctx.total_tokens > self._target():
+            start, end = self._middle(ctx)
+            messages = ctx()
+            # 从最早的消息开始取一个片段（已有的摘要也在其中，与新内容合并为一份滚动摘要）；
+            # tool 消息必须紧跟其 tool_calls，不能被切开
+            i = start
+            while i < end and messages[i]['role'] == 'tool':
+                i += 1
+            j = min(end, i + span)
+            while j < len(messages) and messages[j]['role'] == 'tool':
+                j += 1
+            if j - i < 2:
+                break
+            chunk = messages[i:j]
+            key = hashlib.sha1("\x00".join(f"{m['role']}\x01{m['content']}" for m in chunk)
+                               .encode('utf-8')).hexdigest()
+            if key not in self.summary_cache:
+                self.summary_cache[key] = self.summarizer(chunk)
+            summary = f"{SUMMARY_PREFIX}\n{self.summary_cache[key]}"
+            ctx.replace_span(i, j, {'role': 'system', 'content': summary})
+        return before - ctx.total_tokens
+
+    def _drop_middle(self, ctx):
+        before = ctx.total_tokens
+        entries = list(zip(ctx(), ctx.token_counts))
+        # 第一轮：User + Agent（+ 其工具结果）
+        k = 3 if len(entries) >= 3 else 1
+        while k < len(entries) and entries[k][0]['role'] == 'tool':
+            k += 1
+        recent_start = max(k, len(entries) - self.config.RETAIN_RECENT * 2)
+        while recent_start < len(entries) and entries[recent_start][0]['role'] == 'tool':
+            recent_start += 1
+
+        if recent_start > k:
+            omission_hint = {'role': 'system', 'content': OMISSION_HINT}
+            hint_entry = (omission_hint, ctx.counter.count_message(omission_hint))
+            ctx.set_entries(entries[:k] + [hint_entry] + entries[recent_start:])
+        else:
+            ctx.set_entries(entries[:1] + entries[recent_start:])
+        return before - ctx.total_tokens
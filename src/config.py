@@ -10,7 +10,92 @@ class Config:
     QQ_EMAIL: str = os.getenv('QQ_EMAIL')
     QQ_AUTH: str = os.getenv('QQ_EMAIL_AUTH_CODE')
 
+    # 模型服务：任意 OpenAI 兼容的地址与模型名（离线基准测试可指向 `python -m src.stub_llm` 启动的桩服务）
+    BASE_URL: str = os.getenv('LLM_BASE_URL', "https://dashscope.aliyuncs.com/compatible-mode/v1")
+    MODEL: str = os.getenv('LLM_MODEL', "qwen-plus")
+
     TOKEN_LIMIT: int = 1000000
     RETAIN_RECENT: int = 50
+    # Token 计数器："bytes"（本地估算）、"tiktoken:cl100k_base" 或本地 tokenizer.json 路径
+    TOKENIZER: str = "bytes"
+    # 分层压缩：超过 TOKEN_LIMIT 后压缩到 TOKEN_LIMIT * COMPACT_TARGET 以下
+    COMPACT_TARGET: float = 0.7
+    OBSERVATION_KEEP_TOKENS: int = 500
+    SUMMARY_SPAN: int = 12
+    SUMMARIZER: str = "extractive"     # "extractive" 或 "llm"
+
+    # Args 语法完整后立即关闭上游流；每 N 次提前关闭中抽样一次完整读完，用于估算节省的 token（0 表示不抽样）
+    EARLY_STOP: bool = True
+    EARLY_STOP_SAMPLE_INTERVAL: int = 20
+
+    # 动作协议："text" 为 @@@ Action/Args 文本协议，"function" 为 OpenAI 兼容的原生 tools/tool_calls
+    PROTOCOL: str = "text"
+
+    # 并行动作（可选）：允许模型在 @@@ Parallel 标记下一次输出多组互不依赖的 Action/Args
+    PARALLEL_ACTIONS: bool = False
+    MAX_PARALLEL_TOOLS: int = 4
+
+    # 懒加载工具：启动时只读取 ast 清单，模块在第一次执行时才导入（环境变量 LAZY_TOOLS=0 关闭）
+    LAZY_TOOLS: bool = os.getenv('LAZY_TOOLS', '1') != '0'
+
+    # 工具默认超时预算（秒），单个工具可用 @tool_meta(timeout=...) 覆盖；None 表示不限制
+    # 超时后仍未退出的工具线程最多 TOOL_MAX_ABANDONED 个，达到上限后拒绝新的 thread 隔离调用
+    TOOL_TIMEOUT: float = 120
+    TOOL_MAX_ABANDONED: int = 8
+
+    # 工具结果缓存：内存 LRU 的字节上限；TOOL_CACHE_DIR 不为空时启用磁盘层（如 ".cache/tools"）
+    TOOL_CACHE_BYTES: int = 32 * 1024 * 1024
+    TOOL_CACHE_DIR: str = None
+
+    # 监视 src/tools/：文件变化防抖 WATCH_DEBOUNCE 秒后，在下一步开始前自动增量重载，无需 [REFRESH]
+    # WATCH_BACKEND: "auto"（优先 inotify）| "inotify" | "poll"（按 WATCH_POLL_INTERVAL 秒比较 mtime）
+    WATCH_TOOLS: bool = os.getenv('WATCH_TOOLS', '0') != '0'
+    WATCH_BACKEND: str = "auto"
+    WATCH_DEBOUNCE: float = 0.5
+    WATCH_POLL_INTERVAL: float = 1.0
+
+    # 追踪：每步 / 模型调用 / 解析 / 工具 / 压缩 / 日志写入各记一个 span（环境变量 TRACING=0 关闭）
+    # 最近 TRACE_BUFFER 个 span 保留在内存中（trace 命令、/trace）；TRACE_FILE 不为空时另追加写入 JSONL（如 "logs/traces.jsonl"）
+    # METRICS_ENDPOINT 开启时 app.py 提供 Prometheus 文本格式的 /metrics
+    TRACING: bool = os.getenv('TRACING', '1') != '0'
+    TRACE_FILE: str = os.getenv('TRACE_FILE')
+    TRACE_BUFFER: int = 2000
+    METRICS_ENDPOINT: bool = os.getenv('METRICS_ENDPOINT', '0') != '0'
+
+    # 会话日志由后台线程批量写入：队列上限 LOG_QUEUE_SIZE 条（满了调用方阻塞等待），
+    # 累计 LOG_BATCH_BYTES 字节或 LOG_FLUSH_INTERVAL 秒写一次；LOG_FSYNC: "none" | "close" | "batch"
+    # LOG_JSONL 开启时在 markdown 旁另写一份 JSONL 事件流（chat_*.jsonl）
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_BATCH_BYTES: int = 64 * 1024
+    LOG_FLUSH_INTERVAL: float = 0.5
+    LOG_FSYNC: str = "close"
+    LOG_JSONL: bool = True
+
+    # logs/ 的维护（后台线程每 LOG_MAINTAIN_INTERVAL 秒一次，会话索引见 logs/index.json）：
+    # 单个日志超过 LOG_ROTATE_BYTES 字节或 LOG_ROTATE_AGE 秒后轮转到新分段；LOG_IDLE_CLOSE 秒没有写入的会话视为已关闭
+    # 已关闭的会话压缩为 LOG_COMPRESSION（"gzip" | "zstd"（需要 zstandard）| None 不压缩）
+    # 保留策略（默认都为 None，不删除任何日志）：删除超过 LOG_RETENTION_DAYS 天的已关闭会话，
+    # 总大小超过 LOG_RETENTION_BYTES 时从最旧的删起
+    LOG_ROTATE_BYTES: int = 8 * 1024 * 1024
+    LOG_ROTATE_AGE: float = 24 * 3600
+    LOG_IDLE_CLOSE: float = 3600
+    LOG_COMPRESSION: str = "gzip"
+    LOG_RETENTION_DAYS: float = None
+    LOG_RETENTION_BYTES: int = None
+    LOG_MAINTAIN_INTERVAL: float = 60
+
+    # 会话检查点：每步结束时把 Context 的变化追加到 logs/{日志名}.ckpt，reload 时据此原样恢复消息结构
+    # RESUME_TURNS 不为空时只恢复最近 N 轮对话（更早的消息留在检查点里，不进入上下文）
+    CHECKPOINT: bool = True
+    RESUME_TURNS: int = None
+
+    # 历史会话全文索引（SQLite FTS5）：日志写入时增量建立，供 search_history 工具与 `python -m src.history search` 查询
+    # 每条日志最多索引 HISTORY_MAX_CHARS 个字符
+    HISTORY_INDEX: bool = True
+    HISTORY_DB: str = "logs/history.db"
+    HISTORY_MAX_CHARS: int = 20000
+
+    # 控制台流式渲染的帧率：每秒最多重建 / 刷新画面的次数（与块到达的频率无关）
+    UI_REFRESH_PER_SECOND: int = 10
     
 settings = Config()
\ No newline at end of file
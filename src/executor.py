@@ -0,0 +1,341 @@
+import time
+import asyncio
+import inspect
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from src.states import ToolResult
+from src.tools import _meta
+from src.tools._manifest import reload_module
+
+
+def _invoke(func, args):
+    """执行一次工具调用，返回 (状态, 输出)"""
+    try:
+        return "ok", str(func(**args))
+    except Exception as e:
+        return "error", f"Error executing {func.__name__}: {str(e)}"
+
+
+def _run_once(conn, func, args):
+    """process 隔离：在一次性子进程中执行工具"""
+    start = time.process_time()
+    status, output = _invoke(func, args)
+    conn.send((status, output, time.process_time() - start))
+    conn.close()
+
+
+def _serve(conn):
+    """subprocess 隔离：常驻子进程按 (模块, 函数名) 执行调用，模块全局状态在调用之间保留"""
+    while True:
+        try:
+            module_name, func_name, args, reload = conn.recv()
+        except (EOFError, OSError):
+            break
+        start = time.process_time()
+        try:
+            module = importlib.import_module(module_name)
+            if reload:
+                # 父进程重载过工具代码：模块级状态（如 python_repl 的变量）在重载后保留
+                module = reload_module(module)
+            status, output = _invoke(getattr(module, func_name), args)
+        except Exception as e:
+            status, output = "error", f"Error executing {func_name}: {str(e)}"
+        conn.send((status, output, time.process_time() - start))
+
+
+class _Worker:
+    """一个常驻子进程；同一时刻只处理一个调用，超时即被杀死，下次调用时重新拉起"""
+    def __init__(self, context):
+        self.context = context
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.func = None
+
+    def call(self, func, args, timeout):
+        deadline = time.perf_counter() + timeout if timeout else None
+        if not self.lock.acquire(timeout=timeout or -1):
+            return None
+        try:
+            reload = False
+            if self.process is None or not self.process.is_alive():
+                self.conn, child = self.context.Pipe()
+                self.process = self.context.Process(target=_serve, args=(child,), daemon=True)
+                self.process.start()
+                child.close()
+            else:
+                reload = func is not self.func
+            self.func = func
+            self.conn.send((func.__module__, func.__name__, args, reload))
+            remaining = max(0.0, deadline - time.perf_counter()) if deadline else None
+            if not self.conn.poll(remaining):
+                self.stop()
+                return None
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.stop()
+            return "error", f"Error executing {func.__name__}: worker process died ({e})", None
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join(1)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = self.conn = None
+
+
+class _Pending:
+    def __init__(self, name, timeout, isolation):
+        self.name = name
+        self.timeout = timeout
+        self.isolation = isolation
+        self.started = threading.Event()
+        self.cancel = threading.Event()
+        self.start = None
+        self.future = None
+        self.slot = False           # thread 隔离：是否占着一个执行名额
+        self.on_start = None        # 异步等待方注册的回调（在工作线程中调用）
+        self.cache_key = None       # 由 ToolManager 填入，执行成功后写入结果缓存
+
+
+class ToolExecutor:
+    """
+    工具执行子系统：每次调用都有超时预算，按工具元数据选择隔离方式。
+      - async:      `async def` 工具，直接在调用方的事件循环上 await，超时即取消协程，不占用线程
+      - thread:     在线程池中执行，同时运行的调用不超过 max_workers 个；超时后置位取消事件
+                    （工具可通过 _meta.cancelled() 协作退出），卡住的线程被放弃并让出名额，同一批的其它调用不受影响。
+                    被放弃、仍未退出的线程最多 max_abandoned 个，达到上限后拒绝新的 thread 调用，直到有线程退出
+      - process:    每次调用 fork 一个子进程，超时直接杀死（适合纯计算、可能失控的工具）
+      - subprocess: 每个工具一个常驻子进程，模块状态在调用之间保留，超时杀死后下次重新拉起
+    进程类调用由监督线程等待，监督线程自身受超时约束，不会被卡住。
+    同步入口 (run / submit) 调用 async 工具时，协程在执行器自己的后台事件循环上运行。
+    """
+    ISOLATIONS = ("thread", "process", "subprocess")
+
+    def __init__(self, max_workers=4, default_timeout=None, default_isolation="thread", max_abandoned=8):
+        self.max_workers = max_workers
+        self.max_abandoned = max_abandoned
+        self.default_timeout = default_timeout
+        self.default_isolation = default_isolation
+        self._context = multiprocessing.get_context()
+        self._pool = None
+        self._supervisors = None
+        self._loop = None
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_workers)
+        self._stuck = set()         # 超时被放弃、仍在运行的 thread 调用
+        self.stats = {"calls": 0, "async_calls": 0, "errors": 0, "timeouts": 0, "abandoned_threads": 0,
+                      "wall_time": 0.0, "cpu_time": 0.0}
+
+    def _thread_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # 被放弃的线程不占名额，但仍占着线程：多留出 max_abandoned 个线程
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers + self.max_abandoned,
+                                                thread_name_prefix="tool")
+            return self._pool
+
+    def _supervisor_pool(self):
+        with self._lock:
+            if self._supervisors is None:
+                self._supervisors = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool-supervisor")
+            return self._supervisors
+
+    def _background_loop(self):
+        """同步调用方执行 async 工具时使用的后台事件循环（懒启动，守护线程）"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="tool-async", daemon=True).start()
+            return self._loop
+
+    @property
+    def stuck_threads(self):
+        return len(self._stuck)
+
+    def _release(self, pending, abandoned=False):
+        """让出 pending 占着的名额；abandoned=True 表示超时放弃（线程仍在运行），记为卡住直到它退出"""
+        with self._lock:
+            if not pending.slot:
+                return
+            pending.slot = False
+            if abandoned:
+                self._stuck.add(pending)
+            else:
+                self._stuck.discard(pending)
+        self._slots.release()
+
+    def _options(self, func, meta):
+        meta = meta or {}
+        timeout = meta.get('timeout', self.default_timeout) or None
+        if inspect.iscoroutinefunction(func):
+            return timeout, "async"
+        isolation = meta.get('isolation', self.default_isolation)
+        return timeout, isolation if isolation in self.ISOLATIONS else "thread"
+
+    def submit(self, name, func, args, meta=None):
+        """立即开始执行并返回句柄，调用 result(handle) 获取 ToolResult"""
+        return self._start(_Pending(name, *self._options(func, meta)), func, args)
+
+    def _start(self, pending, func, args):
+        if pending.isolation == "async":
+            pending.future = asyncio.run_coroutine_threadsafe(
+                self._run_async(pending, func, args), self._background_loop())
+        elif pending.isolation == "thread":
+            if len(self._stuck) >= self.max_abandoned:
+                pending.future = Future()
+                self._mark_started(pending)
+                pending.future.set_result(("error", f"Error executing {pending.name}: {len(self._stuck)} timed-out tool "
+                                                    f"threads are still running; retry after they exit.", None))
+            else:
+                pending.future = self._thread_pool().submit(self._run_thread, pending, func, args)
+        else:
+            target = self._run_process if pending.isolation == "process" else self._run_worker
+            pending.future = self._supervisor_pool().submit(target, pending, pending.name, func, args)
+        return pending
+
+    def run(self, name, func, args, meta=None):
+        return self.result(self.submit(name, func, args, meta))
+
+    def result(self, pending):
+        timeout = pending.timeout
+        outcome = None
+        # 排队等待空闲线程的时间不计入预算，但最多等待一个预算
+        if pending.started.wait(timeout):
+            try:
+                outcome = pending.future.result(timeout=self._remaining(pending))
+            except FutureTimeout:
+                outcome = None
+        return self._finish(pending, outcome)
+
+    async def arun(self, name, func, args, meta=None):
+        """
+        在当前事件循环上执行：async 工具直接 await（超时即取消协程）；
+        其余工具交给线程池 / 子进程，事件循环只等待结果，不阻塞。
+        """
+        timeout, isolation = self._options(func, meta)
+        pending = _Pending(name, timeout, isolation)
+        outcome = None
+        if isolation == "async":
+            try:
+                outcome = await asyncio.wait_for(self._run_async(pending, func, args), timeout)
+            except asyncio.TimeoutError:
+                outcome = None
+            return self._finish(pending, outcome)
+
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        pending.on_start = lambda: loop.call_soon_threadsafe(started.set)
+        self._start(pending, func, args)
+        try:
+            await asyncio.wait_for(started.wait(), timeout)
+            outcome = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending.future)),
+                                             self._remaining(pending))
+        except asyncio.TimeoutError:
+            outcome = None
+        return self._finish(pending, outcome)
+
+    def _remaining(self, pending):
+        if pending.timeout is None:
+            return None
+        remaining = pending.start + pending.timeout - time.perf_counter()
+        if pending.isolation in ("process", "subprocess"):
+            remaining += 5      # 监督线程自己会在预算到期时杀死子进程，这里只留出回收时间
+        return max(0.0, remaining)
+
+    def _finish(self, pending, outcome):
+        wall = time.perf_counter() - pending.start if pending.start else 0.0
+        if outcome is None:
+            pending.cancel.set()
+            if pending.future is not None:
+                pending.future.cancel()     # 仍在排队时直接取消；async 工具的协程会被取消
+            if pending.isolation == "thread" and pending.slot:
+                self.stats["abandoned_threads"] += 1
+                self._release(pending, abandoned=True)
+            status, cpu = "timeout", None
+            output = f"[TIMEOUT] Tool '{pending.name}' exceeded its {pending.timeout}s budget and was cancelled."
+        else:
+            status, output, cpu = outcome
+
+        stats = self.stats
+        stats["calls"] += 1
+        stats["async_calls"] += pending.isolation == "async"
+        stats["errors"] += status == "error"
+        stats["timeouts"] += status == "timeout"
+        stats["wall_time"] += wall
+        stats["cpu_time"] += cpu or 0.0
+        return ToolResult(pending.name, output, status, wall, cpu, pending.isolation)
+
+    def _mark_started(self, pending):
+        pending.start = time.perf_counter()
+        pending.started.set()
+        if pending.on_start is not None:
+            pending.on_start()
+
+    async def _run_async(self, pending, func, args):
+        self._mark_started(pending)
+        try:
+            return "ok", str(await func(**args)), None
+        except Exception as e:
+            return "error", f"Error executing {func.__name__}: {str(e)}", None
+
+    def _run_thread(self, pending, func, args):
+        # 排队等名额的时间不计入预算；等到名额时调用方已经超时放弃的，不再执行
+        self._slots.acquire()
+        pending.slot = True
+        if pending.cancel.is_set():
+            self._release(pending)
+            return None
+        self._mark_started(pending)
+        _meta.bind_cancel(pending.cancel)
+        start = time.thread_time()
+        try:
+            status, output = _invoke(func, args)
+        finally:
+            _meta.bind_cancel(None)
+            with self._lock:
+                self._stuck.discard(pending)
+            self._release(pending)
+        return status, output, time.thread_time() - start
+
+    def _run_process(self, pending, name, func, args):
+        self._mark_started(pending)
+        parent, child = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_run_once, args=(child, func, args), daemon=True)
+        process.start()
+        child.close()
+        try:
+            if not parent.poll(pending.timeout or None):
+                return None
+            return parent.recv()
+        except EOFError:
+            return "error", f"Error executing {name}: process exited with code {process.exitcode}", None
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join(1)
+            parent.close()
+
+    def _run_worker(self, pending, name, func, args):
+        self._mark_started(pending)
+        with self._lock:
+            worker = self._workers.setdefault(name, _Worker(self._context))
+        return worker.call(func, args, pending.timeout or None)
+
+    def shutdown(self):
+        for worker in list(self._workers.values()):
+            worker.stop()
+        self._workers = {}
+        for pool in (self._pool, self._supervisors):
+            if pool is not None:
+                pool.shutdown(wait=False)
+        self._pool = self._supervisors = None
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
@@ -0,0 +1,299 @@
+"""
+历史会话的全文索引（SQLite FTS5，logs/history.db），按 BM25 排序。
+
+LogManager 每写一条日志就把它放进索引队列，后台线程按批插入（一个事务），只处理新写入的内容；
+日志被保留策略删除时，对应会话的条目一并删除。中文按字切分后索引（FTS5 默认的 unicode61 分词器
+会把整段汉字当成一个词），查询中的中文词按短语匹配，英文词按前缀匹配。
+
+用法（在项目根目录）:
+    python -m src.history search "关键词" [--limit 10] [--session <会话 id>]
+    python -m src.history reindex      # 把尚未索引的旧日志（含压缩过的）补进索引
+    python -m src.history stats
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from src.config import settings
+
+CJK = r'[㐀-鿿豈-﫿]'
+CJK_CHAR = re.compile(f'({CJK})')
+CJK_SPACED = re.compile(f' ?([\x02\x03]*{CJK}[\x02\x03]*) ?')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE,           -- 日志名（logs/{name}.md）
+    session TEXT,
+    started TEXT,
+    updated TEXT,
+    entries INTEGER NOT NULL DEFAULT 0
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(body, role UNINDEXED, sid UNINDEXED, ts UNINDEXED);
+"""
+
+
+def segment(text):
+    """汉字两侧加空格，使每个汉字成为一个词"""
+    return CJK_CHAR.sub(r' \1 ', text)
+
+
+def desegment(text):
+    """segment 的逆操作；snippet 的高亮标记（控制字符 2 / 3）转成【】"""
+    return CJK_SPACED.sub(r'\1', text).replace('\x02', '【').replace('\x03', '】')
+
+
+def match_query(query):
+    """
+    把用户输入转成 FTS5 查询：各个词之间为 AND，含汉字的词按短语匹配，其余按前缀匹配。
+    AND / OR / NOT 只在两个词之间才作为运算符（FTS5 的 NOT 是二元的 "a NOT b"）："a AND NOT b" 按 "a NOT b" 处理；
+    开头、结尾或连续出现的 AND / OR 直接丢弃（否则 FTS5 报语法错误）。
+    NOT 前面没有可排除的对象（在开头或紧跟 OR / NOT）时无法表达，返回空查询（没有结果），而不是丢掉 NOT 变成反向的查询
+    """
+    terms = []
+    for term in query.replace('"', ' ').split():
+        op = term.upper()
+        if op == "NOT":
+            if not terms or terms[-1] in ("OR", "NOT"):
+                return ""
+            if terms[-1] == "AND":
+                terms.pop()
+            terms.append(op)
+        elif op in ("AND", "OR"):
+            if terms and terms[-1] not in ("AND", "OR", "NOT"):
+                terms.append(op)
+        elif CJK_CHAR.search(term):
+            terms.append('"' + ' '.join(segment(term).split()) + '"')
+        else:
+            terms.append(f'"{term}"*')
+    if terms and terms[-1] in ("AND", "OR", "NOT"):
+        terms.pop()
+    return ' '.join(terms)
+
+
+class HistoryIndex:
+    """
+    写入只在后台线程的连接上进行（WAL 模式），查询在调用方线程各自的只读连接上进行，互不阻塞。
+    max_chars: 每条日志最多索引的字符数（超长的工具输出只取开头）
+    """
+    def __init__(self, path="logs/history.db", max_chars=20000, flush_interval=0.5, max_queue=10000):
+        self.path = path
+        self.max_chars = max_chars
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(max_queue)
+        self._local = threading.local()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"indexed": 0, "batches": 0, "forgotten": 0, "errors": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with sqlite3.connect(path) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    # ---------- 写入 ----------
+
+    def add(self, name, session, role, content, ts=None):
+        self._put(("add", (name, session, role, content, ts or datetime.now().isoformat())))
+
+    def forget(self, name):
+        self._put(("forget", name))
+
+    def flush(self, timeout=None):
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread is not None and not self._closed:
+            self._closed = True
+            self._queue.put(("stop", None))
+            self._thread.join()
+
+    def _put(self, item):
+        if self._closed:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="history-index", daemon=True)
+                    self._thread.start()
+        self._queue.put(item)
+
+    def _run(self):
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA synchronous=NORMAL")
+        sessions = {}           # 日志名 -> 行 id
+        while True:
+            kind, payload = self._queue.get()
+            batch = [(kind, payload)]
+            deadline = time.monotonic() + self.flush_interval
+            # 攒一批再提交：一个事务内完成，避免每条日志一次 fsync
+            while kind == "add":
+                try:
+                    kind, payload = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append((kind, payload))
+            try:
+                with db:
+                    for kind, payload in batch:
+                        if kind == "add":
+                            self._insert(db, sessions, *payload)
+                        elif kind == "forget":
+                            self._forget(db, sessions, payload)
+                self.stats["batches"] += 1
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                print(f"[History Index] {e}")
+            for kind, payload in batch:
+                if kind == "flush":
+                    payload.set()
+                elif kind == "stop":
+                    db.close()
+                    return
+
+    def _insert(self, db, sessions, name, session, role, content, ts):
+        sid = sessions.get(name)
+        if sid is None:
+            db.execute("INSERT OR IGNORE INTO sessions (name, session, started, updated) VALUES (?, ?, ?, ?)",
+                       (name, session, ts, ts))
+            sid = sessions[name] = db.execute("SELECT id FROM sessions WHERE name = ?", (name,)).fetchone()[0]
+        db.execute("INSERT INTO messages (body, role, sid, ts) VALUES (?, ?, ?, ?)",
+                   (segment(content[:self.max_chars]), role, sid, ts))
+        db.execute("UPDATE sessions SET updated = ?, entries = entries + 1 WHERE id = ?", (ts, sid))
+        self.stats["indexed"] += 1
+
+    def _forget(self, db, sessions, name):
+        row = db.execute("SELECT id FROM sessions WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return
+        db.execute("DELETE FROM messages WHERE sid = ?", (row[0],))
+        db.execute("DELETE FROM sessions WHERE id = ?", (row[0],))
+        sessions.pop(name, None)
+        self.stats["forgotten"] += 1
+
+    # ---------- 查询 ----------
+
+    def _reader(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        return db
+
+    def search(self, query, limit=10, session=None, role=None, fresh=True):
+        """
+        返回按 BM25 排序的命中列表（最相关的在前），每项为
+        {"name", "session", "role", "ts", "snippet", "score"}；fresh=True 时先等本进程排队的日志写入索引
+        """
+        match = match_query(query)
+        if not match:
+            return []
+        if fresh:
+            self.flush(timeout=2)
+        sql = ("SELECT sessions.name, sessions.session, messages.role, messages.ts, "
+               "snippet(messages, 0, char(2), char(3), '…', 16), bm25(messages) "
+               "FROM messages JOIN sessions ON sessions.id = messages.sid WHERE messages MATCH ?")
+        params = [match]
+        if session:
+            sql += " AND sessions.session = ?"
+            params.append(session)
+        if role:
+            sql += " AND messages.role = ?"
+            params.append(role)
+        sql += " ORDER BY bm25(messages) LIMIT ?"
+        params.append(limit)
+        rows = self._reader().execute(sql, params).fetchall()
+        return [{"name": name, "session": sid, "role": role, "ts": ts, "snippet": desegment(snippet),
+                 "score": -score} for name, sid, role, ts, snippet, score in rows]
+
+    def indexed(self):
+        """已索引的日志名"""
+        return {row[0] for row in self._reader().execute("SELECT name FROM sessions")}
+
+    def summary(self):
+        sessions, entries = self._reader().execute("SELECT COUNT(*), COALESCE(SUM(entries), 0) FROM sessions").fetchone()
+        return {"sessions": sessions, "entries": entries}
+
+    def reindex(self, store):
+        """把 LogStore 索引中有、全文索引中没有的会话补进来（读 JSONL 事件流，没有时解析 markdown）"""
+        from src.logstore import open_log, parse_transcript
+        self.flush()
+        known = self.indexed()
+        added = 0
+        for name, entry in store.recent(limit=None):
+            if name in known or not entry["closed"]:
+                continue
+            base = f"{store.root}/{name}"
+            try:
+                with open_log(f"{base}.jsonl") as f:
+                    events = [json.loads(line) for line in f if line.strip()]
+                records = [(e["role"], e["content"], e["ts"]) for e in events if "role" in e]
+            except (OSError, ValueError):
+                ts = datetime.fromtimestamp(entry["updated"]).isoformat()
+                with open_log(f"{base}.md") as f:
+                    roles = {"user": "User", "assistant": "Agent", "observation": "System"}
+                    records = [(roles[r], content, ts) for r, content in parse_transcript(f.read())]
+            for role, content, ts in records:
+                self.add(name, entry.get("session"), role, content, ts)
+            added += 1
+        self.flush()
+        return added
+
+
+def format_hits(hits):
+    if not hits:
+        return "没有找到相关的历史记录。"
+    return "\n".join(f"{i}. [{h['ts'][:16]}] {h['name']} ({h['role']}): {h['snippet']}"
+                     for i, h in enumerate(hits, 1))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_history_index() -> HistoryIndex:
+    """进程内共享的 HistoryIndex，进程退出时写完队列中剩余的条目"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HistoryIndex(settings.HISTORY_DB, settings.HISTORY_MAX_CHARS)
+            atexit.register(_index.close)
+        return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    search = commands.add_parser("search", help="按 BM25 搜索历史会话")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=10)
+    search.add_argument("--session")
+    search.add_argument("--role", choices=("User", "Agent", "System"))
+    commands.add_parser("reindex", help="把尚未索引的旧日志补进索引")
+    commands.add_parser("stats")
+    args = parser.parse_args()
+
+    index = get_history_index()
+    if args.command == "search":
+        start = time.perf_counter()
+        hits = index.search(args.query, args.limit, args.session, args.role)
+        print(format_hits(hits))
+        print(f"\n{len(hits)} hit(s) in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    elif args.command == "reindex":
+        from src.logstore import get_log_store
+        print(f"Indexed {index.reindex(get_log_store())} session(s).")
+    else:
+        print(index.summary())
+
+
+if __name__ == "__main__":
+    main()
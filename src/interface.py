@@ -1,13 +1,20 @@
-from rich.console import Console, Group
+from rich.console import Console, Group, NewLine
 from rich.panel import Panel
 from rich.markdown import Markdown
 from rich.live import Live
 from rich.theme import Theme
 from rich.spinner import Spinner
 from rich.align import Align
+from rich.segment import Segment
 import re
 import json
+import time
 import asyncio
+from src.config import settings
+from src.utils import StreamParser
+
+# 列表、表格、引用、代码块的开头
+BLOCK_START = re.compile(r'[-*+|>`~]|\d+[.)]\s')
 
 
 class ConsoleUI:
@@ -32,82 +39,288 @@ class ConsoleUI:
     def print_error(self, msg):
         self.console.print(f"[error]❌ {msg}[/error]")
 
-    async def render_stream_loop(self, generator):
+    async def render_stream_loop(self, generator, parser=None):
+        """
+        边生成边渲染。parser 为同时喂入这些文本的 StreamParser（agent.step_stream 的那个），
+        渲染器从 parser.drain() 取段落事件；不传时另建一个解析器喂入收到的文本。
+        """
         full_text = ""
+        own_parser = parser is None
+        if own_parser:
+            parser = StreamParser()
+        renderer = StreamRenderer()
         waiting_spinner = Spinner("dots", text="[bold cyan] 正在连接Axiom...[/]", style='cyan')
         initial_panel = Panel(Align.center(waiting_spinner), title="⚡ System Status", border_style="dim")
+        fps = settings.UI_REFRESH_PER_SECOND
+        frame_interval, last_frame = 1 / fps, 0.0
+
+        with Live(initial_panel, console=self.console, refresh_per_second=fps, vertical_overflow='auto') as live:
+            def draw():
+                frame = renderer.frame()
+                for renderable in renderer.take_above():
+                    live.console.print(renderable)
+                live.update(frame)
 
-        with Live(initial_panel, console=self.console, refresh_per_second=5, vertical_overflow='auto') as live:
             async for chunk in generator:
                 full_text += chunk
-
-                panels = []
-
-                def get_section(name):
-                    pattern = f"(?i)@@@\\s*{name}\\s*(.*?)(?=\\n@@@\\s|$)"
-                    matches = list(re.finditer(pattern, full_text, re.DOTALL))
-                    return matches[-1].group(1).strip() if matches else None
-
-                plan = get_section("Plan")
-                thought = get_section("Thought")
-                action = get_section("Action")
-                args = get_section("Args")
-                answer = get_section("Answer")
-
-                if plan:
-                    panels.append(Panel(Markdown(plan), title="📅 Plan", border_style="magenta"))
-
-                if thought:
-                    if not action and not answer:
-                        spinner = Spinner("moon", text=" [bold yellow]Reasoning...[/]", style="yellow")
-                        title = "🤖 Thought Process"
-                        content = Group(Markdown(thought), Align.right(spinner))
-                    else:
-                        title = "🤖 Thought History"
-                        content = Markdown(thought)
-                    panels.append(Panel(content, title=title, border_style="yellow"))
-                if action:
-                    display_content = "..."
-
-                    if args:
-                        stripped = args.strip()
-                        if action == 'python_repl':
-                            match = re.search(r'~~~\s*(?:python)?\s*(.*?)~~~', stripped, re.DOTALL)
-                            if match:
-                                code_content = match.group(1).strip()
-                                display_content = f"```python\n{code_content}\n```"
-                            else:
-                                clean_code = stripped
-                                if clean_code.startswith("~~~"):
-                                    clean_code = clean_code[3:]
-                                if clean_code.endswith("~~~"):
-                                    clean_code = clean_code[:-3]
-                                clean_code = clean_code.strip()
-                                if clean_code.lower().startswith("python"):
-                                    clean_code = clean_code[6:].strip()
-                                display_content = f"```python\n{clean_code}\n```"
-                        else:
-                            try:
-                                parsed_json = json.loads(stripped)
-                                pretty_json = json.dumps(parsed_json, indent=2, ensure_ascii=False)
-                                display_content = f"```json\n{pretty_json}\n```"
-                            except:
-                                display_content = f"```json\n{stripped}\n```"
-                    tool_spinner = Spinner("earth", text=f" Executing [bold]{action}[/]...", style="blue")
-                    action_content = Group(Markdown(display_content), Align.right(tool_spinner))
-                    action_panel = Panel(
-                        action_content,
-                        title=f"🛠️ Action: [bold white]{action}[/bold white]",
-                        border_style="blue"
-                    )
-                    panels.append(action_panel)
-
-                if answer:
-                    result_spinner = Spinner("aesthetic", text=" [bold green]Finalizing Output...[/]", style="green")
-                    answer_content = Group(Markdown(answer), Align.right(result_spinner))
-                    panels.append(Panel(answer_content, title="✅ Final Result", border_style="green"))
-
-                if not panels:
-                    panels.append(Panel(full_text, title="⚡ Streaming...", border_style="dim"))
-                live.update(Group(*panels))
+                if own_parser:
+                    parser.feed(chunk)
+                renderer.apply(parser.drain())
+                # 每帧最多重建一次：块再密，CPU 也只随帧数增长
+                now = time.monotonic()
+                if now - last_frame >= frame_interval:
+                    draw()
+                    last_frame = now
+            if own_parser:
+                parser.close()
+            renderer.apply(parser.drain())
+            draw()
         return full_text
+
+
+class _Cached:
+    """
+    渲染结果按宽度缓存的包装：Live 每次刷新都会重新渲染整个画面，内容没变的部分直接复用上次的 Segment，
+    不再重新排版 Markdown。内容变化时换一个新的 _Cached。
+    """
+    def __init__(self, renderable):
+        self.renderable = renderable
+        self._segments = {}
+
+    def __rich_console__(self, console, options):
+        segments = self._segments.get(options.max_width)
+        if segments is None:
+            segments = self._segments[options.max_width] = list(console.render(self.renderable, options))
+        yield from segments
+
+
+class _Piece:
+    """面板的一段：去掉上边框（接在已打印的上一段之后）和 / 或下边框（后面还有内容），几段拼起来是一个完整的面板"""
+    def __init__(self, panel, top=True, bottom=True):
+        self.panel = panel
+        self.top = top
+        self.bottom = bottom
+
+    def __rich_console__(self, console, options):
+        lines = console.render_lines(self.panel, options)
+        lines = lines[(0 if self.top else 1):(len(lines) if self.bottom else -1)]
+        new_line = Segment.line()
+        for line in lines:
+            yield from line
+            yield new_line
+
+
+class _Section:
+    """
+    一个段落的内容与渲染缓存。Markdown 段落写得很长时（长答案），已经写完的块（空行之后、不在代码块内）
+    每攒够 FREEZE_CHARS 个字符就从 take_frozen() 取出，由渲染器打印到 Live 区域上方，
+    Live 区域里只留最后一截，每帧的排版代价不随段落长度增长。
+    """
+    FREEZE_CHARS = 800
+
+    def __init__(self):
+        self.parts = []
+        self.split = False          # 已经有前半部分打印到上方（面板的上边框已打印）
+        self.tail = None            # 最后一截的 _Cached（内容变化后置为 None，下一帧重建）
+        self._tail_start = 0        # 最后一截在全文中的起点
+        self._scanned = 0           # 已按行扫描到的位置
+        self._fence = None          # 扫描位置处未闭合的代码块标记
+        self._blank = False         # 上一行是代码块外的空行
+        self._cut = 0               # 最近一个可以切开的位置
+
+    @property
+    def raw(self):
+        return ''.join(self.parts)
+
+    @property
+    def content(self):
+        return self.raw.strip()
+
+    def append(self, text):
+        self.parts.append(text)
+        self.tail = None
+
+    def take_frozen(self):
+        """取出已经写完、可以固定下来的前半部分（不够 FREEZE_CHARS 时返回 None）"""
+        raw = self.raw
+        self._scan(raw)
+        if self._cut - self._tail_start < self.FREEZE_CHARS:
+            return None
+        block = raw[self._tail_start:self._cut]
+        self._tail_start = self._cut
+        self.tail = None
+        return block
+
+    def markdown(self):
+        """最后一截的渲染结果，以及本次是否重建"""
+        if self.tail is None:
+            self.tail = _Cached(Markdown(self.raw[self._tail_start:]))
+            return self.tail, True
+        return self.tail, False
+
+    def _scan(self, raw):
+        """
+        逐行（只看新写完的行）找可以切开的块边界：空行之后、顶格开始的标题或段落，且不在代码块内。
+        列表、表格、引用与代码块单独渲染时前后的空行与整篇渲染不同，不在它们前面切开。
+        """
+        pos = self._scanned
+        while True:
+            end = raw.find('\n', pos)
+            if end == -1:
+                break
+            line = raw[pos:end]
+            stripped = line.strip()
+            if self._fence is None:
+                if self._blank and stripped and not line[0].isspace() and not BLOCK_START.match(line):
+                    self._cut = pos
+                if stripped.startswith(("```", "~~~")):
+                    self._fence = stripped[:3]
+            elif stripped.startswith(self._fence):
+                self._fence = None
+            self._blank = self._fence is None and not stripped
+            pos = end + 1
+        self._scanned = pos
+
+
+class StreamRenderer:
+    """
+    流式输出的增量渲染：由 StreamParser 的 start / delta 事件驱动，每个块只做 O(块长) 的追加。
+    已经写完的内容只打印一次，打印在 Live 区域上方，之后不再参与重绘：
+      - 下一个段落开始时，上一个段落即已写完，打印它的最终面板；
+      - 正在写的长段落，前面写完的块分段打印（面板边框接续，看起来仍是一个面板）。
+    Live 区域里只剩正在写的段落的最后一截（Action 与它的 Args 算一个段落），frame() 只在内容变化后重建它。
+    上方待打印的内容由 take_above() 取出；调用方负责按帧率节流调用 frame()。
+    """
+    SECTIONS = ("plan", "thought", "action", "args", "answer")
+    MARKDOWN_SECTIONS = ("plan", "thought", "answer")
+
+    def __init__(self):
+        self.sections = {}
+        self.active = []            # 正在写的段落名
+        self._above = []            # 待打印到 Live 区域上方的内容
+        self._raw = []              # 全部文本，只在还没有任何可显示的段落时使用
+        self.stats = {"events": 0, "frames": 0, "rebuilds": 0, "printed": 0}
+
+    def apply(self, events):
+        for event in events:
+            self.stats["events"] += 1
+            if event.kind in ('start', 'delta') and not self.sections:
+                self._raw.append(event.text)
+            if event.header not in self.SECTIONS:
+                continue
+            if event.kind == 'start':
+                if not (event.header == 'args' and self.active == ['action']):
+                    for name in self.active:
+                        self._print(name)
+                    self.active = []
+                self.sections[event.header] = _Section()
+                self.active.append(event.header)
+            elif event.kind == 'delta':
+                self.sections[event.header].append(event.text)
+
+    def take_above(self):
+        above, self._above = self._above, []
+        self.stats["printed"] += len(above)
+        return above
+
+    def frame(self):
+        self.stats["frames"] += 1
+        panels = []
+        for name in self.active:
+            if name in self.MARKDOWN_SECTIONS:
+                self._print_frozen(name)
+            panel = self._panel(name, live=True)
+            if panel is not None:
+                panels.append(panel)
+        if not panels and not self.sections:
+            panels.append(Panel(''.join(self._raw), title="⚡ Streaming...", border_style="dim"))
+        return Group(*panels)
+
+    def _print(self, name):
+        """段落写完：打印最终面板（已经分段打印过的，只打印剩下的部分）"""
+        if name in self.MARKDOWN_SECTIONS:
+            self._print_frozen(name)
+        panel = self._panel(name)
+        if panel is not None:
+            self._above.append(panel)
+
+    def _print_frozen(self, name):
+        section = self.sections[name]
+        block = section.take_frozen()
+        while block is not None:
+            title, style = self._frame_style(name, live=True)
+            self._above.append(_Piece(Panel(Group(Markdown(block), NewLine()), title=title, border_style=style),
+                                      top=not section.split, bottom=False))
+            section.split = True
+            block = section.take_frozen()
+
+    def _frame_style(self, name, live=False):
+        if name == 'plan':
+            return "📅 Plan", "magenta"
+        if name == 'thought':
+            return ("🤖 Thought Process" if live else "🤖 Thought History"), "yellow"
+        if name == 'action':
+            return f"🛠️ Action: [bold white]{self.sections['action'].content}[/bold white]", "blue"
+        return "✅ Final Result", "green"
+
+    def _markdown(self, name):
+        body, rebuilt = self.sections[name].markdown()
+        self.stats["rebuilds"] += rebuilt
+        return body
+
+    def _args(self, action):
+        section = self.sections["args"]
+        if section.tail is None:
+            section.tail = _Cached(Markdown(format_args(action, section.content)))
+            self.stats["rebuilds"] += 1
+        return section.tail
+
+    def _panel(self, name, live=False):
+        """段落的面板；live=True 时带上表示仍在进行中的 spinner。空段落返回 None"""
+        section = self.sections[name]
+        if name == 'args' or not section.content:
+            return None
+
+        if name == 'action':
+            args = self.sections.get("args")
+            body = self._args(section.content) if args is not None and args.content else Markdown("...")
+        else:
+            body = self._markdown(name)
+
+        if live:
+            spinner = {
+                "plan": None,
+                "thought": Spinner("moon", text=" [bold yellow]Reasoning...[/]", style="yellow"),
+                "action": Spinner("earth", text=f" Executing [bold]{section.content}[/]...", style="blue"),
+                "answer": Spinner("aesthetic", text=" [bold green]Finalizing Output...[/]", style="green"),
+            }[name]
+            if spinner is not None:
+                body = Group(body, Align.right(spinner))
+        title, style = self._frame_style(name, live)
+        panel = Panel(body, title=title, border_style=style)
+        return _Piece(panel, top=False) if section.split else panel
+
+
+def format_args(action, args):
+    """Action 面板中 Args 的显示：python_repl 显示为代码块，其余尝试格式化为 JSON（还没写完时原样显示）"""
+    stripped = args.strip()
+    if action == 'python_repl':
+        match = re.search(r'~~~\s*(?:python)?\s*(.*?)~~~', stripped, re.DOTALL)
+        if match:
+            code_content = match.group(1).strip()
+            return f"```python\n{code_content}\n```"
+        clean_code = stripped
+        if clean_code.startswith("~~~"):
+            clean_code = clean_code[3:]
+        if clean_code.endswith("~~~"):
+            clean_code = clean_code[:-3]
+        clean_code = clean_code.strip()
+        if clean_code.lower().startswith("python"):
+            clean_code = clean_code[6:].strip()
+        return f"```python\n{clean_code}\n```"
+    try:
+        parsed_json = json.loads(stripped)
+        pretty_json = json.dumps(parsed_json, indent=2, ensure_ascii=False)
+        return f"```json\n{pretty_json}\n```"
+    except:
+        return f"```json\n{stripped}\n```"
@@ -0,0 +1,347 @@
+import os
+import re
+import gzip
+import json
+import time
+import shutil
+import atexit
+import threading
+from src.config import settings
+from src.logwriter import get_log_writer
+
+INDEX_NAME = "index.json"
+LOG_PATTERN = re.compile(r'^(chat_.+)\.md(\.gz|\.zst)?$')
+# LogManager 写出的 markdown 日志中每条记录的标题行
+ENTRY_PATTERN = re.compile(r'^(## 👤 User|### 🤖 Agent|> 🛠️ \*\*System/Observation\*\*) \([^)\n]*\)[ \t]*$', re.M)
+ROLES = {"## 👤 User": "user", "### 🤖 Agent": "assistant", "> 🛠️ **System/Observation**": "observation"}
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def _zstd():
+    import zstandard
+    return zstandard
+
+
+def resolve_log(path):
+    """压缩前的日志路径 -> 实际存在的路径（原文件已被压缩时补上 .gz / .zst 后缀）"""
+    path = str(path)
+    if not os.path.exists(path):
+        for suffix in SUFFIXES.values():
+            if os.path.exists(path + suffix):
+                return path + suffix
+    return path
+
+
+def open_log(path, mode='rt'):
+    """打开会话日志（.md / .jsonl），透明处理压缩过的 .gz / .zst；path 可以是压缩前的路径"""
+    path = resolve_log(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding='utf-8' if 't' in mode else None)
+    if path.endswith(".zst"):
+        import io
+        reader = _zstd().ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8') if 't' in mode else reader
+    return open(path, mode, encoding='utf-8' if 't' in mode else None)
+
+
+def _strip_fence(text):
+    text = text.strip()
+    if text.startswith("```") and text.endswith("```"):
+        text = text[text.index("\n") + 1 if "\n" in text else 3:-3]
+    return text.strip("\n")
+
+
+def parse_transcript(text):
+    """把 LogManager 写出的 markdown 日志解析为 [(角色, 内容)]，角色为 user / assistant / observation"""
+    entries = []
+    matches = list(ENTRY_PATTERN.finditer(text))
+    for match, following in zip(matches, matches[1:] + [None]):
+        body = text[match.end(): following.start() if following else len(text)]
+        body = _strip_fence(body)
+        if match.group(1) == "### 🤖 Agent":
+            # 原生 function calling 的日志把工具调用追加在正文之后，回放时只保留正文
+            body = "\n".join(line for line in body.split("\n") if not line.startswith("[tool_call] ")).rstrip()
+        entries.append((ROLES[match.group(1)], body))
+    return entries
+
+
+class LogStore:
+    """
+    logs/ 目录的维护：
+      - 会话索引 logs/index.json：每个会话的条目数、字节数、起止时间、是否已关闭 / 压缩。
+        仪表盘与 reload 的会话选择读索引，不再列目录；索引缺失时扫描一次目录重建。
+      - 轮转：单个日志超过 rotate_bytes 字节或打开超过 rotate_age 秒后，LogManager 换到新的分段文件。
+      - 压缩：已关闭的会话（轮转出的分段、reset / 关闭会话留下的旧日志、idle_close 秒没有写入的日志）
+        由后台维护线程压缩为 .gz（compression="zstd" 且安装了 zstandard 时为 .zst）。
+      - 保留：删除超过 retention_days 天的已关闭会话；总字节超过 retention_bytes 时从最旧的开始删除。
+    索引的修改只在内存中进行，维护线程每 interval 秒落盘一次（原子替换）。
+    多个进程（如 CLI 与 app.py）共用 logs/ 时，保存前合并磁盘上别的进程新登记的会话。
+    """
+    def __init__(self, root="logs", compression="gzip", rotate_bytes=8 * 2 ** 20, rotate_age=24 * 3600,
+                 idle_close=3600, retention_days=None, retention_bytes=None, interval=60, writer=None):
+        self.root = root
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.rotate_age = rotate_age
+        self.idle_close = idle_close
+        self.retention_days = retention_days
+        self.retention_bytes = retention_bytes
+        self.interval = interval
+        self.writer = writer or get_log_writer()
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.sessions = {}              # 日志名（不含 .md）-> 索引条目
+        self._open = set()              # 本进程正在写的日志
+        self._deleted = set()           # 本进程删除的日志（合并时不再从磁盘索引中找回）
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"compressed": 0, "deleted": 0, "saved_bytes": 0, "maintenance_runs": 0}
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # ---------- 索引 ----------
+
+    @staticmethod
+    def name_of(path):
+        return os.path.basename(str(path))[:-len(".md")]
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.sessions = json.load(f).get("sessions", {})
+        except (OSError, ValueError):
+            self.rebuild()
+
+    def rebuild(self):
+        """扫描目录重建索引（只在索引缺失或损坏时发生）"""
+        sessions = {}
+        for entry in os.scandir(self.root):
+            match = LOG_PATTERN.match(entry.name)
+            if not match:
+                continue
+            name, suffix = match.groups()
+            stat = entry.stat()
+            entries = 0
+            if not suffix:
+                with open(entry.path, 'r', encoding='utf-8', errors='replace') as f:
+                    entries = len(ENTRY_PATTERN.findall(f.read()))
+            events = os.path.join(self.root, f"{name}.jsonl{suffix or ''}")
+            size = stat.st_size + (os.path.getsize(events) if os.path.exists(events) else 0)
+            sessions[name] = {"session": None, "created": stat.st_mtime, "updated": stat.st_mtime,
+                              "entries": entries, "bytes": size, "closed": True,
+                              "compressed": suffix[1:] if suffix else None}
+        with self._lock:
+            self.sessions = sessions
+            self._dirty = True
+        self.save()
+
+    def save(self):
+        if not self._dirty:
+            return
+        others = self._read_others()
+        with self._lock:
+            self._merge(others)
+            data = json.dumps({"version": 1, "sessions": self.sessions}, ensure_ascii=False)
+            self._dirty = False
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, self.index_path)
+
+    def _read_others(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("sessions", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _merge(self, others):
+        for name, entry in others.items():
+            ours = self.sessions.get(name)
+            if name in self._deleted or (ours is not None and ours["updated"] >= entry["updated"]):
+                continue
+            if name in self._open:
+                continue
+            self.sessions[name] = entry
+
+    def open_session(self, path, session=None):
+        name = self.name_of(path)
+        now = time.time()
+        with self._lock:
+            entry = self.sessions.get(name)
+            if entry is None:
+                entry = self.sessions[name] = {"session": session, "created": now, "updated": now, "entries": 0,
+                                               "bytes": 0, "closed": False, "compressed": None}
+            entry["closed"] = False
+            self._open.add(name)
+            self._dirty = True
+
+    def record(self, path, entries, nbytes):
+        """LogManager 每写一条调用一次（只改内存中的索引）"""
+        with self._lock:
+            entry = self.sessions.get(self.name_of(path))
+            if entry is None:
+                return
+            entry["entries"] += entries
+            entry["bytes"] += nbytes
+            entry["updated"] = time.time()
+            self._dirty = True
+
+    def should_rotate(self, path):
+        entry = self.sessions.get(self.name_of(path))
+        if entry is None or not entry["entries"]:
+            return False
+        return entry["bytes"] >= self.rotate_bytes or time.time() - entry["created"] >= self.rotate_age
+
+    def close_session(self, path):
+        """会话日志不再写入（轮转 / reset / 关闭会话）：交给维护线程压缩"""
+        name = self.name_of(path)
+        with self._lock:
+            self._open.discard(name)
+            if name in self.sessions:
+                self.sessions[name]["closed"] = True
+                self._dirty = True
+
+    def summary(self):
+        with self._lock:
+            entries = list(self.sessions.values())
+        return {"sessions": len(entries), "active": sum(not e["closed"] for e in entries),
+                "compressed": sum(bool(e["compressed"]) for e in entries),
+                "entries": sum(e["entries"] for e in entries), "bytes": sum(e["bytes"] for e in entries)}
+
+    def recent(self, limit=10):
+        """最近写入的会话，[(日志名, 索引条目)]，最新的在前"""
+        with self._lock:
+            items = list(self.sessions.items())
+        items.sort(key=lambda item: item[1]["updated"], reverse=True)
+        return items[:limit]
+
+    def path_of(self, name):
+        """日志名 -> markdown 路径（压缩过的带 .gz / .zst 后缀）"""
+        entry = self.sessions.get(name) or {}
+        suffix = SUFFIXES.get(entry.get("compressed"), "")
+        return os.path.join(self.root, f"{name}.md{suffix}")
+
+    # ---------- 后台维护 ----------
+
+    def start(self):
+        if self._thread is None and self.interval:
+            self._thread = threading.Thread(target=self._run, name="log-maintenance", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # 本进程的会话到此都不会再写入，下次维护时即可压缩
+        for name in list(self._open):
+            self.close_session(os.path.join(self.root, f"{name}.md"))
+        self.save()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                print(f"[Log Maintenance] {type(e).__name__}: {e}")
+
+    def maintain(self):
+        """关闭长时间没有写入的会话、压缩已关闭的会话、执行保留策略、保存索引"""
+        now = time.time()
+        with self._lock:
+            for name, entry in self.sessions.items():
+                if not entry["closed"] and name not in self._open and now - entry["updated"] >= self.idle_close:
+                    entry["closed"] = True
+                    self._dirty = True
+            pending = [name for name, entry in self.sessions.items() if entry["closed"] and not entry["compressed"]]
+        if self.compression:
+            for name in pending:
+                self.compress(name)
+        self.apply_retention(now)
+        self.stats["maintenance_runs"] += 1
+        self.save()
+
+    def _codec(self):
+        if self.compression == "zstd":
+            try:
+                return "zstd", _zstd().ZstdCompressor(level=10).stream_writer
+            except Exception as e:
+                print(f"[Log Maintenance] zstd unavailable ({e}), falling back to gzip.")
+                self.compression = "gzip"
+        return "gzip", lambda f: gzip.GzipFile(fileobj=f, mode='wb', mtime=0)
+
+    def compress(self, name):
+        codec, wrap = self._codec()
+        total = 0
+        for ext in ("md", "jsonl"):
+            source = os.path.join(self.root, f"{name}.{ext}")
+            if not os.path.exists(source):
+                continue
+            self.writer.release(source)
+            target = source + SUFFIXES[codec]
+            tmp = f"{target}.tmp"
+            with open(source, 'rb') as src, open(tmp, 'wb') as raw:
+                with wrap(raw) as out:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+            os.replace(tmp, target)
+            before = os.path.getsize(source)
+            os.remove(source)
+            total += os.path.getsize(target)
+            self.stats["saved_bytes"] += before - os.path.getsize(target)
+        with self._lock:
+            entry = self.sessions.get(name)
+            if entry is not None:
+                entry["compressed"], entry["bytes"] = codec, total
+                self._dirty = True
+        self.stats["compressed"] += 1
+
+    def apply_retention(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            closed = sorted(((e["updated"], name) for name, e in self.sessions.items() if e["closed"]))
+            total = sum(e["bytes"] for e in self.sessions.values())
+        expired = []
+        for updated, name in closed:
+            too_old = self.retention_days is not None and now - updated > self.retention_days * 86400
+            too_big = self.retention_bytes is not None and total > self.retention_bytes
+            if not (too_old or too_big):
+                continue
+            expired.append(name)
+            total -= self.sessions[name]["bytes"]
+        for name in expired:
+            self.delete(name)
+
+    def delete(self, name):
+        for ext in ("md", "jsonl", "ckpt"):
+            for suffix in ("", *SUFFIXES.values()):
+                path = os.path.join(self.root, f"{name}.{ext}{suffix}")
+                if os.path.exists(path):
+                    self.writer.release(path)
+                    os.remove(path)
+        if settings.HISTORY_INDEX:
+            from src.history import get_history_index
+            get_history_index().forget(name)
+        with self._lock:
+            self.sessions.pop(name, None)
+            self._deleted.add(name)
+            self._dirty = True
+        self.stats["deleted"] += 1
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_log_store() -> LogStore:
+    """进程内共享的 LogStore（第一次调用时加载索引并启动维护线程），进程退出时保存索引"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LogStore("logs", settings.LOG_COMPRESSION, settings.LOG_ROTATE_BYTES, settings.LOG_ROTATE_AGE,
+                              settings.LOG_IDLE_CLOSE, settings.LOG_RETENTION_DAYS, settings.LOG_RETENTION_BYTES,
+                              settings.LOG_MAINTAIN_INTERVAL).start()
+            atexit.register(_store.stop)
+        return _store
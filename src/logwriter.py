@@ -0,0 +1,172 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from collections import OrderedDict, defaultdict
+from src.config import settings
+
+
+class LogWriter:
+    """
+    后台日志写入线程：调用方只把 (路径, 文本) 放进有界队列，不在事件循环上做任何文件 I/O。
+    写入线程按批落盘——累计超过 batch_bytes 字节或距本批第一条超过 flush_interval 秒时写一次，
+    同一文件的多条记录合并为一次 write。文件句柄保持打开（最多 max_open 个，LRU 关闭）。
+    用线程而不是 asyncio 任务：工具线程、CLI 与多个会话的事件循环都可以直接写日志。
+
+    fsync 策略：
+        "none"   只 flush 到操作系统，由内核决定何时落盘（最快）
+        "close"  关闭文件（LRU 淘汰 / release / 进程退出）时 fsync
+        "batch"  每批写完都 fsync（崩溃最多丢一批）
+    队列满时 write 阻塞等待（背压），不丢日志；阻塞次数记在 stats["blocked"]。
+    """
+    FSYNC_POLICIES = ("none", "close", "batch")
+
+    def __init__(self, max_queue=10000, batch_bytes=64 * 1024, flush_interval=0.5, fsync="close", max_open=64):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of {self.FSYNC_POLICIES}")
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_open = max_open
+        self._queue = queue.Queue(max_queue)
+        self._files = OrderedDict()         # 路径 -> 打开的文件（LRU）
+        self._dirs = set()                  # 已确认存在的目录
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"records": 0, "batches": 0, "bytes": 0, "fsyncs": 0, "blocked": 0, "errors": 0}
+
+    def write(self, path, text):
+        self._put(("write", path, text))
+
+    def flush(self, timeout=None):
+        """等待此前放入队列的记录全部写入文件（读取自己的日志之前调用）"""
+        return self._wait("flush", None, timeout)
+
+    def release(self, path, timeout=None):
+        """写完 path 上排队的记录后关闭它的句柄（之后删除 / 重命名 / 压缩该文件是安全的）"""
+        return self._wait("release", path, timeout)
+
+    def close(self):
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._queue.put(("stop", None, None))
+        self._thread.join()
+
+    def _wait(self, kind, path, timeout):
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._put((kind, path, done))
+        return done.wait(timeout)
+
+    def _put(self, item):
+        if self._closed:
+            # 进程退出之后才到达的记录：直接同步写入
+            kind, path, payload = item
+            if kind == "write":
+                self._write_batch({path: [payload]})
+                self._close_file(path)
+            elif payload is not None:
+                payload.set()
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats["blocked"] += 1
+            self._queue.put(item)
+
+    def _run(self):
+        pending, size, deadline = defaultdict(list), 0, None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, path, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind = None
+            if kind == "write":
+                pending[path].append(payload)
+                size += len(payload)
+                self.stats["records"] += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if size < self.batch_bytes:
+                    continue
+            # 批满、到时间或收到控制消息：先把已排队的写完
+            if pending:
+                self._write_batch(pending)
+                pending, size, deadline = defaultdict(list), 0, None
+            if kind == "release":
+                self._close_file(path)
+            elif kind == "stop":
+                for path in list(self._files):
+                    self._close_file(path)
+                return
+            if kind in ("flush", "release"):
+                payload.set()
+
+    def _write_batch(self, pending):
+        for path, chunks in pending.items():
+            data = ''.join(chunks)
+            try:
+                f = self._open(path)
+                f.write(data)
+                f.flush()
+                if self.fsync == "batch":
+                    os.fsync(f.fileno())
+                    self.stats["fsyncs"] += 1
+                self.stats["bytes"] += len(data)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[Log Error] Could not write to log file: {e}")
+        self.stats["batches"] += 1
+
+    def _open(self, path):
+        f = self._files.get(path)
+        if f is not None:
+            self._files.move_to_end(path)
+            return f
+        directory = os.path.dirname(path) or "."
+        if directory not in self._dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+        f = self._files[path] = open(path, 'a', encoding='utf-8')
+        while len(self._files) > self.max_open:
+            self._close_file(next(iter(self._files)))
+        return f
+
+    def _close_file(self, path):
+        f = self._files.pop(path, None)
+        if f is None:
+            return
+        try:
+            if self.fsync != "none":
+                f.flush()
+                os.fsync(f.fileno())
+                self.stats["fsyncs"] += 1
+            f.close()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[Log Error] Could not close log file: {e}")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer() -> LogWriter:
+    """进程内共享的日志写入线程（所有会话共用），进程退出时写完队列中剩余的记录"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter(settings.LOG_QUEUE_SIZE, settings.LOG_BATCH_BYTES, settings.LOG_FLUSH_INTERVAL,
+                                settings.LOG_FSYNC)
+            atexit.register(_writer.close)
+        return _writer
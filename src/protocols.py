@@ -0,0 +1,114 @@
+from src.config import settings
+from src.states import ToolCall
+from src.utils import Parser, StreamParser
+
+
+class TextProtocol:
+    """
+    默认的 @@@ 文本协议：动作写在 `@@@ Action` / `@@@ Args` 段落中，由 StreamParser 解析。
+    """
+    name = "text"
+
+    def new_parser(self):
+        return StreamParser(parallel=settings.PARALLEL_ACTIONS)
+
+    def request_kwargs(self, tool_manager):
+        return {}
+
+    def feed_tool_calls(self, parser, deltas):
+        pass
+
+    def assistant_message(self, parser):
+        return {"role": "assistant", "content": parser.text}
+
+    def parse_state(self, parser, tool_manager=None):
+        return parser.state(tool_manager.get_signature if tool_manager else None)
+
+    def error_messages(self, parser, error):
+        """解析失败时需要补写进历史的消息（文本协议由调用方以 Observation 提示重试）"""
+        return []
+
+    def observation_messages(self, content, calls=None, results=None):
+        return [{"role": "user", "content": f'[Observation]: {content}'}]
+
+
+class FunctionCallingProtocol(TextProtocol):
+    """
+    原生 function calling：工具以 JSON Schema 形式通过 `tools` 传给模型，
+    动作由流式 `tool_calls` 返回（支持并行调用），参数由服务端保证为 JSON。
+    Plan / Thought / Answer 仍然以 @@@ 段落写在正文中。
+    """
+    name = "function"
+
+    def request_kwargs(self, tool_manager):
+        return {"tools": tool_manager.get_tool_schemas(), "parallel_tool_calls": True}
+
+    def feed_tool_calls(self, parser, deltas):
+        """按 index 累积流式 tool_call 片段：name 与 arguments 会被拆成多块发送"""
+        for delta in deltas:
+            entry = parser.raw_tool_calls.setdefault(delta.index, {"id": None, "name": "", "arguments": ""})
+            if delta.id:
+                entry["id"] = delta.id
+            if delta.function is not None:
+                entry["name"] += delta.function.name or ""
+                entry["arguments"] += delta.function.arguments or ""
+
+    def _raw_calls(self, parser):
+        return [parser.raw_tool_calls[i] for i in sorted(parser.raw_tool_calls)]
+
+    def assistant_message(self, parser):
+        message = {"role": "assistant", "content": parser.text}
+        raw_calls = self._raw_calls(parser)
+        if raw_calls:
+            message["tool_calls"] = [
+                {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"] or "{}"}}
+                for c in raw_calls
+            ]
+        return message
+
+    def parse_state(self, parser, tool_manager=None):
+        state = super().parse_state(parser, tool_manager)
+        raw_calls = self._raw_calls(parser)
+        if not raw_calls:
+            # 没有工具调用时，正文本身就是回复，不必再要求模型补写 @@@ Answer
+            if not state.has_action and not state.final_answer and not state.error:
+                text = parser.text.strip()
+                if text and not parser.sections:
+                    state.final_answer = text
+            return state
+
+        state.error = None
+        state.final_answer = None     # 有工具调用时必须先返回结果，本轮不算结束
+        state.actions = []
+        state.repaired = 0
+        for i, call in enumerate(raw_calls, 1):
+            signature = tool_manager.get_signature(call["name"]) if tool_manager else None
+            args, error, repaired = Parser.parse_json_args(call["arguments"], signature)
+            if error:
+                state.error = f"{error} (Action {i}: {call['name']})"
+                state.actions = []
+                break
+            state.repaired += repaired
+            state.actions.append(ToolCall(call["name"], args, call["id"]))
+        if state.actions:
+            state.action_name = state.actions[0].name
+            state.action_args = state.actions[0].args
+        return state
+
+    def error_messages(self, parser, error):
+        # 带 tool_calls 的 assistant 消息之后必须跟随对应的 tool 消息，否则下一次请求会被拒绝
+        return [{"role": "tool", "tool_call_id": c["id"], "content": f"Error: {error}"}
+                for c in self._raw_calls(parser) if c["id"]]
+
+    def observation_messages(self, content, calls=None, results=None):
+        if not calls or not results or not all(call.id for call in calls):
+            return super().observation_messages(content, calls, results)
+        return [{"role": "tool", "tool_call_id": call.id, "content": str(result)}
+                for call, result in zip(calls, results)]
+
+
+PROTOCOLS = {p.name: p for p in (TextProtocol, FunctionCallingProtocol)}
+
+
+def get_protocol(name: str = "text"):
+    return PROTOCOLS.get(name, TextProtocol)()
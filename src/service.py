@@ -0,0 +1,88 @@
+import uuid
+import threading
+from src.agent import ReactAgent
+from src.utils import ToolManager
+
+
+class AgentService:
+    """
+    进程级服务层：所有会话共享一份工具注册表（ToolManager，写时复制、按版本号更新）、一个 AsyncOpenAI 客户端
+    （即一个 HTTP 连接池）和一个工具目录监视器；每个会话只持有自己的 Context、日志与统计（ReactAgent）。
+    """
+    def __init__(self, tool_manager=None, client=None):
+        self.tool_manager = tool_manager or ToolManager()
+        self.client = client or ReactAgent.build_client()
+        self.watcher = ReactAgent.build_watcher()
+        self.sessions = {}
+        self.stats = {"created": 0, "closed": 0, "turns": 0, "steps": 0}
+
+    def create_session(self, session_id=None) -> ReactAgent:
+        session_id = session_id or uuid.uuid4().hex[:8]
+        agent = ReactAgent(self.tool_manager, client=self.client, watcher=self.watcher, session_id=session_id)
+        self.sessions[session_id] = agent
+        self.stats["created"] += 1
+        return agent
+
+    def get_session(self, session_id):
+        return self.sessions.get(session_id)
+
+    def close_session(self, session_id):
+        agent = self.sessions.pop(session_id, None)
+        if agent is not None:
+            agent.logger.close()
+            self.stats["closed"] += 1
+
+    async def run_turn(self, agent: ReactAgent, user_input: str, max_steps: int = 20):
+        """
+        无界面的 ReAct 循环（与 main.py 的主循环一致，但不渲染），返回最终回答；
+        超过 max_steps 仍未回答时返回 None。用于负载测试与脚本化调用。
+        """
+        self.stats["turns"] += 1
+        prompt = user_input
+        for step in range(1, max_steps + 1):
+            diff = await agent.apoll_tool_changes()
+            if diff:
+                prompt = f"Observation: Tools auto-reloaded. {diff.summary()}\n{prompt}"
+            parser = agent.protocol.new_parser()
+            async for _ in agent.step_stream(f"{prompt}[CURRENT STEP: {step}]", parser):
+                pass
+            self.stats["steps"] += 1
+            state = agent.parse_state(parser)
+            if state.plan:
+                agent.update_plan(state.plan)
+            if state.final_answer:
+                return state.final_answer
+            if state.is_refresh:
+                prompt = f"Observation: Tools reloaded successfully. {agent.reload_toolset().summary()}"
+            elif state.error:
+                prompt = f"Observation: Error: {state.error}. Please reflect and retry."
+            elif state.has_action:
+                runs = await agent.run_actions(state)
+                results = [run.output for run in runs]
+                result = self.tool_manager.format_results(state.actions, results) if len(runs) > 1 else results[0]
+                agent.add_observation(result, state.actions, results)
+                prompt = "Observation: (See history for result)"
+            else:
+                prompt = "System Hint: You stopped without an Action or Answer. Please continue."
+        return None
+
+    async def aclose(self):
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        if self.watcher is not None:
+            self.watcher.stop()
+        await self.client.close()
+        self.tool_manager.executor.shutdown()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> AgentService:
+    """进程内唯一的 AgentService（第一次调用时创建）"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AgentService()
+        return _service
@@ -1,5 +1,90 @@
-from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+
+@dataclass
+class ToolCall:
+    name: str
+    args: Dict[str, Any] = field(default_factory=dict)
+    id: Optional[str] = None       # 原生 function calling 返回的 tool_call_id
+
+
+@dataclass
+class ToolResult:
+    name: str
+    output: str
+    status: str = "ok"             # 'ok' | 'error' | 'invalid' | 'timeout'
+    wall_time: float = 0.0         # 秒
+    cpu_time: Optional[float] = None
+    isolation: str = "thread"
+    cached: bool = False
+
+    def __str__(self):
+        return self.output
+
+
+@dataclass
+class Span:
+    """一段被追踪的操作（见 src/tracing.py）"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = 0.0                  # 墙上时间（epoch 秒）
+    duration_ms: Optional[float] = None # 结束前为 None
+    status: str = "ok"                  # 'ok' | 'error'
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    perf_start: float = field(default=0.0, repr=False)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def to_dict(self):
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "start": self.start, "duration_ms": self.duration_ms, "status": self.status,
+                "attributes": self.attributes}
+
+
+@dataclass
+class ReloadDiff:
+    """一次增量热重载的结果"""
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    modules: List[str] = field(default_factory=list)        # 实际重载 / 卸载的工具模块
+    errors: Dict[str, str] = field(default_factory=dict)    # 模块 -> 错误，出错的模块保留旧版本
+    version: int = 0                                        # 重载后的注册表版本
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.errors)
+
+    @classmethod
+    def merge(cls, diffs):
+        """把连续多次重载合并成一次（先新增后删除的工具互相抵消），用于落后多个版本的会话"""
+        status, merged = {}, cls()
+        for diff in diffs:
+            for name in diff.added:
+                status[name] = "changed" if status.get(name) == "removed" else "added"
+            for name in diff.changed:
+                status[name] = status.get(name) if status.get(name) == "added" else "changed"
+            for name in diff.removed:
+                if status.pop(name, None) != "added":
+                    status[name] = "removed"
+            merged.modules += [m for m in diff.modules if m not in merged.modules]
+            merged.errors.update(diff.errors)
+            merged.version = diff.version
+        for name, state in status.items():
+            getattr(merged, state).append(name)
+        return merged
+
+    def summary(self):
+        if not self:
+            return "No tool changes detected."
+        parts = [f"{label}: {', '.join(names)}" for label, names in
+                 (("Added", self.added), ("Removed", self.removed), ("Changed", self.changed)) if names]
+        parts += [f"Failed {module}: {error}" for module, error in self.errors.items()]
+        return "; ".join(parts)
 
 
 @dataclass
@@ -13,6 +98,8 @@ class AgentState:
     is_quit: bool = False
     is_clear: bool = False
     error: Optional[str] = None
+    actions: List[ToolCall] = field(default_factory=list)
+    repaired: int = 0              # 本地修复成功（因此省去一次重试往返）的 Args 个数
 
     @property
     def has_action(self):
@@ -20,4 +107,11 @@ class AgentState:
     
     @property
     def is_finished(self):
-        return bool(self.final_answer)
\ No newline at end of file
+        return bool(self.final_answer)
+
+
+@dataclass
+class StreamEvent:
+    kind: str                      # 'start' | 'delta' | 'complete' | 'ready'
+    header: Optional[str] = None   # 小写的段落名，None 表示第一个 @@@ 之前的内容
+    text: str = ""
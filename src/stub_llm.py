@@ -0,0 +1,281 @@
+"""
+本地的 OpenAI 兼容桩模型服务，用于离线、可复现的基准测试。
+
+只实现 POST /v1/chat/completions（流式 SSE 与非流式）、GET /v1/models 和返回服务端统计的 GET /stats。
+回复来自录制好的 `@@@` 格式对话记录（如 examples/*/聊天记录.md）：第 i 个 Agent 回复对应请求中已有 i 条 assistant 消息的那次请求，
+服务端因此是无状态的，任意多个会话并发回放互不干扰。回放到末尾后从头循环。
+
+用法（在项目根目录）:
+    python -m src.stub_llm examples/*/聊天记录.md --port 8765 --token-rate 50 --latency 0.3
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 DASHSCOPE_API_KEY=stub python main.py
+"""
+import re
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from src.logstore import parse_transcript
+
+# 近似的 token 切分：每个汉字、每个单词 / 数字串、每段空白、每个标点各算一个 token
+TOKEN_PATTERN = re.compile(r'[一-鿿]|[A-Za-z0-9_]+|\s+|[^\sA-Za-z0-9_一-鿿]')
+
+
+def load_transcripts(paths):
+    """读取若干对话记录，返回 (按顺序的 Agent 回复列表, 用户提问列表)"""
+    replies, questions = [], []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for role, content in parse_transcript(f.read()):
+                if role == "assistant":
+                    replies.append(content)
+                elif role == "user" and not content.startswith("Observation"):
+                    questions.append(content)
+    return replies, questions
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text)
+
+
+class StubLLMServer:
+    """
+    replies:      按顺序回放的 Agent 回复
+    token_rate:   每秒输出的 token 数（0 表示不限速）
+    latency:      收到请求到第一个 token 之前的延迟（秒），即模拟的首 token 时间
+    chunk_tokens: 每个 SSE 事件包含的 token 数
+    """
+    def __init__(self, replies, token_rate=0.0, latency=0.0, chunk_tokens=1, host="127.0.0.1", port=0,
+                 model="stub"):
+        if not replies:
+            raise ValueError("StubLLMServer needs at least one reply to replay")
+        self.replies = replies
+        self.token_rate = token_rate
+        self.latency = latency
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.host = host
+        self.port = port
+        self.model = model
+        self.stats = {"requests": 0, "streams": 0, "aborted": 0, "tokens": 0}
+        self._server = None
+        self._connections = set()
+        self._loop = None
+        self._thread = None
+        self._process = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def serve_in_thread(self):
+        """在独立线程的事件循环中运行（不占用被测程序的事件循环），返回 base_url"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="stub-llm", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def serve_in_process(self):
+        """
+        在子进程中运行，返回 base_url。压测时用它代替 serve_in_thread：服务端与被测程序不争用 GIL，
+        测到的延迟不会被线程切换放大。服务端统计通过 GET /stats 读取。
+        """
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve_process, args=(self, child), daemon=True)
+        self._process.start()
+        self.port = parent.recv()
+        return self.base_url
+
+    def remote_stats(self):
+        """读取服务端统计（子进程模式下本对象的 stats 不会更新）"""
+        import urllib.request
+        with urllib.request.urlopen(f"http://{self.host}:{self.port}/stats") as response:
+            return json.loads(response.read())
+
+    def shutdown(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __getstate__(self):
+        # 传给子进程时只带配置
+        state = dict(self.__dict__)
+        state.update(_server=None, _connections=set(), _loop=None, _thread=None, _process=None)
+        return state
+
+    def reply_for(self, messages):
+        index = sum(1 for m in messages if m.get("role") == "assistant")
+        return self.replies[index % len(self.replies)]
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                if method == "GET" and path.rstrip("/") == "/stats":
+                    await self._send_json(writer, 200, self.stats)
+                elif method == "GET" and path.rstrip("/").endswith("/models"):
+                    await self._send_json(writer, 200, {"object": "list", "data": [{"id": self.model, "object": "model"}]})
+                elif method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                    await self._completions(writer, json.loads(body or b"{}"))
+                else:
+                    await self._send_json(writer, 404, {"error": {"message": f"{method} {path} not found"}})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.stats["aborted"] += 1
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, path, _ = line.decode('latin-1').split(" ", 2)
+        length = 0
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode('latin-1').partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value.strip())
+        body = await reader.readexactly(length) if length else b""
+        return method, path, body
+
+    @staticmethod
+    async def _send_json(writer, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    def _usage(self, messages, completion_tokens):
+        prompt_tokens = sum(len(tokenize(m.get("content") or "")) for m in messages)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def _completions(self, writer, request):
+        self.stats["requests"] += 1
+        messages = request.get("messages", [])
+        reply = self.reply_for(messages)
+        tokens = tokenize(reply)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        created, completion_id = int(time.time()), f"chatcmpl-stub-{self.stats['requests']}"
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": self.model}
+
+        if not request.get("stream"):
+            if self.token_rate:
+                await asyncio.sleep(len(tokens) / self.token_rate)
+            self.stats["tokens"] += len(tokens)
+            await self._send_json(writer, 200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": self.model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": self._usage(messages, len(tokens))})
+            return
+
+        self.stats["streams"] += 1
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+
+        async def event(payload):
+            data = f"data: {payload}\n\n".encode('utf-8')
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+
+        interval = self.chunk_tokens / self.token_rate if self.token_rate else 0
+        start = time.perf_counter()
+        for i in range(0, len(tokens), self.chunk_tokens):
+            if interval:
+                # 按绝对时间对齐，避免 sleep 误差累积
+                delay = start + (i // self.chunk_tokens) * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            delta = {"content": "".join(tokens[i:i + self.chunk_tokens])}
+            if i == 0:
+                delta["role"] = "assistant"
+            await event(json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]},
+                                   ensure_ascii=False))
+            self.stats["tokens"] += len(tokens[i:i + self.chunk_tokens])
+        await event(json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            await event(json.dumps({**base, "choices": [], "usage": self._usage(messages, len(tokens))}))
+        await event("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def _serve_process(server, conn):
+    async def serve():
+        await server.start()
+        conn.send(server.port)
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcripts", nargs="*", help="对话记录（默认 examples/*/聊天记录.md）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token-rate", type=float, default=0.0, help="每秒输出的 token 数，0 表示不限速")
+    parser.add_argument("--latency", type=float, default=0.0, help="首 token 前的延迟（秒）")
+    parser.add_argument("--chunk-tokens", type=int, default=1)
+    args = parser.parse_args()
+
+    paths = args.transcripts or sorted(glob.glob("examples/*/聊天记录.md"))
+    replies, questions = load_transcripts(paths)
+    if not replies:
+        sys.exit(f"No agent replies found in {paths}")
+    server = StubLLMServer(replies, args.token_rate, args.latency, args.chunk_tokens, args.host, args.port)
+
+    async def serve():
+        url = await server.start()
+        print(f"Stub LLM serving {len(replies)} replies from {len(paths)} transcript(s) at {url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,21 @@
 from src.tools import search_memory
+from src.config import settings
 import os
 from datetime import datetime
 
 # 确保日志目录存在
 os.makedirs('./logs', exist_ok=True)
 
+refresh_hint = ("工具目录的变化会被自动检测，并在下一步生效（Observation 中会列出新增 / 修改的工具），无需 `[REFRESH]`。"
+                if settings.WATCH_TOOLS else "创建新工具后，必须执行 `[REFRESH]` 指令。")
+
 resources = fr"""
 1. **工具库 (`src/tools/`)**：
    - 列表：
 {{tool_structure}}
    - 描述：
 {{tool_descriptions}}
-   - *注意：创建新工具后，必须执行 `[REFRESH]` 指令。*
+   - *注意：{refresh_hint}*
    - **备份规范**：在工具目录下备份时，文件名必须加下划线前缀（如 `_backup.py`），防止系统错误加载。
 
 2. **记忆库 (`memory/`)**：
@@ -70,6 +74,83 @@ print("Hello World")
 <给用户的最终回复内容>
 """
 
+parallel_workflow = fr"""
+<hr>
+
+#### 模式 C：并行执行模式 (Parallel Mode)
+*多个工具调用**互不依赖**（如同时读取多个文件、抓取多个网页）时使用，在一轮内完成。*
+
+@@@ Thought
+(说明为什么这些调用互不依赖)
+
+@@@ Parallel
+
+@@@ Action
+<工具函数名 1>
+
+@@@ Args
+<JSON 参数 1>
+
+@@@ Action
+<工具函数名 2>
+
+@@@ Args
+<JSON 参数 2>
+
+**🛑 最后一组 `@@@ Args` 之后立即停止生成**，系统会并发执行并按顺序返回 `[1] ... [2] ...` 的合并 Observation。
+- 后一个调用依赖前一个结果时，**禁止**使用并行模式。
+- 并行模式中不能使用 `python_repl` 与特殊指令。
+""" if settings.PARALLEL_ACTIONS else ""
+
+step_rule = r"""1. **单步执行原则 (ONE STEP LIMIT)**：
+   - 🚫 **严禁**：在一次回复中生成多个 Action（模式 C 除外）。这会导致后续动作丢失。
+   - ✅ **必须**：每轮仅生成**一个** `Action` 和 `Args` 组合（或一个 `@@@ Parallel` 批次），输出完毕后**立即停止生成**，等待系统返回 Observation。
+   - **python_repl**: 可以用python_repl合并多个Action以节省token。""" if settings.PARALLEL_ACTIONS else r"""1. **单步执行原则 (ONE STEP LIMIT)**：
+   - 🚫 **严禁**：在一次回复中生成多个 Action。这会导致后续动作丢失。
+   - ✅ **必须**：每轮仅生成**一个** `Action` 和 `Args` 组合，输出完毕后**立即停止生成**，等待系统返回 Observation。
+   - **python_repl**: 可以用python_repl合并多个Action以节省token。"""
+
+args_rule = r"""3. **参数格式**：`python_repl` 必须用 `~~~ python`，其他工具必须用 JSON。"""
+
+if settings.PROTOCOL == "function":
+    # 原生 function calling：动作通过 tool_calls 发出，正文只保留 Plan / Thought / Answer
+    workflow = fr"""
+#### 模式 A：执行模式 (Execution Mode)
+*用于调用工具。先在正文中写 Plan / Thought，然后通过**原生工具调用 (function calling)** 发出动作，不要在正文中写 `@@@ Action` / `@@@ Args`。*
+
+@@@ Plan
+(新任务或复杂任务必须使用)
+- [ ] 步骤 1
+- [ ] 步骤 2
+
+@@@ Thought
+<MEMORY CHECK: (必须确认是否已查阅 memory/)>
+<REFLECTION: (若上一步出错，在此反思原因)>
+...这里写推理过程...
+
+(随后发起工具调用；多个**互不依赖**的调用可以在同一轮并行发出)
+
+特殊指令 `[REFRESH]`, `[QUIT]`, `[CLEAR]` 不是工具，仍然用正文输出：
+@@@ Action
+[REFRESH]
+
+<hr>
+
+#### 模式 B：响应模式 (Response Mode)
+*用于任务完成或直接回复用户。*
+
+@@@ Thought
+(简要总结执行结果)
+
+@@@ Answer
+<给用户的最终回复内容>
+"""
+    parallel_workflow = ""
+    step_rule = r"""1. **单步执行原则 (ONE STEP LIMIT)**：
+   - ✅ 每轮可以发起一个或多个**互不依赖**的工具调用，之后等待系统返回结果。
+   - 🚫 后一个调用依赖前一个结果时，必须分多轮进行。"""
+    args_rule = r"""3. **参数格式**：工具参数由 function calling 的 JSON 参数传递，`python_repl` 的代码放在 `code` 参数中。"""
+
 constrains = fr"""
 1. **文件与数据安全**：
    - **修改流程**：读取 -> `workspace/`建临时文件 -> 对比差异(Diff) -> 合并。
@@ -89,12 +170,36 @@ constrains = fr"""
    - 你不能读取图片，如果用户要求你读取图片，请拒绝，禁止伪造图片信息。
 """
 
-dashboard = fr"""
+
+def _log_summary():
+    # 读 logs/index.json 的内存副本，不列目录
+    from src.logstore import get_log_store
+    s = get_log_store().summary()
+    return f"{s['sessions']} sessions ({s['active']} active), {s['bytes'] / 2 ** 20:.1f} MiB."
+
+
+def _memory_snapshot():
+    # 新检出的仓库没有 memory/index.json（或索引缺少 keyword_index），此时快照为空，不影响本次请求
+    try:
+        return search_memory("user_info", True)
+    except Exception:
+        return "未找到相关记忆"
+
+
+def dashboard():
+    """易变的状态信息，不放进系统提示，而是附在每次请求的最后一条用户消息之后"""
+    return fr"""
+[SYSTEM DASHBOARD]
+### 📊 系统状态仪表盘
 - **时间**: {datetime.now()}
 - **路径**: {os.getcwd()}
-- **日志**: {len(os.listdir('./logs'))} active logs.
+- **日志**: {_log_summary()}
+
+### 🧠 用户记忆快照 (只读)
+{_memory_snapshot()}
 """
 
+
 sys_prompt = fr"""
 ### 🟢 系统内核：Axiom (ReAct Agent)
 你是一个运行在严格**正则表达式解析内核**上的智能体。
@@ -103,12 +208,9 @@ sys_prompt = fr"""
 <hr>
 
 ### ⚠️ 关键解析规则 (必须严格遵守)
-1. **单步执行原则 (ONE STEP LIMIT)**：
-   - 🚫 **严禁**：在一次回复中生成多个 Action。这会导致后续动作丢失。
-   - ✅ **必须**：每轮仅生成**一个** `Action` 和 `Args` 组合，输出完毕后**立即停止生成**，等待系统返回 Observation。
-   - **python_repl**: 可以用python_repl合并多个Action以节省token。
+{step_rule}
 2. **换行语法**：标签（如 `@@@ Action`）必须**独占一行**。
-3. **参数格式**：`python_repl` 必须用 `~~~ python`，其他工具必须用 JSON。
+{args_rule}
 
 <hr>
 
@@ -119,7 +221,7 @@ sys_prompt = fr"""
 
 ### 🔄 工作流协议 (请选择一种模式，所有内容统一使用Markdown格式)
 {workflow}
-
+{parallel_workflow}
 <hr>
 
 ### 🛡️ 操作约束与规范
@@ -127,13 +229,8 @@ sys_prompt = fr"""
 
 <hr>
 
-### 📊 系统状态仪表盘
-{dashboard}
-
-<hr>
-
-### 🧠 用户记忆快照 (只读)
-{search_memory("user_info", True)}
+### 📊 系统状态仪表盘与用户记忆
+系统会在每条用户消息之后附上 `[SYSTEM DASHBOARD]`（时间、路径、日志数量、用户记忆快照），以其中最新的内容为准。
 
 <hr>
 
@@ -0,0 +1,85 @@
+import math
+from functools import lru_cache
+
+
+class TokenCounter:
+    """Token 计数器基类：count(text) 返回文本的 token 数"""
+    name = "base"
+    # 每条消息的固定开销（role、分隔符等）
+    message_overhead = 4
+
+    def count(self, text: str) -> int:
+        raise NotImplementedError
+
+    def count_message(self, message: dict) -> int:
+        total = self.count(message.get('content') or "") + self.message_overhead
+        for call in message.get('tool_calls') or []:
+            function = call.get('function', {})
+            total += self.count(function.get('name', "")) + self.count(function.get('arguments', ""))
+        return total
+
+
+class ByteTokenCounter(TokenCounter):
+    """
+    基于 UTF-8 字节数的本地估算，无需任何依赖，整段计算都在 C 层完成。
+    ASCII 约 4 字符 / token；中日韩等多字节字符约 1 字符 / token（Qwen / GPT 系 BPE 的经验值）。
+    """
+    name = "bytes"
+
+    def __init__(self, ascii_per_token: float = 4.0, wide_per_token: float = 1.0):
+        self.ascii_per_token = ascii_per_token
+        self.wide_per_token = wide_per_token
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        n_chars = len(text)
+        n_bytes = len(text.encode('utf-8', errors='ignore'))
+        # 常见的多字节字符（中文）占 3 字节，多出来的字节数 / 2 即为宽字符数
+        wide = min(n_chars, (n_bytes - n_chars) // 2)
+        narrow = n_chars - wide
+        return math.ceil(narrow / self.ascii_per_token + wide / self.wide_per_token)
+
+
+class TiktokenCounter(TokenCounter):
+    """使用 tiktoken 的本地 BPE 编码（需要安装 tiktoken）"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        import tiktoken
+        self.name = f"tiktoken:{encoding}"
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=())) if text else 0
+
+
+class HFTokenCounter(TokenCounter):
+    """加载本地 tokenizer.json（如 Qwen 的 BPE 词表，需要安装 tokenizers）"""
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+        self.name = f"hf:{path}"
+        self.tokenizer = Tokenizer.from_file(path)
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids) if text else 0
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(spec: str = "bytes") -> TokenCounter:
+    """
+    根据配置字符串创建计数器：
+      - "bytes"                 本地字节级估算（默认）
+      - "tiktoken:<encoding>"   tiktoken BPE
+      - "<path>/tokenizer.json" HuggingFace tokenizers 本地词表
+    可选依赖缺失时回退到字节级估算。
+    """
+    try:
+        if spec.startswith("tiktoken"):
+            _, _, encoding = spec.partition(":")
+            return TiktokenCounter(encoding or "cl100k_base")
+        if spec.endswith(".json"):
+            return HFTokenCounter(spec)
+    except Exception as e:
+        print(f"[Tokenizer] {spec} unavailable ({e}), falling back to byte-level estimate.")
+    return ByteTokenCounter()
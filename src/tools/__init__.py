@@ -1,8 +1,6 @@
 import os
-import sys
-import pkgutil
-import importlib
-import inspect
+from src.config import settings
+from src.tools._manifest import build_manifest, load_tools
 
 # 获取当前文件夹路径
 package_path = os.path.dirname(__file__)
@@ -18,49 +16,36 @@ if 'has_initialized' not in globals():
 else:
     print(f"🔄 Reloading Tools... (Detecting changes in {package_path})")
 
-# 1. 扫描子文件夹
-for entry in os.scandir(package_path):
-    if entry.is_dir() and not entry.name.startswith('_') and not entry.name.startswith('.'):
-        category_name = entry.name
-        category_path = entry.path
-        
-        # 2. 扫描子文件夹内的 .py 文件
-        for _, module_name, _ in pkgutil.iter_modules([category_path]):
-            if module_name.startswith('_'): 
-                continue
+# 1. 读取工具清单（ast 解析，按文件 mtime 缓存），不导入任何工具模块
+manifest = build_manifest(package_path, current_package_name)
+# 供 ToolManager 做增量热重载时比对的快照
+__manifest__ = manifest
+
+for full_import_name, record in manifest.items():
+    category_name, module_name = full_import_name.split('.')[-2:]
+    if record.get("error"):
+        print(f"    ❌ Error loading {category_name}/{module_name}: {record['error']}")
+        continue
 
-            try:
-                # 3. 构造完整包路径
-                full_import_name = f"{current_package_name}.{category_name}.{module_name}"
+    try:
+        # 2. 懒加载时注册占位对象，第一次执行时才导入真正的模块；LAZY_TOOLS=0 时立即导入（已导入的模块会被重载）
+        objs = load_tools(full_import_name, record, settings.LAZY_TOOLS)
 
-                # =========================================================
-                # 🔥 核心修复：强制级联重载 (Deep Reload)
-                # =========================================================
-                if full_import_name in sys.modules:
-                    # 如果模块已经在内存里，说明是热重载，必须强制 reload 子模块
-                    module = importlib.reload(sys.modules[full_import_name])
-                else:
-                    # 如果是第一次加载
-                    module = importlib.import_module(full_import_name)
-                # =========================================================
+        # 3. 注册
+        for name, obj in objs:
+            # 冲突检测（仅在非重载引发的覆盖时警告，减少误报）
+            if name in globals():
+                old_obj_value = globals()[name]
+                # 只有当模块路径真正不同时才报警
+                if getattr(old_obj_value, '__module__', '') != obj.__module__:
+                    print(f"  [⚠️ Warning] Conflict: {name} ({old_obj_value.__module__}) -> ({obj.__module__})")
 
-                # 4. 提取函数并注册
-                for name, obj in inspect.getmembers(module):
-                    if inspect.isfunction(obj) and obj.__module__ == full_import_name and not name.startswith('_'):
-                        
-                        # 冲突检测（仅在非重载引发的覆盖时警告，减少误报）
-                        if name in globals():
-                            old_obj_value = globals()[name]
-                            # 只有当模块路径真正不同时才报警
-                            if getattr(old_obj_value, '__module__', '') != obj.__module__:
-                                print(f"  [⚠️ Warning] Conflict: {name} ({old_obj_value.__module__}) -> ({obj.__module__})")
-                        
-                        # 挂载到当前命名空间
-                        globals()[name] = obj
-                        __all__.append(name)
+            # 挂载到当前命名空间
+            globals()[name] = obj
+            __all__.append(name)
 
-            except Exception as e:
-                print(f"    ❌ Error loading {category_name}/{module_name}: {e}")
+    except Exception as e:
+        print(f"    ❌ Error loading {category_name}/{module_name}: {e}")
 
 print(f"✨ Total tools loaded: {len(__all__)}")
 
@@ -70,7 +55,7 @@ global_names = list(globals().keys())
 
 # 定义需要保留的变量名（内置函数和模块）
 protected_names = [
-    'has_initialized', 'print', 'os', 'sys', 'pkgutil', 'importlib', 'inspect', 
+    'has_initialized', 'print', 'os',
     '__name__', '__doc__', '__package__', '__loader__', '__spec__', '__file__', '__cached__', '__builtins__',
     # 🔥 新增保护：防止清理逻辑删除自身使用的变量，避免 NameError
     'global_names', 'protected_names', 'var_name', 'obj', 'package_path', 'current_package_name'
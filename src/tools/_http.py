@@ -0,0 +1,33 @@
+import asyncio
+import weakref
+import httpx
+
+# 网络类 async 工具共享的 HTTP 客户端。文件名以下划线开头，不会被当作工具注册。
+# httpx.AsyncClient 绑定在创建它的事件循环上，所以按事件循环各保留一个（同一循环上的所有会话共享连接池）。
+_clients = weakref.WeakKeyDictionary()
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """返回当前事件循环上的共享客户端（必须在协程中调用）"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(30, connect=10),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            follow_redirects=True,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aclose():
+    """关闭当前事件循环上的共享客户端"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,236 @@
+import os
+import ast
+import sys
+import json
+import typing
+import hashlib
+import inspect
+import importlib
+
+# 工具清单：用 ast 解析工具源码得到名称、签名、docstring 与 @tool_meta 声明，无需导入模块。
+# 解析结果按文件 mtime / 大小缓存在 __pycache__/tool_manifest.json 中，只有改动过的文件才重新解析。
+# 文件名以下划线开头，不会被当作工具注册。
+
+MANIFEST_VERSION = 2
+
+# 注解只在这些名字上求值（内置类型 + typing），求值失败则保留原始字符串
+_ANNOTATION_NAMES = {name: getattr(typing, name) for name in typing.__all__}
+_ANNOTATION_NAMES.update({t.__name__: t for t in (str, int, float, bool, list, tuple, dict, set, bytes, type(None))})
+_ANNOTATION_NAMES["None"] = None
+
+
+class SourceDefault:
+    """无法用 literal_eval 求值的默认值（如 page_size=A4），以源码文本占位"""
+    def __init__(self, source):
+        self.source = source
+
+    def __repr__(self):
+        return self.source
+
+
+def _source(node, text):
+    return ast.get_source_segment(text, node) if node is not None else None
+
+
+def _parse_function(node, text):
+    args = node.args
+    params = []
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    for i, (arg, default) in enumerate(zip(positional, defaults)):
+        kind = "POSITIONAL_ONLY" if i < len(args.posonlyargs) else "POSITIONAL_OR_KEYWORD"
+        params.append({"name": arg.arg, "kind": kind, "annotation": _source(arg.annotation, text),
+                       "default": _source(default, text)})
+    if args.vararg:
+        params.append({"name": args.vararg.arg, "kind": "VAR_POSITIONAL",
+                       "annotation": _source(args.vararg.annotation, text), "default": None})
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        params.append({"name": arg.arg, "kind": "KEYWORD_ONLY", "annotation": _source(arg.annotation, text),
+                       "default": _source(default, text)})
+    if args.kwarg:
+        params.append({"name": args.kwarg.arg, "kind": "VAR_KEYWORD",
+                       "annotation": _source(args.kwarg.annotation, text), "default": None})
+
+    meta = {}
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Call) and getattr(decorator.func, 'id', getattr(decorator.func, 'attr', None)) == 'tool_meta':
+            for keyword in decorator.keywords:
+                try:
+                    meta[keyword.arg] = ast.literal_eval(keyword.value)
+                except ValueError:
+                    pass
+    return {
+        "name": node.name,
+        "doc": ast.get_docstring(node, clean=False),
+        "params": params,
+        "returns": _source(node.returns, text),
+        "async": isinstance(node, ast.AsyncFunctionDef),
+        "meta": meta,
+    }
+
+
+def parse_module(path):
+    """解析一个工具文件，返回 (内容哈希, 其中所有公开的顶层函数)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+    tree = ast.parse(text, filename=path)
+    return hashlib.sha1(data).hexdigest(), [
+        _parse_function(node, text) for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith('_')]
+
+
+def build_manifest(package_path, package_name):
+    """
+    扫描 <package>/<分类>/<工具>.py，返回 {模块全名: 文件条目}。
+    文件条目：{"path", "mtime", "size", "sha1", "tools": [...]}；解析失败的文件带 "error"。
+    """
+    cache_path = os.path.join(package_path, '__pycache__', 'tool_manifest.json')
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get("version") != MANIFEST_VERSION:
+            cached = {}
+    except (OSError, ValueError):
+        cached = {}
+    cached_files = cached.get("files", {})
+
+    files, parsed = {}, 0
+    for entry in sorted(os.scandir(package_path), key=lambda e: e.name):
+        if not entry.is_dir() or entry.name.startswith(('_', '.')):
+            continue
+        for file in sorted(os.scandir(entry.path), key=lambda e: e.name):
+            if not file.name.endswith('.py') or file.name.startswith('_'):
+                continue
+            module_name = f"{package_name}.{entry.name}.{file.name[:-3]}"
+            st = file.stat()
+            record = cached_files.get(module_name)
+            if record is None or record["mtime"] != st.st_mtime_ns or record["size"] != st.st_size:
+                record = {"path": file.path, "mtime": st.st_mtime_ns, "size": st.st_size}
+                try:
+                    record["sha1"], record["tools"] = parse_module(file.path)
+                except (SyntaxError, UnicodeDecodeError, OSError) as e:
+                    record["sha1"], record["tools"], record["error"] = None, [], str(e)
+                parsed += 1
+            files[module_name] = record
+
+    if parsed or set(files) != set(cached_files):
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": MANIFEST_VERSION, "files": files}, f, ensure_ascii=False)
+        except OSError:
+            pass
+    return files
+
+
+def _evaluate(source):
+    if source is None:
+        return inspect.Parameter.empty
+    try:
+        return eval(source, {"__builtins__": {}}, _ANNOTATION_NAMES)
+    except Exception:
+        return source
+
+
+def _default(source):
+    if source is None:
+        return inspect.Parameter.empty
+    try:
+        return ast.literal_eval(source)
+    except (ValueError, SyntaxError):
+        return SourceDefault(source)
+
+
+def build_signature(spec):
+    params = [inspect.Parameter(p["name"], getattr(inspect.Parameter, p["kind"]),
+                                default=_default(p["default"]), annotation=_evaluate(p["annotation"]))
+              for p in spec["params"]]
+    return inspect.Signature(params, return_annotation=_evaluate(spec["returns"]))
+
+
+class LazyTool:
+    """
+    工具的占位对象：名称、签名、docstring 与元数据来自清单，真正的模块在第一次调用（或 load）时才导入。
+    模块已导入但源文件在那之后被修改时，load 会 reload 该模块（reload 复用模块字典，模块级状态得以保留）。
+    """
+    def __init__(self, module_name, spec, mtime):
+        self.module_name = module_name
+        self.mtime = mtime
+        self.is_async = spec["async"]
+        self.__name__ = self.__qualname__ = spec["name"]
+        self.__module__ = module_name
+        self.__doc__ = spec["doc"]
+        self.__tool_meta__ = spec["meta"]
+        self.__signature__ = build_signature(spec)
+
+    @property
+    def loaded(self):
+        return self.module_name in sys.modules
+
+    def load(self):
+        """导入（必要时重载）所在模块，返回真实的函数对象"""
+        module = sys.modules.get(self.module_name)
+        if module is None:
+            module = importlib.import_module(self.module_name)
+        elif getattr(module, '__tool_mtime__', self.mtime) != self.mtime:
+            module = reload_module(module)
+        module.__tool_mtime__ = self.mtime
+        return getattr(module, self.__name__)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "lazy"
+        return f"<LazyTool {self.module_name}.{self.__name__} ({state})>"
+
+
+def resolve(func):
+    """LazyTool 解析为真实函数，普通函数原样返回"""
+    return func.load() if isinstance(func, LazyTool) else func
+
+
+def load_tools(module_name, record, lazy=True):
+    """按清单条目得到模块中的工具 [(名称, 对象)]：懒加载时为 LazyTool，否则导入（或重载）模块取真实函数"""
+    if lazy:
+        return [(spec["name"], LazyTool(module_name, spec, record["mtime"])) for spec in record["tools"]]
+    module = sys.modules.get(module_name)
+    module = reload_module(module) if module is not None else importlib.import_module(module_name)
+    module.__tool_mtime__ = record["mtime"]
+    return [(name, obj) for name, obj in inspect.getmembers(module)
+            if inspect.isfunction(obj) and obj.__module__ == module_name and not name.startswith('_')]
+
+
+_STATE_TYPES = (dict, list, set)
+
+
+def reload_module(module):
+    """
+    重新执行模块代码（importlib.reload 复用模块字典，代码没有重新赋值的变量原样保留）。
+    对于模块顶层初始化为空容器的状态（如 `_game_instances = {}`），恢复重载前的对象，
+    并把其中旧版类的实例迁移到新版类上，模块状态因此在热重载后保留；非空的常量容器取新代码中的值。
+    """
+    namespace = vars(module)
+    state = {k: v for k, v in namespace.items()
+             if not k.startswith('__') and isinstance(v, _STATE_TYPES) and v}
+    classes = {k: v for k, v in namespace.items() if isinstance(v, type) and v.__module__ == module.__name__}
+    module = importlib.reload(module)
+    namespace = vars(module)
+    for name, value in state.items():
+        new = namespace.get(name)
+        if new is not value and type(new) is type(value) and not new:
+            namespace[name] = value
+            for item in (value.values() if isinstance(value, dict) else value):
+                _migrate_instance(item, classes, namespace)
+    return module
+
+
+def _migrate_instance(obj, old_classes, namespace):
+    cls = type(obj)
+    new_cls = namespace.get(cls.__name__)
+    if old_classes.get(cls.__name__) is cls and isinstance(new_cls, type) and new_cls is not cls:
+        try:
+            obj.__class__ = new_cls
+        except TypeError:
+            pass
@@ -0,0 +1,32 @@
+import threading
+
+# 工具执行元数据与协作式取消。文件名以下划线开头，不会被当作工具注册。
+_local = threading.local()
+
+
+def tool_meta(**meta):
+    """
+    给工具函数附加执行元数据，ToolManager 通过 func.__tool_meta__ 读取：
+        timeout:   超时预算（秒），None 或 0 表示不限制
+        isolation: "thread"（默认）| "process"（每次调用一个子进程）| "subprocess"（常驻子进程，保留模块状态）
+        cache:     "pure" | "ttl"（配合 ttl=秒）；未声明即视为有副作用，结果永不缓存
+        files:     作为文件路径的参数名，缓存键中包含文件的 mtime 与大小
+    用法:
+        @tool_meta(timeout=60, isolation="subprocess")
+        def python_repl(code: str): ...
+    """
+    def wrap(func):
+        func.__tool_meta__ = {**getattr(func, '__tool_meta__', {}), **meta}
+        return func
+    return wrap
+
+
+def bind_cancel(event):
+    """由执行器在工作线程中调用，绑定本次调用的取消事件"""
+    _local.cancel = event
+
+
+def cancelled() -> bool:
+    """长时间运行的工具可以轮询此函数，超时后尽快退出"""
+    event = getattr(_local, 'cancel', None)
+    return bool(event is not None and event.is_set())
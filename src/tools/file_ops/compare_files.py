@@ -1,5 +1,6 @@
 import os
 import difflib
+from src.tools._meta import tool_meta
 
 def read_file_with_encoding(file_path: str) -> str:
     """尝试多种编码读取文件"""
@@ -24,6 +25,7 @@ def read_file_with_encoding(file_path: str) -> str:
         raise IOError(f"无法读取文件 '{file_path}'，所有编码尝试都失败: {str(e)}")
 
 
+@tool_meta(cache="pure", files=("file1", "file2"))
 def compare_files(file1: str, file2: str) -> str:
     """
     比较两个文件的内容差异
@@ -1,6 +1,8 @@
 import os
+from src.tools._meta import tool_meta
 
 
+@tool_meta(cache="pure", files=("file_path",))
 def count_file_lines(file_path: str) -> str:
     """
     统计文件的行数信息。
@@ -1,3 +1,7 @@
+from src.tools._meta import tool_meta
+
+
+@tool_meta(cache="pure", files=("file_name",))
 def read_file(file_name: str) -> str:
     """
     读取文件内容
@@ -1,6 +1,8 @@
 import os
 import re
+from src.tools._meta import tool_meta
 
+@tool_meta(cache="pure", files=("file_path",))
 def regex_search_in_file(file_path: str, pattern: str, flags: int = 0) -> str:
     """
     使用正则表达式在文件中搜索匹配的内容。
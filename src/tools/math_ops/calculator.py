@@ -1,6 +1,8 @@
 import math
+from src.tools._meta import tool_meta
 
 
+@tool_meta(cache="pure")
 def calculator(expression: str):
     """
     计算数学表达式，支持基本科学计算功能。
@@ -1,6 +1,10 @@
 import sympy
 from sympy import symbols, integrate, diff, limit, simplify, solve, Eq, sin, cos, tan, exp, log, pi, oo
+from src.tools._meta import tool_meta
 
+
+# 符号计算可能长时间占满 CPU，放到一次性子进程中执行，超时直接杀死
+@tool_meta(timeout=30, isolation="process", cache="pure")
 def sympy_tool(operation: str, expression: str, variable: str = 'x', lower: str = None, upper: str = None):
     """
     使用 SymPy 进行符号计算。
@@ -0,0 +1,21 @@
+from src.tools._meta import tool_meta
+
+
+@tool_meta(timeout=30)
+def search_history(query: str, limit: int = 5, session: str = "") -> str:
+    """
+    全文搜索过去的会话记录（包括已压缩的旧日志），按相关度排序，返回命中的片段及所在日志。
+    参数:
+        query: 字符串，搜索词（多个词用空格分隔，需同时出现；可用 OR 连接）
+        limit: 整数，最多返回的条数（默认 5）
+        session: 字符串，只搜索某个会话 id（默认搜索全部）
+    返回:
+        命中列表：时间、日志名、角色与片段（命中处用【】标出）
+    用法:
+        search_history(query=<关键词>, limit=5)
+    """
+    from src.history import get_history_index, format_hits
+    try:
+        return format_hits(get_history_index().search(query, limit, session or None))
+    except Exception as e:
+        return f"搜索历史记录出错: {e}"
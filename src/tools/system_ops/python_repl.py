@@ -1,7 +1,10 @@
 import io
 import contextlib
+from src.tools._meta import tool_meta
 
 
+# 常驻子进程中执行：变量在调用之间保留，死循环超时后会被杀死并重新拉起
+@tool_meta(timeout=60, isolation="subprocess")
 def python_repl(code: str):
     """
     调用Python解释器运行Python代码，并且返回结果到标准输出
@@ -1,6 +1,8 @@
 import subprocess
+from src.tools._meta import tool_meta, cancelled
 
 
+@tool_meta(timeout=300)
 def run_terminal_command(command: str):
     """
     在终端中运行命令 (支持实时输出反馈)
@@ -30,6 +32,11 @@ def run_terminal_command(command: str):
 
         # 实时逐行读取输出
         while True:
+            if cancelled():
+                # 超出执行器的超时预算：结束子进程，返回已有的输出
+                process.kill()
+                output_lines.append("\n[已超时，命令被终止]")
+                break
             line = process.stdout.readline()
             if line == '' and process.poll() is not None:
                 break
@@ -1,7 +1,9 @@
-import requests
+from src.tools._meta import tool_meta
+from src.tools._http import get_async_client
 
 
-def get_weather(location: str = "") -> str:
+@tool_meta(timeout=30, cache="ttl", ttl=1800)
+async def get_weather(location: str = "") -> str:
     """
     获取指定位置的天气预报，包含气温信息。
     参数:
@@ -18,7 +20,7 @@ def get_weather(location: str = "") -> str:
         else:
             url = f"{base_url}?format=j1"
 
-        response = requests.get(url, headers={"User-Agent": "curl"})
+        response = await get_async_client().get(url, headers={"User-Agent": "curl"}, timeout=20)
         response.raise_for_status()
         data = response.json()
 
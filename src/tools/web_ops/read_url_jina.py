@@ -1,7 +1,10 @@
-import requests
 import os
+from src.tools._meta import tool_meta
+from src.tools._http import get_async_client
 
-def read_url_jina(url: str) -> str:
+
+@tool_meta(timeout=60, cache="ttl", ttl=600)
+async def read_url_jina(url: str) -> str:
     """
     使用 r.jina.ai 读取URL并获取其内容（优先使用scrape_web_page）
     参数:
@@ -16,5 +19,5 @@ def read_url_jina(url: str) -> str:
     headers = {
         "Authorization": f"Bearer {os.getenv('JINA_API_TOKEN')}"
     }
-    response = requests.get(url, headers=headers)
+    response = await get_async_client().get(url, headers=headers, timeout=50)
     return response.text
@@ -1,8 +1,12 @@
-import requests
+import asyncio
 import html2text
 from bs4 import BeautifulSoup
+from src.tools._meta import tool_meta
+from src.tools._http import get_async_client
 
-def scrape_web_page(url: str) -> str:
+
+@tool_meta(timeout=30, cache="ttl", ttl=600)
+async def scrape_web_page(url: str) -> str:
     """
     爬取网页并将其转换为精简的 Markdown 格式，节省 Token。（优先选择这个因为jina的API有限额）
     参数:
@@ -13,37 +17,38 @@ def scrape_web_page(url: str) -> str:
         scrape_web_page(url=<网址>)
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = await get_async_client().get(url, timeout=10)
         response.raise_for_status()
+        # HTML 解析是 CPU 密集的，放到线程中执行，避免阻塞共享的事件循环
+        return await asyncio.to_thread(_to_markdown, response.text)
+
+    except Exception as e:
+        return f"Error scraping {url}: {str(e)}"
 
-        # 1. 使用 BeautifulSoup 初步清洗
-        soup = BeautifulSoup(response.text, 'html.parser')
 
-        # 移除完全无用的标签
-        for script in soup(["script", "style", "header", "footer", "nav", "svg", "noscript"]):
-            script.extract()
+def _to_markdown(html):
+    # 1. 使用 BeautifulSoup 初步清洗
+    soup = BeautifulSoup(html, 'html.parser')
 
-        # 2. 使用 html2text 转换为 Markdown
-        h = html2text.HTML2Text()
-        h.ignore_links = False  # 保留链接，有时候 Agent 需要继续点击
-        h.ignore_images = True  # 忽略图片，节省大量干扰
-        h.body_width = 0       # 不自动换行
+    # 移除完全无用的标签
+    for script in soup(["script", "style", "header", "footer", "nav", "svg", "noscript"]):
+        script.extract()
 
-        markdown_content = h.handle(str(soup))
+    # 2. 使用 html2text 转换为 Markdown
+    h = html2text.HTML2Text()
+    h.ignore_links = False  # 保留链接，有时候 Agent 需要继续点击
+    h.ignore_images = True  # 忽略图片，节省大量干扰
+    h.body_width = 0       # 不自动换行
 
-        # 3. 再次去重空行（压缩 Token）
-        lines = [line.strip() for line in markdown_content.splitlines() if line.strip()]
-        clean_content = '\n'.join(lines)
+    markdown_content = h.handle(str(soup))
 
-        # 4. 长度熔断（防止仍然过长）
-        max_len = 5000
-        if len(clean_content) > max_len:
-            return clean_content[:max_len] + f"\n\n...(网页过长，已截断。剩余 {len(clean_content) - max_len} 字符)"
+    # 3. 再次去重空行（压缩 Token）
+    lines = [line.strip() for line in markdown_content.splitlines() if line.strip()]
+    clean_content = '\n'.join(lines)
 
-        return clean_content
+    # 4. 长度熔断（防止仍然过长）
+    max_len = 5000
+    if len(clean_content) > max_len:
+        return clean_content[:max_len] + f"\n\n...(网页过长，已截断。剩余 {len(clean_content) - max_len} 字符)"
 
-    except Exception as e:
-        return f"Error scraping {url}: {str(e)}"
\ No newline at end of file
+    return clean_content
@@ -1,8 +1,10 @@
-import requests
 import os
+from src.tools._meta import tool_meta
+from src.tools._http import get_async_client
 
 
-def search_jina(keyword):
+@tool_meta(timeout=60, cache="ttl", ttl=600)
+async def search_jina(keyword):
     """
     使用 s.jina.ai 搜索网络并获取SERP（优先使用scrape_web_page）
     参数:
@@ -17,5 +19,5 @@ def search_jina(keyword):
         "Authorization": f"Bearer {os.getenv('JINA_API_TOKEN')}",
         "X-Respond-With": "no-content"
     }
-    response = requests.get(url, headers=headers)
+    response = await get_async_client().get(url, headers=headers, timeout=50)
     return response.status_code, response.content
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from collections import deque, defaultdict
+from src.states import Span
+from src.config import settings
+
+
+# 当前 span（协程 / asyncio 任务各自独立）。跨 yield 的 span（如一次流式模型调用）不要放进这里，
+# 而是用 start_span / end_span 显式传递 parent。
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id():
+    return os.urandom(8).hex()
+
+
+class Tracer:
+    """
+    结构化追踪：span 结束时依次交给各个导出器（exporter.export(span)）。
+    span 层级：step -> compression / prompt_build / model_call / parse / tools -> tool，另有 log_write。
+    """
+    def __init__(self, exporters=(), enabled=True):
+        self.exporters = list(exporters)
+        self.enabled = enabled
+
+    def start_span(self, name, parent=None, **attributes) -> Span:
+        parent = parent if parent is not None else _current.get()
+        return Span(name, trace_id=parent.trace_id if parent else _new_id(), span_id=_new_id(),
+                    parent_id=parent.span_id if parent else None, start=time.time(),
+                    attributes=attributes, perf_start=time.perf_counter())
+
+    def end_span(self, span: Span, **attributes):
+        if span.duration_ms is not None:
+            return
+        span.duration_ms = (time.perf_counter() - span.perf_start) * 1000
+        span.attributes.update(attributes)
+        if not self.enabled:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"[Tracing] {type(exporter).__name__} failed: {e}")
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        """with tracer.span("tool", tool=name) as span: ...  期间新建的 span 以它为父"""
+        span = self.start_span(name, parent, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            _current.reset(token)
+            self.end_span(span)
+
+    def find(self, kind):
+        return next((e for e in self.exporters if isinstance(e, kind)), None)
+
+    @property
+    def buffer(self):
+        return self.find(RingBuffer)
+
+    @property
+    def metrics(self):
+        return self.find(PrometheusMetrics)
+
+    def close(self):
+        for exporter in self.exporters:
+            close = getattr(exporter, 'close', None)
+            if close:
+                close()
+
+
+class JsonlExporter:
+    """每个 span 一行 JSON，追加写入磁盘"""
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RingBuffer:
+    """进程内保留最近 capacity 个 span，供界面查询（main.py 的 trace 命令、app.py 的 /trace）"""
+    def __init__(self, capacity=2000):
+        self.spans = deque(maxlen=capacity)
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def query(self, name=None, session=None, trace_id=None, limit=50):
+        """按条件筛选，最新的在前"""
+        result = []
+        for span in reversed(self.spans):
+            if name and span.name != name:
+                continue
+            if trace_id and span.trace_id != trace_id:
+                continue
+            if session and span.attributes.get('session') != session:
+                continue
+            result.append(span)
+            if len(result) >= limit:
+                break
+        return result
+
+    def summary(self, session=None):
+        """按 span 名称汇总：次数、总耗时、p50 / p99（毫秒）"""
+        durations = defaultdict(list)
+        traces = {s.trace_id for s in self.spans if s.name == "step" and s.attributes.get('session') == session} \
+            if session else None
+        for span in self.spans:
+            if traces is None or span.trace_id in traces:
+                durations[span.name].append(span.duration_ms)
+        summary = {}
+        for name, values in durations.items():
+            values.sort()
+            summary[name] = {"count": len(values), "total_ms": sum(values),
+                             "p50_ms": values[len(values) // 2],
+                             "p99_ms": values[min(len(values) - 1, int(len(values) * 0.99))]}
+        return summary
+
+    def format_summary(self, session=None):
+        """Markdown 表格：各阶段耗时，以及最近一次模型调用的首 token 时间与生成速度"""
+        summary = self.summary(session)
+        if not summary:
+            return "No spans recorded yet."
+        lines = ["| span | count | total ms | p50 ms | p99 ms |", "|---|---:|---:|---:|---:|"]
+        for name, s in sorted(summary.items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"| {name} | {s['count']} | {s['total_ms']:.1f} | {s['p50_ms']:.2f} | {s['p99_ms']:.2f} |")
+        calls = [s for s in self.query("model_call", limit=len(self.spans))
+                 if session is None or s.attributes.get('session') == session]
+        if calls:
+            last = calls[0].attributes
+            lines.append(f"\nLast model call: TTFT {last.get('ttft_ms', 0):.0f} ms, "
+                         f"{last.get('tokens_per_s', 0):.1f} tokens/s, prompt {last.get('prompt_tokens', 0)} "
+                         f"(cached {last.get('cached_tokens', 0)}), completion {last.get('completion_tokens', 0)}")
+        return "\n".join(lines)
+
+
+class PrometheusMetrics:
+    """把 span 聚合为 Prometheus 文本格式的指标（app.py 在 METRICS_ENDPOINT 开启时暴露 /metrics）"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, prefix="miniagent"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}                       # span 名称 -> [各桶计数, 总和, 次数]
+        self._tokens = defaultdict(int)             # prompt / completion / cached
+        self._tool_calls = defaultdict(int)         # (工具, 状态)
+        self._errors = defaultdict(int)             # span 名称
+
+    def export(self, span):
+        seconds = span.duration_ms / 1000
+        with self._lock:
+            buckets, _, _ = histogram = self._histograms.setdefault(span.name, [[0] * len(self.BUCKETS), 0.0, 0])
+            index = bisect_left(self.BUCKETS, seconds)
+            if index < len(buckets):
+                buckets[index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            if span.status != "ok":
+                self._errors[span.name] += 1
+            if span.name == "model_call":
+                for kind in ("prompt", "completion", "cached"):
+                    self._tokens[kind] += span.attributes.get(f"{kind}_tokens") or 0
+            elif span.name == "tool":
+                self._tool_calls[(span.attributes.get("tool"), span.attributes.get("status", span.status))] += 1
+
+    @staticmethod
+    def _label(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self):
+        p = self.prefix
+        with self._lock:
+            lines = [f"# HELP {p}_span_duration_seconds Duration of traced agent operations.",
+                     f"# TYPE {p}_span_duration_seconds histogram"]
+            for name, (buckets, total, count) in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(self.BUCKETS, buckets):
+                    cumulative += n
+                    lines.append(f'{p}_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{p}_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+                lines.append(f'{p}_span_duration_seconds_sum{{span="{name}"}} {total:.6f}')
+                lines.append(f'{p}_span_duration_seconds_count{{span="{name}"}} {count}')
+            lines += [f"# HELP {p}_span_errors_total Spans that ended with an error.",
+                      f"# TYPE {p}_span_errors_total counter"]
+            lines += [f'{p}_span_errors_total{{span="{name}"}} {n}' for name, n in sorted(self._errors.items())]
+            lines += [f"# HELP {p}_tokens_total Model tokens by kind.", f"# TYPE {p}_tokens_total counter"]
+            lines += [f'{p}_tokens_total{{kind="{kind}"}} {n}' for kind, n in sorted(self._tokens.items())]
+            lines += [f"# HELP {p}_tool_calls_total Tool calls by tool and status.",
+                      f"# TYPE {p}_tool_calls_total counter"]
+            lines += [f'{p}_tool_calls_total{{tool="{self._label(tool)}",status="{self._label(status)}"}} {n}'
+                      for (tool, status), n in sorted(self._tool_calls.items(), key=str)]
+        return "\n".join(lines) + "\n"
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """进程内共享的 Tracer，导出器按配置创建：环形缓冲与指标聚合总是开启，TRACE_FILE 不为空时另写 JSONL"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            exporters = [RingBuffer(settings.TRACE_BUFFER), PrometheusMetrics()]
+            if settings.TRACE_FILE:
+                exporters.append(JsonlExporter(settings.TRACE_FILE))
+            _tracer = Tracer(exporters, settings.TRACING)
+        return _tracer
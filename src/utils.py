@@ -1,18 +1,31 @@
 import os
 import re
+import time
+import asyncio
 import json
-import importlib
+import sys
 import inspect
-from src.states import AgentState
+import json_repair
+from src.states import AgentState, StreamEvent, ToolCall, ToolResult, ReloadDiff
+from src.config import settings
+from src.tokens import get_token_counter
+from src.compaction import Compactor
+from src.validation import ArgsValidator
+from src.executor import ToolExecutor
+from src.cache import ResultCache
+from src.tracing import get_tracer
+from src.logwriter import get_log_writer
+from src.logstore import get_log_store
+from src.history import get_history_index
 import datetime
+from collections import deque
 from src import tools
+from src.tools._manifest import LazyTool, resolve, build_manifest, load_tools
 
 
 class Parser:
     @classmethod
     def parse_response(cls, text: str):
-        state = AgentState()
-
         text = text.replace('\r\n', '\n')
 
         # 一次性提取所有 "@@@ Title" -> "Content" 的键值对
@@ -20,15 +33,50 @@ class Parser:
             r'(?m)^@@@\s*(?P<header>.+?)\s*$(?P<content>[\s\S]*?)(?=^@@@\s|\Z)'
         )
 
-        sections = {
-            m.group('header').strip().lower(): m.group('content').strip()
+        items = [
+            (m.group('header').strip().lower(), m.group('content').strip())
             for m in pattern.finditer(text)
-        }
+        ]
+        return cls.parse_sections(dict(items), cls.pair_actions(items))
+
+    @staticmethod
+    def pair_actions(items):
+        """按出现顺序把 (段落名, 内容) 序列中的 Action/Args 配对"""
+        calls = []
+        for header, content in items:
+            if header == 'action':
+                calls.append([content, None])
+            elif header == 'args' and calls and calls[-1][1] is None:
+                calls[-1][1] = content
+        return calls
+
+    @classmethod
+    def parse_sections(cls, sections: dict, calls=None, signatures=None):
+        """
+        根据 {段落名(小写): 内容} 构造 AgentState；calls 为按顺序配对的 [Action, Args] 列表，
+        signatures 为 工具名 -> inspect.Signature 的查询函数，用于修复格式有误的 Args。
+        """
+        state = AgentState()
+        lookup = signatures or (lambda name: None)
 
         state.plan = sections.get('plan')
         state.thought = sections.get('thought')
         state.final_answer = sections.get('answer')
 
+        # 并行模式：@@@ Parallel 标记下的多组 Action/Args
+        if 'parallel' in sections and calls and len(calls) > 1:
+            for i, (action_raw, args_raw) in enumerate(calls, 1):
+                name = action_raw.split('\n')[0].strip()
+                args, error, repaired = cls.parse_args(name, args_raw, lookup(name))
+                if error:
+                    state.error = f"{error} (Action {i}: {name})"
+                    return state
+                state.repaired += repaired
+                state.actions.append(ToolCall(name, args))
+            state.action_name = state.actions[0].name
+            state.action_args = state.actions[0].args
+            return state
+
         action_raw = sections.get('action')
         if action_raw:
             state.action_name = action_raw.split('\n')[0].strip()
@@ -41,40 +89,342 @@ class Parser:
 
         args_raw = sections.get('args')
         if args_raw and state.action_name:
-            content = args_raw.strip()
-            if state.action_name == "python_repl":
-                match = re.search(r'~~~\s*(?:python)?\s*(.*?)~~~', content, re.DOTALL)
-                if match:
-                    state.action_args = {"code": match.group(1).strip()}
-                else:
-                    clean_code = content.strip()
-                    
-                    if clean_code.startswith("~~~"):
-                        clean_code = clean_code[3:]
-                    if clean_code.endswith("~~~"):
-                        clean_code = clean_code[:-3]
-                    
-                    clean_code = clean_code.strip()
-
-                    if clean_code.lower().startswith("python"):
-                        clean_code = clean_code[6:].strip()
-                    state.action_args = {'code': clean_code}
-            else:
-                if not content:
-                    state.action_args = {}
-                else:
-                    try:
-                        state.action_args = json.loads(content)
-                    except Exception as e:
-                        state.error = f"Args Parse Failed: {str(e)}"
-                    
+            state.action_args, state.error, repaired = cls.parse_args(
+                state.action_name, args_raw, lookup(state.action_name))
+            state.repaired = int(repaired)
+
+        is_command = state.is_refresh or state.is_quit or state.is_clear
+        if state.has_action and not is_command and not state.error:
+            state.actions.append(ToolCall(state.action_name, state.action_args or {}))
         return state
 
+    @classmethod
+    def parse_args(cls, action_name: str, args_raw, signature=None):
+        """解析单个 Args 段，返回 (参数字典, 错误信息, 是否经过本地修复)"""
+        content = (args_raw or "").strip()
+        if action_name == "python_repl":
+            match = re.search(r'~~~\s*(?:python)?\s*(.*?)~~~', content, re.DOTALL)
+            if match:
+                return {"code": match.group(1).strip()}, None, False
+
+            clean_code = content.strip()
+
+            if clean_code.startswith("~~~"):
+                clean_code = clean_code[3:]
+            if clean_code.endswith("~~~"):
+                clean_code = clean_code[:-3]
+
+            clean_code = clean_code.strip()
+
+            if clean_code.lower().startswith("python"):
+                clean_code = clean_code[6:].strip()
+            return {'code': clean_code}, None, False
+
+        return cls.parse_json_args(content, signature)
+
+    @classmethod
+    def parse_json_args(cls, content: str, signature=None):
+        """
+        JSON 参数的容错解析，依次尝试：
+          1. 严格 json.loads
+          2. json_repair 修复尾逗号、单引号、未加引号的键、被截断的括号等
+          3. 按工具签名强制转换：字面量（加引号的字符串、数字、布尔值）填入唯一参数，数组按位置映射到参数
+        修复结果必须与签名吻合（没有未知参数、必填参数齐全），否则视为有歧义，交回模型重试。
+        未加引号的纯文本不做猜测（"hello world" 不应成为 delete_file 的 path），同样交回模型重试。
+        """
+        content = (content or "").strip()
+        if not content:
+            return {}, None, False
+        try:
+            value = json.loads(content)
+            if isinstance(value, dict):
+                return value, None, False
+            error = f"Args must be a JSON object, got {type(value).__name__}"
+        except Exception as e:
+            error = str(e)
+            scanner = ArgsScanner()
+            if scanner.feed(content) == -1 and scanner.in_string:
+                # 截断在字符串中间：补全后的值未必是模型想写的内容
+                return None, f"Args Parse Failed: {error}", False
+            try:
+                value = json_repair.loads(content)
+            except Exception:
+                value = None
+            if value == "" or (value == {} and content[0] != '{'):
+                # json_repair 对无法识别的输入（纯文本）返回空值：填进哪个参数都只是猜测
+                return None, f"Args Parse Failed: {error}", False
+
+        args = cls.coerce_args(value, signature)
+        if args is None:
+            return None, f"Args Parse Failed: {error}", False
+        return args, None, True
+
+    @staticmethod
+    def coerce_args(value, signature=None):
+        """把修复后的值对齐到工具签名，得到参数字典；无法确定时返回 None"""
+        if signature is None:
+            return value if isinstance(value, dict) and value else None
+        params = [p for p in signature.parameters.values()
+                  if p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)]
+        accepts_extra = any(p.kind == p.VAR_KEYWORD for p in signature.parameters.values())
+        required = [p.name for p in params if p.default is p.empty]
+
+        if isinstance(value, list):
+            origin = getattr(params[0].annotation, '__origin__', params[0].annotation) if len(params) == 1 else None
+            if origin in (list, tuple):
+                value = {params[0].name: value}
+            elif len(required) <= len(value) <= len(params) and not any(isinstance(v, (dict, list)) for v in value):
+                # 数组按位置映射到参数
+                value = {p.name: v for p, v in zip(params, value)}
+        elif value is not None and not isinstance(value, dict):
+            # 字面量只能填入唯一的参数（或唯一的必填参数），且类型不能冲突
+            target = required if len(required) == 1 else [p.name for p in params] if len(params) == 1 else []
+            if len(target) == 1:
+                annotation = signature.parameters[target[0]].annotation
+                if not isinstance(annotation, type) or annotation is inspect.Parameter.empty or isinstance(value, annotation):
+                    value = {target[0]: value}
+
+        if not isinstance(value, dict):
+            return None
+        names = {p.name for p in params}
+        if not accepts_extra and not set(value) <= names:
+            return None
+        if any(name not in value for name in required):
+            return None
+        return value
+
+
+class ArgsScanner:
+    """
+    增量判断 Args 段在语法上是否已经完整：JSON 括号配平，或 ~~~ 代码块闭合。
+    无法识别的格式永远不会判定为完整，交由下一个 @@@ 标题或流结束来收尾。
+    """
+    def __init__(self):
+        self.mode = None        # 'json' | 'fence' | 'unknown'
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.fences = 0
+        self.tildes = 0
+
+    def feed(self, text: str) -> int:
+        """返回 Args 在 text 中结束的位置（不含其后内容），尚未结束返回 -1"""
+        for i, ch in enumerate(text):
+            if self.mode is None:
+                if ch.isspace():
+                    continue
+                self.mode = 'json' if ch in '{[' else 'fence' if ch == '~' else 'unknown'
+            if self.mode == 'json':
+                if self.in_string:
+                    if self.escape:
+                        self.escape = False
+                    elif ch == '\\':
+                        self.escape = True
+                    elif ch == '"':
+                        self.in_string = False
+                elif ch == '"':
+                    self.in_string = True
+                elif ch in '{[':
+                    self.depth += 1
+                elif ch in '}]':
+                    self.depth -= 1
+                    if self.depth == 0:
+                        return i + 1
+            elif self.mode == 'fence':
+                self.tildes = self.tildes + 1 if ch == '~' else 0
+                if self.tildes == 3:
+                    self.fences += 1
+                    if self.fences == 2:
+                        return i + 1
+            else:
+                return -1
+        return -1
+
+
+class StreamParser:
+    """
+    增量式 @@@ 段落解析器：逐块喂入流式输出，产生 start / delta / complete 事件。
+    `@@@ Args` 段结束（语法上完整、出现下一个标题或流结束）时置位 action_ready 并产生 ready 事件，
+    之后的内容（模型编造的 Observation 等）不再计入 text。
+    parallel=True 且出现 `@@@ Parallel` 标记时，连续的多组 Action/Args 会一起收集，
+    直到出现其它标题或流结束才置位 action_ready。
+    每个字符只被扫描常数次，整段回复的解析代价为 O(n)。
+    """
+    HEADER_PATTERN = re.compile(r'^@@@\s+(?P<header>\S.*?)\s*$')
+
+    def __init__(self, parallel=False):
+        self.parallel = parallel
+        self.sections = {}          # 段落名 -> 内容片段列表（同名段落以最后一次出现为准）
+        self.current = None         # 当前段落名
+        self.action_ready = False
+        self.finished = False
+        self.overflow_chars = 0     # action_ready 之后被丢弃的字符数
+        self._parts = []            # 已接受的原始文本
+        self._pending = ""          # 可能是标题的未完成行
+        self._args_scanner = None
+        self._carry_cr = False
+        self._events = []
+        self._completed = []        # 按顺序结束的 (段落名, 内容)
+        self.raw_tool_calls = {}    # 原生 function calling 的流式片段 index -> {id, name, arguments}（由协议层填入）
+
+    @property
+    def text(self):
+        return ''.join(self._parts)
+
+    def feed(self, chunk: str):
+        """喂入一段文本，返回本次产生的事件列表"""
+        if self.action_ready or self.finished:
+            self.overflow_chars += len(chunk)
+            return []
+
+        if self._carry_cr:
+            chunk = '\r' + chunk
+            self._carry_cr = False
+        if chunk.endswith('\r'):
+            chunk = chunk[:-1]
+            self._carry_cr = True
+        chunk = chunk.replace('\r\n', '\n')
+
+        data = self._pending + chunk
+        self._pending = ""
+        events = []
+        pos = 0
+        line_start = not self._parts or self._parts[-1].endswith('\n')
+
+        while pos < len(data):
+            end = data.find('\n', pos)
+            line = data[pos:] if end == -1 else data[pos:end + 1]
+
+            if line_start and self._maybe_header(line):
+                if end == -1:
+                    # 标题行尚未结束，等待后续数据
+                    self._pending = line
+                    break
+                match = self.HEADER_PATTERN.match(line.rstrip('\n'))
+                if match:
+                    header = match.group('header').strip().lower()
+                    self._close_section(events)
+                    if header not in ('action', 'args'):
+                        self._end_batch(events)
+                    if self.action_ready:
+                        self.overflow_chars += len(data) - pos
+                        break
+                    self._open_section(header, line, events)
+                    pos = end + 1
+                    continue
+
+            used = self._append_delta(line, events)
+            if self.action_ready:
+                self.overflow_chars += len(data) - pos - used
+                break
+            pos += used
+            line_start = data[pos - 1] == '\n'
+
+        self._events.extend(events)
+        return events
+
+    def close(self):
+        """流结束：冲刷残留内容并结束最后一个段落"""
+        if self.finished:
+            return []
+        events = []
+        if not self.action_ready:
+            pending = self._pending + ('\r' if self._carry_cr else '')
+            self._pending = ""
+            self._carry_cr = False
+            match = self.HEADER_PATTERN.match(pending)
+            if match:
+                self._close_section(events)
+                if not self.action_ready:
+                    self._open_section(match.group('header').strip().lower(), pending, events)
+            elif pending:
+                self._append_delta(pending, events)
+            if not self.action_ready:
+                self._close_section(events)
+                self._end_batch(events)
+        self.finished = True
+        self._events.extend(events)
+        return events
+
+    def drain(self):
+        """取出自上次 drain 以来产生的全部事件"""
+        events, self._events = self._events, []
+        return events
+
+    def get_section(self, name):
+        parts = self.sections.get(name)
+        return ''.join(parts).strip() if parts is not None else None
+
+    def state(self, signatures=None):
+        sections = {name: self.get_section(name) for name in self.sections}
+        return Parser.parse_sections(sections, Parser.pair_actions(self._completed), signatures)
+
+    @property
+    def in_batch(self):
+        return self.parallel and 'parallel' in self.sections
+
+    @staticmethod
+    def _maybe_header(line):
+        head = line.rstrip('\n')
+        if len(head) < 3:
+            return '@@@'.startswith(head)
+        return head.startswith('@@@') and (len(head) == 3 or head[3].isspace())
+
+    def _open_section(self, header, raw, events):
+        self.current = header
+        self._parts.append(raw)
+        self.sections[header] = []
+        self._args_scanner = ArgsScanner() if header == 'args' else None
+        events.append(StreamEvent('start', header, raw))
+
+    def _close_section(self, events):
+        if self.current is None:
+            return
+        header, self.current = self.current, None
+        self._args_scanner = None
+        content = self.get_section(header)
+        self._completed.append((header, content))
+        events.append(StreamEvent('complete', header, content))
+        if header == 'args' and 'action' in self.sections and not self.in_batch:
+            self.action_ready = True
+            events.append(StreamEvent('ready', header))
+
+    def _end_batch(self, events):
+        """并行模式下，Action/Args 序列之后出现其它标题（或流结束）即视为整批完成"""
+        if self.in_batch and not self.action_ready and 'args' in self.sections:
+            self.action_ready = True
+            events.append(StreamEvent('ready', 'args'))
+
+    def _append_delta(self, text, events):
+        """追加正文，返回实际接受的字符数（Args 完整后其余部分被丢弃）"""
+        complete = False
+        if self._args_scanner is not None and 'action' in self.sections:
+            end = self._args_scanner.feed(text)
+            if end != -1:
+                text, complete = text[:end], True
+
+        self._parts.append(text)
+        if self.current is not None:
+            self.sections[self.current].append(text)
+        if events and events[-1].kind == 'delta' and events[-1].header == self.current:
+            events[-1].text += text
+        else:
+            events.append(StreamEvent('delta', self.current, text))
+
+        if complete:
+            self._close_section(events)
+        return len(text)
+
 
 class Context:
-    def __init__(self, config):
+    def __init__(self, config, summarizer=None):
         self.config = config
+        self.counter = get_token_counter(config.TOKENIZER)
         self.context = {"messages": []}
+        self.token_counts = []      # 与 messages 一一对应的 token 数缓存
+        self.total_tokens = 0
+        self.est_num_token = 0
+        self.compactor = Compactor(config, summarizer)
     
     def __len__(self):
         return len(self.context["messages"])
@@ -83,57 +433,231 @@ class Context:
         return self.context["messages"]
     
     def reset(self, system_prompt):
-        self.context = {"messages": [{"role": "system", "content": system_prompt}]}
+        self.context = {"messages": []}
+        self.token_counts = []
+        self.total_tokens = 0
+        self.append("system", system_prompt)
     
     def refresh(self, system_prompt):
         self.append("system", system_prompt)
     
-    def append(self, role, content):
-        self.context["messages"].append(dict(role=role, content=content))
+    def append(self, role, content, **extra):
+        message = dict(role=role, content=content, **extra)
+        count = self.counter.count_message(message)
+        self.context["messages"].append(message)
+        self.token_counts.append(count)
+        self.total_tokens += count
+        self.est_num_token = self.total_tokens
+
+    def set_entries(self, entries):
+        """用 (message, token 数) 列表替换当前历史，总数由缓存值求和，无需重新分词"""
+        self.context["messages"] = [m for m, _ in entries]
+        self.token_counts = [c for _, c in entries]
+        self.total_tokens = sum(self.token_counts)
+        self.est_num_token = self.total_tokens
+
+    def replace_content(self, index, content):
+        """原地替换某条消息的内容，并增量更新 token 总数"""
+        message = self.context["messages"][index]
+        message['content'] = content
+        count = self.counter.count_message(message)
+        self.total_tokens += count - self.token_counts[index]
+        self.token_counts[index] = count
+        self.est_num_token = self.total_tokens
+
+    def replace_span(self, start, end, message):
+        """把 [start, end) 区间的消息替换为一条消息"""
+        count = self.counter.count_message(message)
+        self.total_tokens += count - sum(self.token_counts[start:end])
+        self.context["messages"][start:end] = [message]
+        self.token_counts[start:end] = [count]
+        self.est_num_token = self.total_tokens
     
     def compress(self):
-        total_len = sum(len(m['content']) for m in self.context["messages"]) // 3
-        self.est_num_token = total_len
-        if total_len < self.config.TOKEN_LIMIT:
+        if self.total_tokens < self.config.TOKEN_LIMIT:
             return False
-
-        sys_msg = self.context["messages"][0]
-        first_round = []
-        if len(self.context["messages"]) >= 3:
-            first_round = self.context["messages"][1:3]  # User + Agent
-        retain_count = self.config.RETAIN_RECENT * 2
-        recent = self.context["messages"][-retain_count:]
-
-        if len(self.context["messages"]) > 3 + retain_count:
-            omission_hint = {'role': 'system',
-                             'content': '[System Note: Middle conversation history compressed/omitted to save memory]'}
-            self.context["messages"] = [sys_msg] + first_round + [omission_hint] + recent
-        else:
-            self.context["messages"] = [sys_msg] + recent
-        return True
+        return self.compactor.compact(self)
                         
 
 class ToolManager:
-    def __init__(self):
+    def __init__(self, max_workers=None):
         self.tools = {}
+        self.max_workers = max_workers or settings.MAX_PARALLEL_TOOLS
+        self.executor = ToolExecutor(self.max_workers, settings.TOOL_TIMEOUT, max_abandoned=settings.TOOL_MAX_ABANDONED)
+        self.cache = ResultCache(settings.TOOL_CACHE_BYTES, settings.TOOL_CACHE_DIR)
+        self.tracer = get_tracer()
+        # 注册表版本号：只在 refresh_list / reload 时单调递增，渲染结果按版本缓存
+        self.version = 0
+        # 注册表快照：模块 -> {mtime, sha1}，reload 据此只处理新增 / 修改 / 删除的工具文件
+        self.snapshot = {}
+        # 最近的重载记录：多个会话共享同一个注册表，落后的会话据此得知错过了哪些变化
+        self.changes = deque(maxlen=64)
+        self._render_cache = {}
+        self.validators = {}
+        # coerced: 调用前被安全转换过类型的调用数；rejected: 因参数错误未执行的调用数
+        self.validation_stats = {"calls": 0, "coerced": 0, "rejected": 0}
         self.refresh_list()
 
     def refresh_list(self):
         """只更新工具列表，不重载模块文件"""
         self.tools = {
-            name: {'func': obj, 'desc': (obj.__doc__ or "No description").strip()}
-            for name, obj in inspect.getmembers(tools) if inspect.isfunction(obj)
+            name: self._entry(obj)
+            for name, obj in inspect.getmembers(tools) if inspect.isfunction(obj) or isinstance(obj, LazyTool)
         }
+        self.snapshot = {module: {'mtime': record['mtime'], 'sha1': record.get('sha1')}
+                         for module, record in getattr(tools, '__manifest__', {}).items() if not record.get('error')}
+        # 参数校验器随注册表版本一起重新编译
+        self.validators = {name: ArgsValidator.compile(name, entry['func']) for name, entry in self.tools.items()}
+        self._bump()
+
+    @staticmethod
+    def _entry(obj):
+        return {'func': obj, 'desc': (obj.__doc__ or "No description").strip(), 'module': obj.__module__}
+
+    def _bump(self):
+        self.version += 1
+        self._render_cache = {}
+
+    def memoize(self, key, builder):
+        """按注册表版本缓存渲染结果（版本变化时缓存已在 refresh_list 中清空）"""
+        if key not in self._render_cache:
+            self._render_cache[key] = builder()
+        return self._render_cache[key]
     
-    def reload(self):
-        """强制从磁盘重载代码"""
-        importlib.reload(tools)
-        self.refresh_list()
+    def reload(self) -> ReloadDiff:
+        """
+        增量热重载：按 mtime 与内容哈希和注册表快照比对，只重载新增 / 修改 / 删除的工具文件。
+        已导入的模块立即重载（模块级状态保留，见 reload_module），未导入的模块换成新的 LazyTool；
+        加载失败的模块保留旧版本，错误记在返回的 ReloadDiff 中。没有变化时注册表版本不变。
+        """
+        diff = ReloadDiff()
+        # 写时复制：在副本上修改，最后整体替换，共享注册表的其它会话不会看到改到一半的状态
+        registry, validators = dict(self.tools), dict(self.validators)
+        manifest = build_manifest(tools.package_path, tools.__name__)
+        for module_name, record in manifest.items():
+            previous = self.snapshot.get(module_name)
+            if record.get('error'):
+                diff.errors[module_name] = record['error']
+                continue
+            if previous is not None and previous['sha1'] == record['sha1']:
+                if previous['mtime'] != record['mtime']:
+                    self._touch(module_name, record['mtime'])
+                continue
+            try:
+                lazy = settings.LAZY_TOOLS and module_name not in sys.modules
+                objs = load_tools(module_name, record, lazy)
+            except Exception as e:
+                diff.errors[module_name] = f"{type(e).__name__}: {e}"
+                continue
+            self._replace(registry, validators, module_name, dict(objs), diff)
+            self.snapshot[module_name] = {'mtime': record['mtime'], 'sha1': record['sha1']}
+
+        for module_name in set(self.snapshot) - set(manifest):
+            self._replace(registry, validators, module_name, {}, diff)
+            del self.snapshot[module_name]
+
+        if diff.modules:
+            tools.__manifest__ = manifest
+            self.tools, self.validators = registry, validators
+            self._bump()
+        diff.version = self.version
+        if diff.modules:
+            self.changes.append(diff)
+        return diff
+
+    def changes_since(self, version) -> ReloadDiff:
+        """合并 version 之后的所有重载记录"""
+        diff = ReloadDiff.merge(d for d in self.changes if d.version > version)
+        diff.version = self.version
+        return diff
+
+    def _touch(self, module_name, mtime):
+        """文件只是 mtime 变化、内容未变：同步 mtime，避免下次调用时无谓的重载"""
+        module = sys.modules.get(module_name)
+        if module is not None and hasattr(module, '__tool_mtime__'):
+            module.__tool_mtime__ = mtime
+        for entry in self.tools.values():
+            if entry['module'] == module_name and isinstance(entry['func'], LazyTool):
+                entry['func'].mtime = mtime
+        self.snapshot[module_name]['mtime'] = mtime
+
+    def _replace(self, registry, validators, module_name, objs, diff):
+        """用模块的新工具替换注册表中该模块的旧工具，同步 src.tools 的命名空间"""
+        old = {name for name, entry in registry.items() if entry['module'] == module_name}
+        for name in sorted(old - set(objs)):
+            del registry[name]
+            validators.pop(name, None)
+            if name in tools.__all__:
+                delattr(tools, name)
+                tools.__all__.remove(name)
+            diff.removed.append(name)
+        for name, obj in objs.items():
+            current = registry.get(name)
+            if current is not None and current['module'] != module_name:
+                print(f"  [⚠️ Warning] Conflict: {name} ({current['module']}) -> ({module_name})")
+            registry[name] = self._entry(obj)
+            validators[name] = ArgsValidator.compile(name, obj)
+            if name not in tools.__all__:
+                tools.__all__.append(name)
+            setattr(tools, name, obj)
+            (diff.changed if name in old else diff.added).append(name)
+        diff.modules.append(module_name)
+
+    def get_signature(self, name):
+        """工具的 inspect.Signature（按注册表版本缓存），未知工具或无法解析时返回 None"""
+        def build():
+            try:
+                return inspect.signature(self.tools[name]['func'])
+            except (KeyError, TypeError, ValueError):
+                return None
+        return self.memoize(('signature', name), build)
 
     def get_descriptions(self) -> str:
-        return "\n".join([f"- {n}: {d['desc']}" for n, d in self.tools.items()])
+        return self.memoize('descriptions', lambda: "\n".join([f"- {n}: {d['desc']}" for n, d in self.tools.items()]))
     
     def get_tools_structure(self):
+        return self.memoize('structure', self._build_tools_structure)
+
+    def get_tool_schemas(self):
+        """根据函数签名与 docstring 生成 OpenAI 兼容的 tools（JSON Schema）定义"""
+        return self.memoize('schemas', lambda: [self._build_schema(n, d) for n, d in self.tools.items()])
+
+    JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean",
+                  list: "array", tuple: "array", dict: "object"}
+
+    @classmethod
+    def _build_schema(cls, name, entry):
+        func, desc = entry['func'], entry['desc']
+        # docstring 中 "参数:" 段落下的 "name: 描述" 行
+        param_docs = dict(re.findall(r'(?m)^[ \t]*(\w+)[ \t]*[:：][ \t]*(.+?)[ \t]*$', desc.split('返回')[0]))
+        properties, required = {}, []
+        try:
+            signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            signature = None
+        for param in (signature.parameters.values() if signature else []):
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            annotation = param.annotation
+            origin = getattr(annotation, '__origin__', annotation)
+            schema = {"type": cls.JSON_TYPES[origin]} if origin in cls.JSON_TYPES else {}
+            if param.name in param_docs:
+                schema["description"] = param_docs[param.name]
+            if param.default is param.empty:
+                required.append(param.name)
+            elif param.default is not None and isinstance(param.default, (str, int, float, bool)):
+                schema["default"] = param.default
+            properties[param.name] = schema
+        return {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": desc[:1024],
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+
+    def _build_tools_structure(self):
         base_path = os.path.join(os.path.dirname(__file__), 'tools')
         tree_str = 'src/tools/\n'
 
@@ -149,40 +673,171 @@ class ToolManager:
                 tree_str += f"{" " * 4 * level}|-- {folder_name}/\n"
             
             for f in files:
-                if f.endswith('.py') and f != "__init__.py":
+                if f.endswith('.py') and not f.startswith('_'):
                     tree_str += f"{indent}|-- {f}\n"
         return tree_str.strip()
             
 
-    def execute(self, name, args):
+    def validate(self, name, args):
+        """调用前校验并转换参数，返回 (参数, 错误提示)；错误提示可直接作为 Observation"""
+        validator = self.validators.get(name)
+        if validator is None:
+            return args, None
+        stats = self.validation_stats
+        stats["calls"] += 1
+        result, errors, coerced = validator(args if args is not None else {})
+        if errors:
+            stats["rejected"] += 1
+            return None, validator.format_errors(errors)
+        if coerced:
+            stats["coerced"] += 1
+        return result, None
+
+    def _prepare(self, name, args):
+        """
+        找到工具、校验参数并查询结果缓存。
+        返回 (函数, 参数, 元数据, 缓存键)，或可直接返回的 ToolResult（找不到工具、参数无效、缓存命中）。
+        """
         if name not in self.tools:
-            return f"[ERROR] Tool '{name}' not found"
+            return ToolResult(name, f"[ERROR] Tool '{name}' not found", "error")
+        args, error = self.validate(name, args)
+        if error:
+            return ToolResult(name, error, "invalid")
         try:
-            return str(self.tools[name]['func'](**args))
+            # 懒加载的工具在第一次执行时才导入模块
+            func = resolve(self.tools[name]['func'])
         except Exception as e:
-            return f"Error executing {name}: {str(e)}"
+            return ToolResult(name, f"Error executing {name}: failed to load tool ({str(e)})", "error")
+        meta = getattr(func, '__tool_meta__', None)
+        key = self.cache.key(name, func, args, meta)
+        if key is not None:
+            start = time.perf_counter()
+            output = self.cache.get(key)
+            if output is not None:
+                return ToolResult(name, output, "ok", time.perf_counter() - start, 0.0, "cache", cached=True)
+        return func, args, meta, key
+
+    def _store(self, key, result):
+        if key is not None and result.status == "ok":
+            func = self.tools.get(result.name, {}).get('func')
+            self.cache.put(key, result.output, getattr(func, '__tool_meta__', None))
+        return result
+
+    def submit(self, name, args):
+        """校验参数并开始执行，返回执行句柄；找不到工具、参数无效或缓存命中时直接返回 ToolResult"""
+        prepared = self._prepare(name, args)
+        if isinstance(prepared, ToolResult):
+            return prepared
+        func, args, meta, key = prepared
+        handle = self.executor.submit(name, func, args, meta)
+        handle.cache_key = key
+        return handle
+
+    def _collect(self, handle):
+        if isinstance(handle, ToolResult):
+            return handle
+        return self._store(handle.cache_key, self.executor.result(handle))
+
+    def _trace(self, span, result):
+        """用执行结果补全 tool span 并结束它"""
+        if result.status != "ok":
+            span.status = "error"
+        cpu_ms = result.cpu_time * 1000 if result.cpu_time is not None else None
+        self.tracer.end_span(span, status=result.status, isolation=result.isolation, cached=result.cached,
+                             result_chars=len(result.output or ""), cpu_ms=cpu_ms)
+        return result
+
+    def run(self, name, args) -> ToolResult:
+        """执行单个工具，返回带耗时（wall / CPU）的 ToolResult"""
+        span = self.tracer.start_span("tool", tool=name)
+        return self._trace(span, self._collect(self.submit(name, args)))
+
+    def run_many(self, calls):
+        """并发执行多个互不依赖的 ToolCall（各自受超时预算约束），按原顺序返回 ToolResult 列表"""
+        spans = [self.tracer.start_span("tool", tool=call.name) for call in calls]
+        handles = [self.submit(call.name, call.args or {}) for call in calls]
+        return [self._trace(span, self._collect(handle)) for span, handle in zip(spans, handles)]
+
+    async def arun(self, name, args) -> ToolResult:
+        """在调用方的事件循环上执行：async 工具直接 await，同步工具在有界线程池中执行"""
+        span = self.tracer.start_span("tool", tool=name)
+        prepared = self._prepare(name, args)
+        if isinstance(prepared, ToolResult):
+            return self._trace(span, prepared)
+        func, args, meta, key = prepared
+        return self._trace(span, self._store(key, await self.executor.arun(name, func, args, meta)))
+
+    async def arun_many(self, calls):
+        return list(await asyncio.gather(*(self.arun(call.name, call.args or {}) for call in calls)))
+
+    def execute(self, name, args):
+        return self.run(name, args).output
+
+    def execute_many(self, calls):
+        return [result.output for result in self.run_many(calls)]
+
+    @staticmethod
+    def format_results(calls, results):
+        """把多个工具结果按顺序合并为一条 Observation"""
+        if len(calls) == 1:
+            return results[0]
+        return "\n\n".join(
+            f"[{i}] {call.name}:\n{result}"
+            for i, (call, result) in enumerate(zip(calls, results), 1)
+        )
 
 
 class LogManager:
-    def __init__(self, config):
+    """
+    会话日志：人读的 markdown（chat_*.md）与同名的 JSONL 事件流（chat_*.jsonl，每行一个事件）。
+    写入交给后台的 LogWriter（见 src/logwriter.py），log() 只做格式化和入队；
+    会话登记在 logs/index.json 中（见 src/logstore.py），超过大小 / 时长后轮转到新的分段文件。
+    """
+    def __init__(self, config, session=None):
         self.config = config
+        self.session = session      # 多会话服务中区分同一秒内创建的日志文件
+        self.log_file = None
+        self.writer = get_log_writer()
+        self.store = get_log_store()
+        self.history = get_history_index() if settings.HISTORY_INDEX else None
+        self._header = None
+        self._base = None
+        self._part = 1
+
+    @property
+    def event_file(self):
+        if self.log_file is None or not settings.LOG_JSONL:
+            return None
+        return os.path.splitext(str(self.log_file))[0] + '.jsonl'
 
     def init_log(self, path=None):
+        # 会话标题在第一条日志写入时才落盘：打开页面但从未发消息的会话不会留下空日志文件
+        if self.log_file is not None and self._header is None:
+            self.store.close_session(self.log_file)
+        ts = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         if path is None:
-            os.makedirs("logs", exist_ok=True)
-            ts = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            path = os.path.join("logs", f'chat_{ts}.md')
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(f'# Session {ts}\n\n')
+            suffix = f"_{str(self.session)[:8]}" if self.session else ""
+            path = os.path.join("logs", f'chat_{ts}{suffix}.md')
+            self._header = f'# Session {ts}\n\n'
         else:
-            ts = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            with open(path, 'a', encoding='utf-8') as f:
-                f.write(f'\n\n# Session {ts}\n\n')
+            self._header = f'\n\n# Session {ts}\n\n'
         self.log_file = path
+        self._base, self._part = os.path.splitext(str(path))[0], 1
         return self
 
+    def rotate(self):
+        """当前分段超过 LOG_ROTATE_BYTES / LOG_ROTATE_AGE：关闭它，后续写入新的分段 {原名}_p{n}.md"""
+        self.store.close_session(self.log_file)
+        self._part += 1
+        ts = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.log_file = f"{self._base}_p{self._part}.md"
+        self._header = f'# Session {ts} (part {self._part})\n\n'
+
     def log(self, role: str, content: str):
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        if self._header is None and self.store.should_rotate(self.log_file):
+            self.rotate()
+        now = datetime.datetime.now()
+        timestamp = now.strftime("%H:%M:%S")
         log_entry = ""
         if role == "User":
             log_entry = f"\n\n## 👤 User ({timestamp})\n\n{content}\n"
@@ -190,11 +845,31 @@ class LogManager:
             log_entry = f"\n\n### 🤖 Agent ({timestamp})\n\n```\n{content}\n```\n"
         elif role == "System":  # 通常是 Observation
             log_entry = f"\n\n> 🛠️ **System/Observation** ({timestamp})\n\n```\n{content}\n```\n"
+        events = []
+        if self._header is not None:
+            log_entry, self._header = self._header + log_entry, None
+            events.append({"ts": now.isoformat(), "session": self.session, "event": "session_start"})
+            self.store.open_session(self.log_file, self.session)
+        events.append({"ts": now.isoformat(), "session": self.session, "role": role, "content": content})
 
-        try:
-            if not os.path.exists("logs"):
-                os.mkdir("logs")
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                f.write(log_entry)
-        except Exception as e:
-            print(f"[Log Error] Could not write to log file: {e}")
+        self.writer.write(str(self.log_file), log_entry)
+        nbytes = len(log_entry.encode('utf-8'))
+        if self.event_file:
+            lines = ''.join(json.dumps(e, ensure_ascii=False) + "\n" for e in events)
+            self.writer.write(self.event_file, lines)
+            nbytes += len(lines.encode('utf-8'))
+        self.store.record(self.log_file, 1, nbytes)
+        if self.history is not None:
+            self.history.add(self.store.name_of(self.log_file), self.session, role, content, now.isoformat())
+
+    def flush(self):
+        """等待本进程排队的日志全部写入（读取日志文件之前调用）"""
+        self.writer.flush()
+
+    def close(self):
+        """写完并关闭本会话日志的文件句柄；会话在索引中标记为已关闭，之后由维护线程压缩"""
+        if self.log_file is not None and self._header is None:
+            self.store.close_session(self.log_file)
+        for path in (self.log_file, self.event_file):
+            if path:
+                self.writer.release(str(path))
@@ -0,0 +1,226 @@
+import re
+import json
+import typing
+import inspect
+import difflib
+
+
+_INT = re.compile(r'^[+-]?\d+$')
+_TRUE = {"true", "yes", "y", "on", "1"}
+_FALSE = {"false", "no", "n", "off", "0"}
+
+
+class CoercionError(Exception):
+    pass
+
+
+def _type_name(annotation):
+    if annotation is inspect.Parameter.empty or annotation is typing.Any:
+        return "any"
+    if isinstance(annotation, type):
+        return annotation.__name__
+    return str(annotation).replace("typing.", "")
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise CoercionError("got bool")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and _INT.match(value.strip()):
+        return int(value.strip())
+    raise CoercionError(f"got {type(value).__name__} {value!r}")
+
+
+def _to_float(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise CoercionError(f"got {type(value).__name__} {value!r}")
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+        return value.strip().lower() in _TRUE
+    raise CoercionError(f"got {type(value).__name__} {value!r}")
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise CoercionError(f"got {type(value).__name__}")
+
+
+def _json_container(kind, *accept):
+    def convert(value):
+        if isinstance(value, accept):
+            return kind(value)
+        if isinstance(value, str) and value.strip()[:1] in '[{':
+            try:
+                parsed = json.loads(value)
+            except ValueError:
+                parsed = None
+            if isinstance(parsed, accept):
+                return kind(parsed)
+        raise CoercionError(f"got {type(value).__name__}")
+    return convert
+
+
+_SCALARS = {
+    int: _to_int,
+    float: _to_float,
+    bool: _to_bool,
+    str: _to_str,
+    list: _json_container(list, list, tuple),
+    tuple: _json_container(tuple, list, tuple),
+    dict: _json_container(dict, dict),
+}
+
+
+def compile_coercer(annotation):
+    """
+    把类型注解编译成一个转换函数：value -> 转换后的值，失败抛出 CoercionError。
+    只做不会改变语义的转换（"5" -> 5、5 -> 5.0、"true" -> True、JSON 字符串 -> list/dict）。
+    无法识别的注解不做检查。
+    """
+    if annotation is inspect.Parameter.empty or annotation is typing.Any:
+        return None
+    if annotation in _SCALARS:
+        return _SCALARS[annotation]
+
+    origin = typing.get_origin(annotation)
+    members = typing.get_args(annotation)
+    if origin is typing.Union:
+        optional = type(None) in members
+        coercers = [compile_coercer(m) for m in members if m is not type(None)]
+        if any(c is None for c in coercers):
+            return None
+
+        def union(value):
+            if value is None and optional:
+                return None
+            for coerce in coercers:
+                try:
+                    return coerce(value)
+                except CoercionError:
+                    continue
+            raise CoercionError(f"got {type(value).__name__} {value!r}")
+        return union
+
+    if origin is typing.Literal:
+        def literal(value):
+            if value in members:
+                return value
+            raise CoercionError(f"expected one of {list(members)}, got {value!r}")
+        return literal
+
+    if origin in (list, tuple, dict):
+        container = _SCALARS[origin]
+        if origin is dict:
+            item = compile_coercer(members[1]) if len(members) == 2 else None
+            if item is None:
+                return container
+
+            def mapping(value):
+                return {k: item(v) for k, v in container(value).items()}
+            return mapping
+        homogeneous = origin is list or (len(members) == 2 and members[1] is Ellipsis)
+        item = compile_coercer(members[0]) if members and homogeneous else None
+        if item is None:
+            return container
+
+        def sequence(value):
+            return origin(item(v) for v in container(value))
+        return sequence
+    return None
+
+
+class ArgsValidator:
+    """
+    由工具签名预编译的参数校验器：在调用前检查必填参数、未知参数，并对类型做安全的强制转换。
+    所有逐参数的转换函数在编译时确定，调用时只是字典查找 + 函数调用（微秒级）。
+    """
+    def __init__(self, name, params, required, accepts_extra):
+        self.name = name
+        self.params = params                # 参数名 -> (期望类型描述, 转换函数, 默认值)
+        self.required = required
+        self.accepts_extra = accepts_extra
+
+    @classmethod
+    def compile(cls, name, func):
+        try:
+            signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            return None
+        try:
+            hints = typing.get_type_hints(func)
+        except Exception:
+            hints = {}
+        params, required, accepts_extra = {}, [], False
+        for param in signature.parameters.values():
+            if param.kind == param.VAR_KEYWORD:
+                accepts_extra = True
+                continue
+            if param.kind == param.VAR_POSITIONAL:
+                continue
+            annotation = hints.get(param.name, param.annotation)
+            params[param.name] = (_type_name(annotation), compile_coercer(annotation), param.default)
+            if param.default is param.empty:
+                required.append(param.name)
+        return cls(name, params, required, accepts_extra)
+
+    def __call__(self, args):
+        """返回 (转换后的参数, 错误列表, 被转换的参数名列表)；错误为 {param, error, expected} 字典"""
+        if not isinstance(args, dict):
+            return None, [{"param": None, "error": f"arguments must be an object, got {type(args).__name__}",
+                           "expected": "object"}], []
+        errors, coerced, result = [], [], {}
+        for key, value in args.items():
+            spec = self.params.get(key)
+            if spec is None:
+                if self.accepts_extra:
+                    result[key] = value
+                    continue
+                hint = difflib.get_close_matches(key, self.params, n=1)
+                errors.append({"param": key, "error": "unexpected argument" +
+                               (f", did you mean '{hint[0]}'?" if hint else ""),
+                               "expected": None})
+                continue
+            expected, coerce, default = spec
+            if coerce is None or (value is None and default is None):
+                result[key] = value
+                continue
+            try:
+                converted = coerce(value)
+            except CoercionError as e:
+                errors.append({"param": key, "error": f"invalid type, {e}", "expected": expected})
+                continue
+            if type(converted) is not type(value) or converted != value:
+                coerced.append(key)
+            result[key] = converted
+        for key in self.required:
+            if key not in args:
+                errors.append({"param": key, "error": "missing required argument", "expected": self.params[key][0]})
+        return (None if errors else result), errors, coerced
+
+    def format_errors(self, errors):
+        lines = [f"[ERROR] Invalid arguments for {self.name}:"]
+        for e in errors:
+            expected = f" (expected {e['expected']})" if e.get('expected') else ""
+            lines.append(f"- {e['param'] or 'args'}: {e['error']}{expected}")
+        usage = ", ".join(f"{n}: {spec[0]}" + ("" if n in self.required else f" = {spec[2]!r}")
+                          for n, spec in self.params.items())
+        lines.append(f"Signature: {self.name}({usage})")
+        return "\n".join(lines)
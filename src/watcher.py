@@ -0,0 +1,203 @@
+import os
+import sys
+import time
+import asyncio
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+
+# 工具目录监视：文件变化经过防抖后置位，由主循环在两步之间取走并触发增量重载（见 ToolManager.reload）。
+# Linux 上使用 inotify（通过 ctypes 调用 libc，无需第三方依赖），其它平台或 inotify 不可用时退回 mtime 轮询。
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_tool_file(name):
+    """只关心会被注册成工具的文件（与 build_manifest 的规则一致）"""
+    return name.endswith('.py') and not name.startswith(('_', '.'))
+
+
+def _libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, 'inotify_init1') else None
+
+
+class _InotifyBackend:
+    name = "inotify"
+
+    def __init__(self, root):
+        self.libc = _libc()
+        if self.libc is None:
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        self._add(root)
+        for entry in os.scandir(root):
+            if entry.is_dir() and not entry.name.startswith(('_', '.')):
+                self._add(entry.path)
+
+    def _add(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.dirs[wd] = path
+
+    def wait(self, timeout):
+        """等待最多 timeout 秒，返回是否有工具文件变化"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        changed, offset = False, 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size: offset + EVENT_HEADER.size + length].rstrip(b'\0').decode()
+            offset += EVENT_HEADER.size + length
+            parent = self.dirs.get(wd)
+            if mask & IN_ISDIR:
+                # 新建的分类目录也要监视；目录内已有的文件（如整目录移入）视为变化
+                if mask & (IN_CREATE | IN_MOVED_TO) and parent is not None and not name.startswith(('_', '.')):
+                    path = os.path.join(parent, name)
+                    self._add(path)
+                    try:
+                        changed |= any(is_tool_file(f) for f in os.listdir(path))
+                    except OSError:
+                        pass
+                changed |= bool(mask & (IN_DELETE | IN_MOVED_FROM))
+            elif mask & IN_DELETE_SELF:
+                self.dirs.pop(wd, None)
+            elif is_tool_file(name):
+                changed = True
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    name = "poll"
+
+    def __init__(self, root, interval=1.0):
+        self.root = root
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        files = {}
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or entry.name.startswith(('_', '.')):
+                continue
+            try:
+                for file in os.scandir(entry.path):
+                    if is_tool_file(file.name):
+                        st = file.stat()
+                        files[file.path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+        return files
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        changed, self.snapshot = snapshot != self.snapshot, snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class ToolWatcher:
+    """
+    后台监视工具目录。最后一次变化之后安静 debounce 秒才视为"变化已稳定"（编辑器保存、
+    create_file 分多次写入时只触发一次重载）。主循环在每一步开始前调用 consume()。
+    backend: "auto"（优先 inotify）| "inotify" | "poll"
+    """
+    BACKENDS = ("auto", "inotify", "poll")
+
+    def __init__(self, root, debounce=0.5, backend="auto", poll_interval=1.0):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown watcher backend: {backend}")
+        self.root = root
+        self.debounce = debounce
+        self.backend = None
+        if backend in ("auto", "inotify"):
+            try:
+                self.backend = _InotifyBackend(root)
+            except OSError:
+                if backend == "inotify":
+                    raise
+        if self.backend is None:
+            self.backend = _PollingBackend(root, poll_interval)
+        self._last_change = None
+        self._settled = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"events": 0, "reloads": 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="tool-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            timeout = self.debounce if self._last_change is not None else 1.0
+            try:
+                changed = self.backend.wait(timeout)
+            except OSError:
+                break
+            now = time.monotonic()
+            if changed:
+                self._last_change = now
+                self.stats["events"] += 1
+            elif self._last_change is not None and now - self._last_change >= self.debounce:
+                self._last_change = None
+                self._settled.set()
+
+    async def settle(self):
+        """
+        有变化尚在防抖窗口内时（如上一步刚用 create_file 写入工具），在线程里等它稳定，不阻塞事件循环；
+        最多等待一个 debounce，期间仍在持续写入的留给之后的步骤
+        """
+        last = self._last_change
+        if last is not None and not self._settled.is_set():
+            await asyncio.to_thread(self._settled.wait,
+                                    max(0.0, last + self.debounce - time.monotonic()) + self.debounce)
+
+    def consume(self) -> bool:
+        """取走"已稳定的变化"标记：返回 True 表示自上次调用以来工具文件发生过变化（不等待防抖中的变化）"""
+        if not self._settled.is_set():
+            return False
+        self._settled.clear()
+        self.stats["reloads"] += 1
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.backend.close()